@@ -0,0 +1,202 @@
+"""
+抽样预估 + 渐进精化
+
+探索性问题不必等待全量扫描：同一段生成代码先在数据集缓存维护的分层样本上运行，
+立即把带误差范围的初步结果推送给客户端并返回给调用方；全量运行同时在后台进行，
+完成后通过回调推送精确结果，替换初步结果。
+"""
+
+import contextvars
+import os
+import re
+import subprocess
+import tempfile
+import threading
+import traceback
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, Optional
+
+from dataset_cache import ensure_sample, get_profile
+from sandbox import run_python_code
+from workspace import get_workspaces
+
+# 全量运行在后台线程中进行
+_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="exact-run")
+
+# 工作目录 → 已返回初步结果、仍在后台进行的全量运行
+_pending: Dict[Optional[str], Future] = {}
+_pending_lock = threading.Lock()
+
+
+# 不含转义和换行的单行字符串字面量
+_STRING_LITERAL = re.compile(r"""(['"])([^'"\\\n]+)\1""")
+
+
+def swap_data_path(code: str, file_path: str, sample_path: str) -> Optional[str]:
+    """
+    把代码中指向数据文件的字符串字面量替换为样本文件路径
+
+    './data.csv' 与 'data.csv' 等指向同一路径的写法都会替换；
+    路径由 os.path.join 等表达式拼出时无法替换。
+
+    Returns:
+        替换后的代码；没有任何字面量指向数据文件时返回 None
+    """
+    target = os.path.normpath(file_path)
+    replaced = False
+
+    def replace(match: re.Match) -> str:
+        nonlocal replaced
+        if os.path.normpath(match.group(2)) != target:
+            return match.group(0)
+        replaced = True
+        return repr(sample_path)
+
+    code = _STRING_LITERAL.sub(replace, code)
+    return code if replaced else None
+
+
+def wait_exact(cwd: Optional[str]):
+    """
+    等待该工作目录上仍在后台进行的全量运行结束
+
+    后续代码可能读取全量运行写出的中间文件，新的运行开始前先等它写完。
+    """
+    with _pending_lock:
+        future = _pending.get(cwd)
+    if future is not None:
+        wait([future])
+
+
+def run_progressive(
+    code: str,
+    data_context: Dict[str, Any],
+    on_preliminary: Callable[[str], None],
+    on_exact: Optional[Callable[[subprocess.CompletedProcess], None]] = None,
+    timeout: int = 10,
+    exact_timeout: int = 600,
+    cwd: Optional[str] = None,
+    session: Optional[str] = None,
+) -> subprocess.CompletedProcess:
+    """
+    先在样本上运行得到初步结果，全量运行在后台精化
+
+    Args:
+        code: 生成的Python代码
+        data_context: 数据上下文，必须包含 file_path
+        on_preliminary: 初步结果回调（例如推送到客户端的流）
+        on_exact: 精确结果回调；提供时样本运行成功就立即返回初步结果，
+            全量运行结束后（包括失败 / 超时）在后台线程中以其结果调用；不提供时等待全量运行
+        timeout: 样本运行的超时时间（秒）
+        exact_timeout: 全量运行的超时时间（秒）
+        cwd: 子进程的工作目录（会话工作目录）
+        session: 会话 ID，后台全量运行期间占用该会话的工作目录，避免被回收
+
+    Returns:
+        样本运行成功且提供了 on_exact 时返回初步结果（stdout 中注明是估计值），否则返回全量运行结果；
+        全量运行超时时返回样本运行结果，并在 stdout 中注明是估计值
+    """
+    wait_exact(cwd)
+
+    file_path = data_context["file_path"]
+    profile = get_profile(file_path)
+    sample = ensure_sample(profile) if profile else None
+    # 样本在会话工作目录之外，用绝对路径引用
+    sample_code = (
+        swap_data_path(code, file_path, os.path.abspath(sample.path)) if sample else None
+    )
+    if sample_code is None:
+        # 没有样本，或代码里找不到可替换的数据路径（样本运行会读到全量数据、按抽样比例放大结果）
+        return run_python_code(code, timeout=exact_timeout, cwd=cwd)
+
+    workspaces = get_workspaces() if session else None
+    if workspaces:
+        workspaces.acquire(session)
+    exact_future = _executor.submit(
+        contextvars.copy_context().run, run_python_code, code, exact_timeout, cwd=cwd
+    )
+    detached = False
+    try:
+        # 样本运行在独立的临时目录中进行，避免与全量运行争写同名的图表 / CSV 输出；
+        # 临时目录里没有前几步的中间文件，依赖它们的代码样本运行失败，只是不推送初步结果
+        preliminary: Optional[subprocess.CompletedProcess] = None
+        scratch_root = os.path.dirname(os.path.abspath(cwd)) if cwd else None
+        with tempfile.TemporaryDirectory(prefix="sample-run-", dir=scratch_root) as scratch:
+            try:
+                preliminary = run_python_code(
+                    sample_code,
+                    timeout=timeout,
+                    extra_env={
+                        "SAMPLE_FRACTION": str(sample.fraction),
+                        "SAMPLE_DESIGN": os.path.abspath(sample.design),
+                    },
+                    cwd=scratch,
+                )
+            except subprocess.TimeoutExpired:
+                pass
+        strata = f"按「{sample.strata}」分层" if sample.strata else "简单随机"
+        if preliminary is not None and preliminary.returncode == 0:
+            on_preliminary(
+                f"【初步结果：基于 {sample.fraction:.2%} {strata}抽样，"
+                f"精确结果计算中】\n{preliminary.stdout}"
+            )
+
+            # 不阻塞调用方：全量运行结束后通过 on_exact 推送精确结果
+            if on_exact is not None and not exact_future.done():
+                detached = True
+                with _pending_lock:
+                    _pending[cwd] = exact_future
+                context = contextvars.copy_context()
+                exact_future.add_done_callback(
+                    lambda future: context.run(
+                        _deliver_exact, future, on_exact, exact_timeout, cwd, session
+                    )
+                )
+                preliminary.stdout = (
+                    f"【初步结果：基于 {sample.fraction:.2%} {strata}抽样的估计值，"
+                    f"全量计算仍在后台进行，完成后单独推送精确结果】\n{preliminary.stdout}"
+                )
+                return preliminary
+
+        try:
+            return exact_future.result()
+        except subprocess.TimeoutExpired:
+            if preliminary is None or preliminary.returncode != 0:
+                raise
+            preliminary.stdout = (
+                f"【全量计算超时，以下为基于 {sample.fraction:.2%} 抽样的估计结果】\n"
+                f"{preliminary.stdout}"
+            )
+            return preliminary
+    finally:
+        if workspaces and not detached:
+            workspaces.release(session)
+
+
+def _deliver_exact(
+    future: Future,
+    on_exact: Callable[[subprocess.CompletedProcess], None],
+    exact_timeout: int,
+    cwd: Optional[str],
+    session: Optional[str],
+):
+    """后台全量运行结束：回调精确结果，释放工作目录"""
+    try:
+        try:
+            result = future.result()
+        except subprocess.TimeoutExpired:
+            result = subprocess.CompletedProcess(
+                args=[], returncode=1, stdout="", stderr=f"全量计算超时（{exact_timeout} 秒）"
+            )
+        except Exception as e:
+            result = subprocess.CompletedProcess(args=[], returncode=1, stdout="", stderr=str(e))
+        on_exact(result)
+    except Exception:
+        print("❌ 推送精确结果失败")
+        traceback.print_exc()
+    finally:
+        with _pending_lock:
+            if _pending.get(cwd) is future:
+                del _pending[cwd]
+        if session:
+            get_workspaces().release(session)
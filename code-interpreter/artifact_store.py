@@ -0,0 +1,377 @@
+"""
+生成图表的内容寻址存储
+
+生成代码把图表写进工作目录，原先只把路径交回客户端：并发会话会互相覆盖同名文件（./data_analysis_plot.png），
+客户端也拿不到稳定的引用。这里在每次执行后把新生成的图片收进存储：
+- 内容寻址：artifact ID 是文件内容的 sha256，同样的图只存一份（跨会话去重）
+- 会话命名空间：每个会话维护自己的 文件名 → ID 映射，同名文件互不覆盖
+- 总大小有上限，超出时按最近访问时间淘汰
+- 客户端按 ID 懒加载：缩略图按需生成；lazy 渲染模式下只存 Figure 序列化文件，第一次取原图时才渲染
+
+    from artifact_store import get_artifact_store
+
+    store = get_artifact_store()
+    artifacts = store.collect("session-1", ".", since=start)
+    store.thumbnail(artifacts[0]["id"])  # 缩略图路径
+    store.path(artifacts[0]["id"])       # 原图路径
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from plotting import FIGURE_PICKLE_SUFFIX
+
+ARTIFACT_DIR = Path(
+    os.getenv("ARTIFACT_DIR", Path.home() / ".cache" / "ai-practices" / "artifacts")
+)
+
+# 存储总大小上限（含缩略图），默认 512MB
+ARTIFACT_MAX_BYTES = int(os.getenv("ARTIFACT_MAX_BYTES", str(512 * 1024 * 1024)))
+
+# 缩略图默认边长（像素）
+THUMBNAIL_SIZE = 256
+
+# 收集的文件类型
+IMAGE_EXTS = (".png", ".jpg", ".jpeg", ".webp", ".gif", ".svg", ".pdf")
+
+# 可以生成缩略图的栅格格式
+_THUMBNAIL_EXTS = (".png", ".jpg", ".jpeg", ".webp", ".gif")
+
+# 在沙箱子进程中生成缩略图（Pillow 随 matplotlib 安装），宿主进程不导入图像库
+_THUMBNAIL_CODE = """
+from PIL import Image
+
+with Image.open({source!r}) as image:
+    image.thumbnail(({size}, {size}))
+    image.save({target!r}, format="PNG")
+"""
+
+
+def _digest_file(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class ArtifactStore:
+    """按内容寻址、按会话命名的图表存储"""
+
+    def __init__(self, root: Path = ARTIFACT_DIR, max_bytes: int = ARTIFACT_MAX_BYTES):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self._lock = threading.RLock()
+        self._render_locks: Dict[str, threading.Lock] = {}
+        # ID → {"ext", "size", "atime", "pending"}；pending 表示只存了 Figure 序列化文件，原图尚未渲染
+        self._objects: Dict[str, Dict[str, Any]] = {}
+        # 会话 → {文件名 → {"id", "preview"}}
+        self._sessions: Dict[str, Dict[str, Dict[str, Optional[str]]]] = {}
+        self._stats = {"stored": 0, "deduplicated": 0, "evicted": 0, "thumbnails": 0}
+        self._load()
+
+    @property
+    def _index_path(self) -> Path:
+        return self.root / "index.json"
+
+    def _load(self):
+        try:
+            data = json.loads(self._index_path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return
+        self._objects = data.get("objects", {})
+        self._sessions = data.get("sessions", {})
+
+    def _save(self):
+        self.root.mkdir(parents=True, exist_ok=True)
+        tmp_path = self._index_path.with_suffix(f".{os.getpid()}.tmp")
+        tmp_path.write_text(
+            json.dumps({"objects": self._objects, "sessions": self._sessions}),
+            encoding="utf-8",
+        )
+        os.replace(tmp_path, self._index_path)
+
+    def _object_path(self, artifact_id: str, ext: str) -> Path:
+        return self.root / "objects" / artifact_id[:2] / f"{artifact_id}{ext}"
+
+    def _thumbnail_path(self, artifact_id: str, size: int) -> Path:
+        return self.root / "thumbnails" / artifact_id[:2] / f"{artifact_id}.{size}.png"
+
+    def _ingest(self, source: Path, ext: str, pending: bool = False) -> str:
+        """把文件按内容存入 objects/，返回 ID（已存在则只刷新访问时间）"""
+        artifact_id = _digest_file(source)
+        with self._lock:
+            entry = self._objects.get(artifact_id)
+            if entry is not None:
+                entry["atime"] = time.time()
+                self._stats["deduplicated"] += 1
+                return artifact_id
+            target = self._object_path(artifact_id, ext)
+            if pending:
+                target = Path(str(target) + FIGURE_PICKLE_SUFFIX)
+            target.parent.mkdir(parents=True, exist_ok=True)
+            shutil.copyfile(source, target)
+            self._objects[artifact_id] = {
+                "ext": ext,
+                "size": target.stat().st_size,
+                "atime": time.time(),
+                "pending": pending,
+            }
+            self._stats["stored"] += 1
+            return artifact_id
+
+    def put(
+        self, session_id: str, name: str, path: str, preview: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        存入一个图表
+
+        Args:
+            session_id: 会话 ID
+            name: 会话内的文件名（同名再次存入会指向新内容）
+            path: 图片文件；以 .fig.pickle 结尾时表示延迟渲染的 Figure，原图在第一次取用时渲染
+            preview: 可选的低清预览图
+
+        Returns:
+            {"id", "name", "size", "preview"}
+        """
+        source = Path(path)
+        pending = source.name.endswith(FIGURE_PICKLE_SUFFIX)
+        ext = Path(source.name[: -len(FIGURE_PICKLE_SUFFIX)] if pending else source.name).suffix
+        artifact_id = self._ingest(source, ext.lower(), pending=pending)
+        preview_id = self._ingest(Path(preview), Path(preview).suffix.lower()) if preview else None
+        with self._lock:
+            self._sessions.setdefault(session_id, {})[name] = {
+                "id": artifact_id,
+                "preview": preview_id,
+            }
+            self._evict(keep={artifact_id, preview_id})
+            self._save()
+            return self._describe(name, artifact_id, preview_id)
+
+    def _describe(self, name: str, artifact_id: str, preview_id: Optional[str]) -> Dict[str, Any]:
+        entry = self._objects.get(artifact_id, {})
+        return {
+            "id": artifact_id,
+            "name": name,
+            "size": entry.get("size", 0),
+            "preview": preview_id,
+        }
+
+    def collect(self, session_id: str, directory: str, since: float) -> List[Dict[str, Any]]:
+        """
+        收集 directory 下在 since 之后写入的图表，存入会话命名空间
+
+        PlotPolicy 的预览图（<stem>.preview.<fmt>）作为对应原图的 preview 一并存入；
+        lazy 模式下只有 <name>.fig.pickle 没有原图，按延迟渲染的 Figure 存入。
+
+        Returns:
+            存入的图表描述列表
+        """
+        directory = Path(directory)
+        if not directory.is_dir():
+            return []
+        files = {}
+        for path in directory.iterdir():
+            try:
+                if path.is_file() and path.stat().st_mtime >= since:
+                    files[path.name] = path
+            except OSError:
+                continue
+
+        previews = {}
+        for file_name in files:
+            stem = file_name.rpartition(".")[0]
+            if stem.endswith(".preview"):
+                previews[stem[: -len(".preview")]] = file_name
+
+        artifacts = []
+        for file_name, path in sorted(files.items()):
+            if file_name.endswith(FIGURE_PICKLE_SUFFIX):
+                name = file_name[: -len(FIGURE_PICKLE_SUFFIX)]
+                if name in files:
+                    continue
+            else:
+                name = file_name
+            ext = Path(name).suffix.lower()
+            stem = name[: -len(ext)] if ext else name
+            if ext not in IMAGE_EXTS or file_name in previews.values():
+                continue
+            preview = previews.get(stem)
+            artifacts.append(
+                self.put(session_id, name, str(path), str(files[preview]) if preview else None)
+            )
+        return artifacts
+
+    def resolve(self, session_id: str, name: str) -> Optional[str]:
+        """会话内文件名 → ID"""
+        with self._lock:
+            ref = self._sessions.get(session_id, {}).get(name)
+            return ref["id"] if ref and ref["id"] in self._objects else None
+
+    def list(self, session_id: str) -> List[Dict[str, Any]]:
+        """会话内的全部图表"""
+        with self._lock:
+            return [
+                self._describe(name, ref["id"], ref["preview"])
+                for name, ref in self._sessions.get(session_id, {}).items()
+                if ref["id"] in self._objects
+            ]
+
+    def path(self, artifact_id: str) -> Path:
+        """
+        取原图路径（延迟渲染的图表在这里第一次渲染）
+
+        Raises:
+            KeyError: ID 不存在或已被淘汰
+        """
+        with self._lock:
+            entry = self._objects.get(artifact_id)
+            if entry is None:
+                raise KeyError(artifact_id)
+            entry["atime"] = time.time()
+            target = self._object_path(artifact_id, entry["ext"])
+            if not entry["pending"]:
+                return target
+            render_lock = self._render_locks.setdefault(artifact_id, threading.Lock())
+
+        # 渲染在锁外进行，同一个图只渲染一次
+        with render_lock:
+            with self._lock:
+                if not self._objects.get(artifact_id, {}).get("pending"):
+                    return target
+            from plotting import render_full_res
+
+            render_full_res(str(target))
+            with self._lock:
+                entry["pending"] = False
+                entry["size"] = target.stat().st_size
+                self._render_locks.pop(artifact_id, None)
+                self._evict(keep={artifact_id})
+                self._save()
+            return target
+
+    def read(self, artifact_id: str) -> bytes:
+        return self.path(artifact_id).read_bytes()
+
+    def thumbnail(self, artifact_id: str, size: int = THUMBNAIL_SIZE) -> Path:
+        """
+        取缩略图路径，第一次请求时在沙箱子进程中生成
+
+        Raises:
+            KeyError: ID 不存在或已被淘汰
+            ValueError: 矢量图等不支持生成缩略图的格式
+        """
+        with self._lock:
+            entry = self._objects.get(artifact_id)
+            if entry is None:
+                raise KeyError(artifact_id)
+            if entry["ext"] not in _THUMBNAIL_EXTS:
+                raise ValueError(f"{entry['ext']} 格式不支持缩略图")
+            target = self._thumbnail_path(artifact_id, size)
+            if target.exists():
+                entry["atime"] = time.time()
+                return target
+
+        from sandbox import build_sandbox_env
+        from sandbox_scheduler import get_sandbox_scheduler
+
+        source = self.path(artifact_id)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        code = _THUMBNAIL_CODE.format(source=str(source), target=str(target), size=size)
+        with get_sandbox_scheduler().slot() as slot:
+            result = subprocess.run(
+                [sys.executable, "-c", code],
+                capture_output=True,
+                text=True,
+                env={**build_sandbox_env(), **slot.env()},
+            )
+        if result.returncode != 0:
+            raise RuntimeError(f"生成缩略图失败: {result.stderr}")
+        with self._lock:
+            entry["size"] += target.stat().st_size
+            entry.setdefault("thumbnails", []).append(size)
+            self._stats["thumbnails"] += 1
+            self._evict(keep={artifact_id})
+            self._save()
+        return target
+
+    def _remove_object(self, artifact_id: str):
+        entry = self._objects.pop(artifact_id)
+        target = self._object_path(artifact_id, entry["ext"])
+        for path in [target, Path(str(target) + FIGURE_PICKLE_SUFFIX)] + [
+            self._thumbnail_path(artifact_id, size) for size in entry.get("thumbnails", [])
+        ]:
+            path.unlink(missing_ok=True)
+
+    def _evict(self, keep=()):
+        """总大小超过上限时按最近访问时间淘汰，并清理各会话中失效的引用（调用方持有锁）"""
+        total = sum(entry["size"] for entry in self._objects.values())
+        if total <= self.max_bytes:
+            return
+        for artifact_id in sorted(self._objects, key=lambda key: self._objects[key]["atime"]):
+            if total <= self.max_bytes:
+                break
+            if artifact_id in keep:
+                continue
+            total -= self._objects[artifact_id]["size"]
+            self._remove_object(artifact_id)
+            self._stats["evicted"] += 1
+        for session_id in list(self._sessions):
+            refs = {
+                name: {
+                    "id": ref["id"],
+                    "preview": ref["preview"] if ref["preview"] in self._objects else None,
+                }
+                for name, ref in self._sessions[session_id].items()
+                if ref["id"] in self._objects
+            }
+            if refs:
+                self._sessions[session_id] = refs
+            else:
+                del self._sessions[session_id]
+
+    def drop_session(self, session_id: str):
+        """删除会话命名空间；对象仍可能被其他会话引用，只在不再被引用时删除"""
+        with self._lock:
+            self._sessions.pop(session_id, None)
+            referenced = {
+                artifact_id
+                for refs in self._sessions.values()
+                for ref in refs.values()
+                for artifact_id in (ref["id"], ref["preview"])
+            }
+            for artifact_id in [key for key in self._objects if key not in referenced]:
+                self._remove_object(artifact_id)
+            self._save()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                **self._stats,
+                "objects": len(self._objects),
+                "sessions": len(self._sessions),
+                "bytes": sum(entry["size"] for entry in self._objects.values()),
+                "max_bytes": self.max_bytes,
+            }
+
+
+_store: Optional[ArtifactStore] = None
+_store_lock = threading.Lock()
+
+
+def get_artifact_store() -> ArtifactStore:
+    """获取进程内共享的图表存储"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = ArtifactStore()
+        return _store
@@ -0,0 +1,235 @@
+"""
+批量分析模式
+
+同一数据集上的多个问题合并为一次代码生成、一次执行：
+LLM 为每个问题生成一个 `task_i(df)` 函数，执行环境只加载一次数据，
+在同一个子进程中依次调用各函数（相互隔离，单个失败不影响其他），
+再按分节标记把输出拆回每个问题，分别交给结果分析。
+"""
+
+import json
+import os
+import re
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+from langchain.messages import HumanMessage, SystemMessage
+
+from offload import preflight_check
+from prompt import BATCH_CODE_GENERATOR_SYSTEM_PROMPT, RESULT_ANALYZER_SYSTEM_PROMPT
+from sandbox import run_python_code
+from utils import extract_python_code
+
+# 分节标记，执行输出按它拆回各个任务
+SECTION_START = "@@SECTION {index} START@@"
+SECTION_END = "@@SECTION {index} END {status}@@"
+_MARKER_PATTERN = re.compile(r"^@@SECTION (\d+) (START|END (ok|error))@@$")
+
+# 按文件后缀选择 pandas 读取函数（与 dataset_cache.read_columns 一致：只有 .tsv 按制表符分隔）
+_READERS = {
+    ".csv": "read_csv",
+    ".tsv": "read_table",
+    ".txt": "read_csv",
+    ".xlsx": "read_excel",
+    ".xls": "read_excel",
+    ".parquet": "read_parquet",
+    ".json": "read_json",
+}
+
+_HARNESS = """
+import sys as _sys
+import traceback as _traceback
+
+import pandas as _pd
+
+{task_code}
+
+df = _pd.{reader}({file_path!r})
+
+for _index in range(1, {count} + 1):
+    print({start!r}.format(index=_index), flush=True)
+    _func = globals().get(f"task_{{_index}}")
+    try:
+        if _func is None:
+            raise NameError(f"没有生成函数 task_{{_index}}")
+        # 深拷贝：未开启 copy-on-write 时浅拷贝与 df 共享数据，一个任务的原地修改会影响后续任务
+        _func(df.copy())
+        _status = "ok"
+    except Exception:
+        _traceback.print_exc(file=_sys.stdout)
+        _status = "error"
+    print({end!r}.format(index=_index, status=_status), flush=True)
+"""
+
+
+@dataclass
+class SectionResult:
+    """批量执行中单个任务的结果"""
+
+    index: int  # 任务编号（从 1 开始）
+    task: str  # 任务描述
+    success: bool  # 是否执行成功
+    output: str  # 该任务的输出（失败时包含错误信息）
+
+
+def build_batch_message(tasks: List[str], data_context: Dict[str, Any]) -> str:
+    """构造批量代码生成的用户消息"""
+    task_list = "\n".join(f"{i}. {task}" for i, task in enumerate(tasks, 1))
+    context_str = json.dumps(data_context, ensure_ascii=False, indent=2)
+    return f"""
+**任务列表（每个任务对应一个函数 task_i）:**
+{task_list}
+
+**数据上下文:**
+```json
+{context_str}
+```
+
+**输出要求:**
+1. 只输出 import 语句和 task_1 ~ task_{len(tasks)} 函数
+2. 代码必须放在 ```python 代码块内
+"""
+
+
+def assemble_batch_script(task_code: str, count: int, file_path: str) -> str:
+    """
+    把任务函数包装成可直接执行的脚本：加载一次数据，依次隔离执行各任务
+
+    Args:
+        task_code: LLM 生成的 import 与 task_i 函数
+        count: 任务数量
+        file_path: 数据文件路径
+
+    Returns:
+        完整的可执行脚本
+    """
+    ext = os.path.splitext(file_path)[1].lower()
+    return _HARNESS.format(
+        task_code=task_code,
+        reader=_READERS.get(ext, "read_csv"),
+        file_path=file_path,
+        count=count,
+        start=SECTION_START,
+        end=SECTION_END,
+    )
+
+
+def split_sections(stdout: str, stderr: str, tasks: List[str]) -> List[SectionResult]:
+    """
+    按分节标记把执行输出拆回各个任务
+
+    进程中途崩溃或超时时，没有结束标记的任务视为失败，并附上 stderr。
+    """
+    outputs: Dict[int, List[str]] = {}
+    status: Dict[int, str] = {}
+    current = None
+
+    for line in stdout.splitlines():
+        match = _MARKER_PATTERN.match(line)
+        if match:
+            index = int(match.group(1))
+            if match.group(2) == "START":
+                current = index
+                outputs[index] = []
+            else:
+                status[index] = match.group(3)
+                current = None
+        elif current is not None:
+            outputs[current].append(line)
+
+    results = []
+    for index, task in enumerate(tasks, 1):
+        output = "\n".join(outputs.get(index, []))
+        success = status.get(index) == "ok"
+        if index not in status and stderr:
+            output = f"{output}\n{stderr}".strip()
+        results.append(
+            SectionResult(index=index, task=task, success=success, output=output)
+        )
+    return results
+
+
+def run_batch(
+    tasks: List[str],
+    data_context: Dict[str, Any],
+    model,
+    timeout: int = 10,
+    cwd: Optional[str] = None,
+) -> List[SectionResult]:
+    """
+    为多个任务生成一份脚本并在单个子进程中执行
+
+    Args:
+        tasks: 任务描述列表
+        data_context: 数据上下文，必须包含 file_path
+        model: 用于生成代码的聊天模型
+        timeout: 单个任务的超时时间（秒），整体超时按任务数累加
+        cwd: 脚本执行的工作目录（会话工作目录）
+
+    Returns:
+        每个任务的执行结果
+    """
+    messages = [
+        SystemMessage(content=BATCH_CODE_GENERATOR_SYSTEM_PROMPT),
+        HumanMessage(content=build_batch_message(tasks, data_context)),
+    ]
+    raw_content = model.invoke(messages).content
+    task_code = extract_python_code(raw_content) or raw_content.strip()
+
+    # 任务函数的 df 参数就是数据集本身，预检时按数据集列名检查
+    errors = preflight_check(task_code, data_context, cwd=cwd, frame_names=["df"])
+    if errors:
+        error = "代码预检失败（未执行）:\n" + "\n".join(errors)
+        return [
+            SectionResult(index=i, task=task, success=False, output=error)
+            for i, task in enumerate(tasks, 1)
+        ]
+
+    script = assemble_batch_script(task_code, len(tasks), data_context["file_path"])
+    result = run_python_code(script, timeout=timeout * len(tasks), cwd=cwd)
+    return split_sections(result.stdout, result.stderr, tasks)
+
+
+def analyze_sections(
+    sections: List[SectionResult], data_context: Dict[str, Any], model
+) -> List[str]:
+    """
+    把各任务的输出分别交给结果分析（并发调用 LLM）
+
+    Args:
+        sections: run_batch 的结果
+        data_context: 数据上下文
+        model: 用于撰写报告的聊天模型
+
+    Returns:
+        与 sections 一一对应的报告；失败的任务返回错误说明
+    """
+    succeeded = [section for section in sections if section.success]
+    requests = [
+        [
+            SystemMessage(content=RESULT_ANALYZER_SYSTEM_PROMPT),
+            HumanMessage(
+                content=f"""
+请基于以下信息，撰写一份专业的数据分析报告。
+
+### 1. 用户原始任务
+{section.task}
+
+### 2. 数据上下文
+{data_context or "无额外上下文"}
+
+### 3. 代码执行输出
+```
+{section.output}
+```
+"""
+            ),
+        ]
+        for section in succeeded
+    ]
+    reports = iter(response.content for response in model.batch(requests))
+
+    return [
+        next(reports) if section.success else f"❌ 执行失败:\n{section.output}"
+        for section in sections
+    ]
@@ -0,0 +1,80 @@
+"""
+首张图表延迟基准
+
+对比两种沙箱环境下，带中文标题的图表在全新 `python -c` 子进程中的耗时：
+- 冷启动: 空的 MPLCONFIGDIR（需要重建字体缓存）+ 候选中文字体列表
+- 预热后: warm_up() 预构建的字体缓存 + 固定的中文字体
+
+用法:
+    python bench_fonts.py --runs 5
+"""
+
+import argparse
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from plotting import PlotPolicy, write_matplotlibrc
+from sandbox import build_sandbox_env, warm_up
+
+CHART_CODE = """
+import matplotlib.pyplot as plt
+
+plt.figure(figsize=(6, 4))
+plt.hist([1, 2, 2, 3, 3, 3])
+plt.title('变量相关性热力图')
+plt.savefig({output!r})
+plt.close()
+"""
+
+
+def time_chart(env: dict, output_dir: str) -> float:
+    """在全新子进程中渲染一张图表，返回耗时（毫秒）"""
+    code = CHART_CODE.format(output=str(Path(output_dir) / "bench.png"))
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, env=env
+    )
+    elapsed = (time.perf_counter() - start) * 1000
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr)
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="首张图表延迟基准")
+    parser.add_argument("--runs", type=int, default=5, help="每种环境的运行次数")
+    args = parser.parse_args()
+
+    policy = PlotPolicy.from_env()
+
+    with tempfile.TemporaryDirectory() as output_dir:
+        cold = []
+        for _ in range(args.runs):
+            # 每次都使用全新的配置目录，模拟没有字体缓存的新 worker
+            with tempfile.TemporaryDirectory() as config_dir:
+                env = build_sandbox_env(policy)
+                env["MPLCONFIGDIR"] = config_dir
+                env["MATPLOTLIBRC"] = str(
+                    write_matplotlibrc(Path(config_dir), policy)
+                )
+                cold.append(time_chart(env, output_dir))
+
+        pinned = warm_up(policy)
+        env = build_sandbox_env(policy)
+        warm = [time_chart(env, output_dir) for _ in range(args.runs)]
+
+    print(f"固定中文字体: {pinned}")
+    print(f"{'环境':<8}{'中位数(ms)':>12}{'最小(ms)':>12}{'最大(ms)':>12}")
+    for name, samples in [("冷启动", cold), ("预热后", warm)]:
+        print(
+            f"{name:<8}{statistics.median(samples):>12.1f}"
+            f"{min(samples):>12.1f}{max(samples):>12.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+LLM 调用链路压测
+
+启动本地模拟服务，把 BASE_URL 指向它，然后并发运行 N 个会话。
+每个会话按 Agent 的真实调用顺序发起请求：规划（结构化输出）→ 代码生成 → 重规划 → 流式分析报告，
+全部经过模型路由和调度器，统计端到端延迟、报告首 token 延迟以及调度器的排队 / 重试情况。
+
+用法:
+    python bench_llm_load.py --sessions 100 --ttft 0.5 --tps 40 --error-rate 0.05
+"""
+
+import argparse
+import os
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from mock_llm_server import MockConfig, serve
+
+
+def run_session(router, index: int) -> dict:
+    """模拟一个会话的完整调用链，返回各阶段耗时（秒）"""
+    from langchain.messages import HumanMessage, SystemMessage
+    from pydantic import BaseModel, Field
+
+    from structured_stream import stream_structured
+
+    class Plan(BaseModel):
+        steps: list[str] = Field(description="步骤")
+
+    class Replan(BaseModel):
+        status: str = Field(description="done / continue")
+        final_response: str | None = Field(default=None, description="最终回复")
+
+    query = [HumanMessage(content=f"会话 {index}: 分析 ./data.csv 的销售数据")]
+    start = time.perf_counter()
+
+    stream_structured(router.get("planner"), Plan, query)
+    router.get("codegen", temperature=0.2).invoke(
+        [SystemMessage(content="生成代码"), *query]
+    )
+    stream_structured(router.get("replanner"), Replan, query)
+
+    report_start = time.perf_counter()
+    first_token = None
+    for chunk in router.get("analyzer", temperature=0.7).stream(query):
+        if first_token is None and chunk.content:
+            first_token = time.perf_counter() - report_start
+
+    return {"total": time.perf_counter() - start, "report_ttft": first_token or 0.0}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="LLM 调用链路压测")
+    parser.add_argument("--sessions", type=int, default=100, help="并发会话数")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--ttft", type=float, default=0.3, help="模拟的首 token 延迟（秒）")
+    parser.add_argument("--tps", type=float, default=50.0, help="模拟的输出速度（tokens/秒）")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="随机 429 的比例")
+    parser.add_argument("--rpm", type=int, default=0, help="模拟的服务商 RPM 限额")
+    args = parser.parse_args()
+
+    server = serve(
+        port=args.port,
+        config=MockConfig(
+            ttft=args.ttft,
+            tokens_per_second=args.tps,
+            error_rate=args.error_rate,
+            rate_limit_rpm=args.rpm,
+        ),
+    )
+    os.environ["BASE_URL"] = f"http://127.0.0.1:{args.port}/v1"
+    os.environ.setdefault("API_KEY", "mock")
+    os.environ.setdefault("MODEL_NAME", "mock")
+    # 调度器限额默认跟模拟服务一致（未设置时不限），可用环境变量覆盖
+    os.environ.setdefault("LLM_RPM", str(args.rpm or 100000))
+    os.environ.setdefault("LLM_TPM", "100000000")
+    os.environ.setdefault("LLM_MAX_CONCURRENCY", str(args.sessions))
+
+    from llm_scheduler import get_scheduler
+    from model_router import get_router
+
+    router = get_router()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.sessions) as executor:
+        results = list(executor.map(lambda i: run_session(router, i), range(args.sessions)))
+    elapsed = time.perf_counter() - start
+    server.shutdown()
+
+    totals = sorted(r["total"] for r in results)
+    ttfts = sorted(r["report_ttft"] for r in results)
+    p95 = lambda samples: samples[int(len(samples) * 0.95) - 1]
+
+    print(f"{args.sessions} 个会话，总耗时 {elapsed:.1f}s，服务端统计: {server.stats}")
+    print(f"{'指标':<12}{'中位数(s)':>12}{'P95(s)':>12}{'最大(s)':>12}")
+    for name, samples in [("会话总耗时", totals), ("报告首token", ttfts)]:
+        print(
+            f"{name:<12}{statistics.median(samples):>12.2f}"
+            f"{p95(samples):>12.2f}{max(samples):>12.2f}"
+        )
+    print("调度器:", get_scheduler().stats())
+    print("各角色:", router.stats())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+数据集画像基准
+
+生成一个合成的销售数据 CSV，对比两种方式得到同样的画像信息：
+- multi_pass: ChunkedFrame 上分别做 describe / 空值统计 / 每个分类列 value_counts / 相关系数，每项扫描一遍文件
+- single_pass: profiler.profile_file 一次扫描全部算出
+
+加 --append-rows 时再在文件末尾追加数据，对比重新全量画像与只处理新增行的 profile_append。
+
+需要 numpy / pandas（与沙箱相同的环境）。
+
+用法:
+    python bench_profile.py --rows 10000000
+    python bench_profile.py --rows 2000000 --append-rows 20000
+"""
+
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent / "sandbox_site"))
+
+
+def write_dataset(path: Path, rows: int, chunk: int = 1_000_000, seed: int = 0):
+    """分块写出合成数据，列结构与 data.csv 一致"""
+    import numpy as np
+    import pandas as pd
+
+    rng = np.random.default_rng(seed)
+    types = np.array(["西装", "衬衫", "夹克", "牛仔裤", "连衣裙", "T恤"])
+    for start in range(0, rows, chunk):
+        n = min(chunk, rows - start)
+        quantity = rng.integers(1, 50, n)
+        price = rng.uniform(50, 3000, n).round(2)
+        df = pd.DataFrame(
+            {
+                "商品类型": types[rng.integers(0, len(types), n)],
+                "商品名称": np.char.add("商品", rng.integers(0, 5000, n).astype(str)),
+                "销售金额": (quantity * price).round(2),
+                "销售数量": quantity,
+                "零售价": price,
+            }
+        )
+        df.to_csv(path, mode="a", header=start == 0 and not path.exists(), index=False)
+
+
+def multi_pass(path: str):
+    import pandas as pd
+
+    from chunked_frame import ChunkedFrame
+
+    cf = ChunkedFrame(path)
+    cf.describe()
+    cf.map_reduce(lambda chunk: chunk.isnull().sum(), lambda parts: sum(parts))
+    for column in ("商品类型", "商品名称"):
+        cf.value_counts(column, top=10)
+    numeric = ["销售金额", "销售数量", "零售价"]
+    pd.concat(list(cf.chunks(usecols=numeric))).corr()
+
+
+def single_pass(path: str):
+    from profiler import profile_file
+
+    profile_file(path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="数据集画像基准")
+    parser.add_argument("--rows", type=int, default=2_000_000, help="合成数据行数")
+    parser.add_argument("--append-rows", type=int, default=0, help="追加的行数")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "sales.csv"
+        write_dataset(path, args.rows)
+        size_mb = path.stat().st_size / 1024 / 1024
+        print(f"{args.rows} 行，{size_mb:.0f} MB")
+        for name, fn in [("multi_pass", multi_pass), ("single_pass", single_pass)]:
+            start = time.perf_counter()
+            fn(str(path))
+            print(f"{name:<12}{time.perf_counter() - start:>10.2f}s")
+
+        if args.append_rows:
+            from profiler import profile_append, profile_file
+
+            state = Path(tmp) / "state.json"
+            profile_file(str(path), state_path=str(state))
+            offset = path.stat().st_size
+            write_dataset(path, args.append_rows, seed=1)
+            print(f"追加 {args.append_rows} 行")
+            for name, fn in [
+                ("full", lambda: profile_file(str(path))),
+                ("append", lambda: profile_append(str(path), offset, str(state), str(state) + ".new")),
+            ]:
+                start = time.perf_counter()
+                fn()
+                print(f"{name:<12}{time.perf_counter() - start:>10.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+沙箱调度基准
+
+模拟多个租户同时提交 CPU 密集的生成代码（numpy 矩阵乘法 + pandas 分组），对比：
+- unscheduled: 每个任务直接启动子进程，BLAS 按默认线程数运行（改造前的做法）
+- scheduled:   经 sandbox_scheduler 排队，按核数限流、限定线程数、绑核、按租户公平放行
+
+"大户" 租户一次提交大量任务，其余租户各提交少量任务，关注总耗时和小租户的延迟。
+需要 numpy / pandas（与沙箱相同的环境）。
+
+用法:
+    python bench_sandbox.py --heavy-jobs 16 --light-tenants 3 --light-jobs 2
+"""
+
+import argparse
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from collections import defaultdict
+
+JOB_CODE = """
+import numpy as np
+import pandas as pd
+
+rng = np.random.default_rng(0)
+a = rng.random((1200, 1200))
+for _ in range(3):
+    a = a @ a / 1200
+df = pd.DataFrame({"k": rng.integers(0, 1000, 2_000_000), "v": rng.random(2_000_000)})
+print(df.groupby("k")["v"].sum().sum() + a.sum())
+"""
+
+
+def run_unscheduled():
+    from sandbox import build_sandbox_env
+
+    subprocess.run(
+        [sys.executable, "-c", JOB_CODE], capture_output=True, env=build_sandbox_env()
+    )
+
+
+def run_scheduled():
+    from sandbox import run_python_code
+
+    run_python_code(JOB_CODE, timeout=600)
+
+
+def simulate(fn, jobs) -> dict:
+    """jobs: [(租户, 任务数)]，所有任务同时提交；返回每个租户的任务完成时间"""
+    from sandbox_scheduler import tenant
+
+    latencies = defaultdict(list)
+    start = time.perf_counter()
+
+    def worker(name):
+        with tenant(name):
+            fn()
+        latencies[name].append(time.perf_counter() - start)
+
+    threads = [
+        threading.Thread(target=worker, args=(name,))
+        for name, count in jobs
+        for _ in range(count)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return {"total": time.perf_counter() - start, "latencies": latencies}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="沙箱调度基准")
+    parser.add_argument("--heavy-jobs", type=int, default=12, help="大户租户的任务数")
+    parser.add_argument("--light-tenants", type=int, default=3, help="小租户数")
+    parser.add_argument("--light-jobs", type=int, default=2, help="每个小租户的任务数")
+    args = parser.parse_args()
+
+    from sandbox_scheduler import get_sandbox_scheduler
+
+    jobs = [("heavy", args.heavy_jobs)] + [
+        (f"light-{i}", args.light_jobs) for i in range(args.light_tenants)
+    ]
+    scheduler = get_sandbox_scheduler()
+    print(
+        f"可用 CPU {len(scheduler.cpus)}，并发上限 {scheduler.max_concurrency}，"
+        f"每任务 {scheduler.threads_per_job} 线程，绑核 {scheduler.pin_cpus}"
+    )
+    print(f"{'方式':<14}{'总耗时(s)':>10}{'大户中位(s)':>12}{'小租户中位(s)':>14}{'小租户最大(s)':>14}")
+    for mode, fn in [("unscheduled", run_unscheduled), ("scheduled", run_scheduled)]:
+        result = simulate(fn, jobs)
+        light = [t for name, ts in result["latencies"].items() if name != "heavy" for t in ts]
+        print(
+            f"{mode:<14}{result['total']:>10.2f}"
+            f"{statistics.median(result['latencies']['heavy']):>12.2f}"
+            f"{statistics.median(light) if light else 0:>14.2f}{max(light, default=0):>14.2f}"
+        )
+    stats = scheduler.stats()
+    print(
+        f"排队: P50 {stats['queue_p50']:.2f}s  P95 {stats['queue_p95']:.2f}s  "
+        f"最大 {stats['queue_max']:.2f}s"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+编排进程启动耗时基准
+
+在全新的解释器中分别导入编排进程用到的模块，测量：
+- 导入耗时（相对空解释器启动的增量）
+- 导入后是否已经加载了重量级依赖（pandas / matplotlib / seaborn 只应出现在沙箱子进程，
+  langchain / langgraph / openai 等应推迟到第一次使用）
+
+用法:
+    python bench_startup.py --runs 5
+    python bench_startup.py --importtime model_router   # 打印 -X importtime 中最慢的导入
+"""
+
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+HERE = Path(__file__).resolve().parent
+
+# 编排进程在启动时导入的模块
+ORCHESTRATOR_MODULES = [
+    "prompt",
+    "utils",
+    "sandbox",
+    "preflight",
+    "dataset_cache",
+    "fix_cache",
+    "trace_replay",
+    "structured_stream",
+    "llm_scheduler",
+    "model_router",
+    "graph_registry",
+    "workspace",
+    "sandbox_scheduler",
+    "offload",
+]
+
+# 不应在启动时加载的重量级依赖
+HEAVY_MODULES = [
+    "pandas",
+    "numpy",
+    "matplotlib",
+    "seaborn",
+    "duckdb",
+    "pydantic",
+    "openai",
+    "langchain",
+    "langchain_core",
+    "langchain_openai",
+    "langgraph",
+]
+
+_PROBE = """
+import sys
+import {module}
+print(",".join(m for m in {heavy!r} if m in sys.modules))
+"""
+
+
+def time_import(module: str) -> tuple:
+    """在全新解释器中导入模块，返回 (耗时毫秒, 已加载的重量级依赖)"""
+    code = _PROBE.format(module=module, heavy=HEAVY_MODULES) if module else "pass"
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, cwd=HERE
+    )
+    elapsed = (time.perf_counter() - start) * 1000
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr)
+    loaded = [m for m in result.stdout.strip().split(",") if m]
+    return elapsed, loaded
+
+
+def print_importtime(module: str, top: int = 15):
+    """打印 -X importtime 中累计耗时最长的导入"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        cwd=HERE,
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        parts = line.split("|")
+        if len(parts) == 3 and parts[1].strip().isdigit():
+            rows.append((int(parts[1]), parts[2].rstrip()))
+    for cumulative, name in sorted(rows, reverse=True)[:top]:
+        print(f"{cumulative / 1000:>10.1f} ms  {name}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="编排进程启动耗时基准")
+    parser.add_argument("--runs", type=int, default=5, help="每个模块的运行次数")
+    parser.add_argument("--importtime", metavar="MODULE", help="打印该模块的导入耗时明细")
+    args = parser.parse_args()
+
+    if args.importtime:
+        print_importtime(args.importtime)
+        return
+
+    baseline = statistics.median(time_import("")[0] for _ in range(args.runs))
+    print(f"空解释器启动: {baseline:.1f} ms")
+    print(f"{'模块':<20}{'导入增量(ms)':>14}  启动时已加载的重量级依赖")
+    for module in ORCHESTRATOR_MODULES:
+        samples, loaded = [], []
+        for _ in range(args.runs):
+            elapsed, loaded = time_import(module)
+            samples.append(elapsed)
+        print(
+            f"{module:<20}{statistics.median(samples) - baseline:>14.1f}  "
+            f"{', '.join(loaded) or '-'}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,723 @@
+"""
+BI 数据分析 Agent
+
+原先定义在 adv_code_interpreter.ipynb 中的 BIAgentState、代码生成 / 执行 / 分析等工具，
+以及 create_agent 的组装。build_bi_agent() 经图注册表（graph_registry.py）在进程内只构建一次，之后复用编译好的图。
+
+    from bi_agent import build_bi_agent
+
+    agent = build_bi_agent()
+    result = agent.invoke(
+        {
+            "messages": [{"role": "user", "content": "分析 ./data.csv 的销售趋势"}],
+            "data_context": {"file_path": "./data.csv"},
+        }
+    )
+    print(result["analysis"])
+"""
+
+import json
+import subprocess
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+from langchain.agents import AgentState, create_agent
+from langchain.messages import HumanMessage, SystemMessage, ToolMessage
+from langchain.tools import ToolRuntime, tool
+from langgraph.types import Command
+
+from dataset_cache import compact_summary, ensure_summary, get_profile
+from graph_registry import register_graph
+from model_router import get_router
+from offload import warm_up as warm_up_offload
+from prompt import (
+    APPROXIMATE_MODE_PROMPT,
+    CHUNKED_EXECUTION_PROMPT,
+    CODE_GENERATOR_SYSTEM_PROMPT,
+    CODE_INTERPRETER_AGENT_PROMPT,
+    DATA_SUMMARY_PROMPT,
+    RESULT_ANALYZER_SYSTEM_PROMPT,
+    SQL_GENERATOR_SYSTEM_PROMPT,
+)
+from sandbox import warm_up
+from sandbox_scheduler import tenant
+from utils import extract_python_code, extract_sql_code
+from workspace import get_workspaces
+
+router = get_router()
+
+# TODO 还可以继续优化，需要在execute_code那把添加一个llm，来提取每次都data_context，里面的列schema等等，做总结
+
+
+# 构建sub agent 作为bi数据分析 然后会集成到主agent的tool中
+class BIAgentState(AgentState):
+    current_task: str  # 目标
+    data_context: Dict[str, Any]  # 数据上下文（文件路径、schema等）
+    generated_code: str  # 当前生成的代码
+    execution_result: str  # 执行结果
+    error_message: str  # 错误信息
+    codegen_failures: int  # 代码连续执行失败的次数（达到阈值后代码生成升级到强模型）
+    failed_code: str  # 最近一次执行失败的代码（用于记录修复）
+    failed_at: float  # 最近一次执行失败的时间
+    analysis: str  # 分析结论
+    artifacts: List[Dict[str, Any]]  # 本会话生成的图表（artifact_store 中的 ID 与文件名）
+    iteration_count: int  # 重试次数
+    max_iterations: int  # 最大重试次数
+
+
+def build_codegen_messages(task_description: str, state: Dict[str, Any]) -> list:
+    """根据任务描述和 State（数据上下文、上次的错误等）构造代码生成的消息"""
+    data_context = state.get("data_context")
+    previous_error = state.get("error_message")
+
+    err_prompt = ""
+    data_context_prompt = ""
+
+    if data_context:
+        try:
+            context_dict = (
+                json.loads(data_context)
+                if isinstance(data_context, str)
+                else data_context
+            )
+            context_str = json.dumps(context_dict, ensure_ascii=False, indent=2)
+            data_context_prompt = f"**数据上下文:**\n```json\n{context_str}\n```\n"
+        except:
+            data_context_prompt = f"**数据上下文:**\n{data_context}\n"
+
+    # 数据文件超出内存预算时，切换到分块执行模式
+    chunked_prompt = ""
+    file_path = data_context.get("file_path") if isinstance(data_context, dict) else None
+    profile = get_profile(file_path) if file_path else None
+    if profile and profile.execution_mode == "chunked":
+        chunked_prompt = CHUNKED_EXECUTION_PROMPT.format(
+            size_mb=profile.size_bytes / 1024 / 1024
+        )
+
+    # 单遍画像（按文件版本缓存），生成的代码不必再逐项探索数据
+    summary_prompt = ""
+    summary = ensure_summary(profile) if profile else None
+    if summary:
+        summary_prompt = DATA_SUMMARY_PROMPT.format(
+            summary=json.dumps(compact_summary(summary), ensure_ascii=False)
+        )
+
+    # 抽样预估模式：同一段代码先跑样本、再跑全量
+    approximate_prompt = ""
+    if isinstance(data_context, dict) and data_context.get("approximate"):
+        approximate_prompt = APPROXIMATE_MODE_PROMPT
+
+    if previous_error:
+        err_prompt = f"""
+**⚠️ 之前的代码执行失败了！错误信息如下:**
+```
+{previous_error}
+```
+
+**请仔细分析错误原因，生成修复后的代码。**
+常见修复方法:
+- FileNotFoundError: 检查文件路径，使用绝对路径或确认相对路径正确
+- KeyError: 先打印df.columns查看实际列名，不要假设列名
+- ValueError: 检查数据类型，必要时进行类型转换
+- ImportError: 确保导入了所有必要的库
+"""
+
+    user_message = f"""
+        **任务描述:**
+        {task_description}
+        {data_context_prompt}
+        {summary_prompt}
+        {chunked_prompt}
+        {approximate_prompt}
+        {err_prompt}
+        **输出要求:**
+        1. 只输出Python代码，不要有任何解释文字
+        2. 代码必须放在 ```python 代码块内
+        3. 代码要完整、可直接执行
+        4. 使用print()输出关键信息
+    """
+
+    print("****generate_code 用户输入：***** \n", user_message)
+    print("\n")
+
+    return [
+        SystemMessage(content=CODE_GENERATOR_SYSTEM_PROMPT),
+        HumanMessage(content=user_message),
+    ]
+
+
+@tool
+def generate_code(task_description: str, runtime: ToolRuntime) -> Command:
+    """
+    生成Python数据分析代码。
+
+    这个工具会调用LLM生成高质量的、可执行的Python代码。
+
+    Args:
+        task_description: 要完成的任务描述，例如："分析data.csv的销售趋势"
+
+    Returns:
+        生成的Python代码字符串（不含markdown代码块标记）
+
+    Examples:
+        >>> # 生成代码
+        >>> code = generate_python_code(
+        ...     task_description="统计data.csv的基本信息",
+        ... )
+    """
+
+    messages = build_codegen_messages(task_description, runtime.state)
+
+    # 调用llm
+    model = router.get(
+        "codegen",
+        failures=runtime.state.get("codegen_failures", 0),
+        temperature=0.2,  # 代码生成使用较低温度，保证稳定性
+    )
+
+    result = model.invoke(messages)
+
+    raw_content = result.content
+    # 提取python代码（去除markdown标志）
+    code = extract_python_code(raw_content)
+    if not code:
+        # 如果没有提取到代码块，可能LLM直接返回了代码
+        code = raw_content.strip()
+
+    print("生成的代码:\n", code)
+    print("\n")
+
+    return Command(
+        update={
+            "generated_code": code,
+            "messages": [
+                ToolMessage(
+                    content=code,
+                    tool_call_id=runtime.tool_call_id,
+                )
+            ],
+        }
+    )
+
+
+def session_id(runtime: ToolRuntime) -> str:
+    """会话 ID：取调用配置中的 thread_id，未设置时归入 default"""
+    config = getattr(runtime, "config", None) or {}
+    return str(config.get("configurable", {}).get("thread_id") or "default")
+
+
+def collect_artifacts(
+    runtime: ToolRuntime, directory: Path, since: float
+) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """
+    把本次执行生成的图表存入 artifact_store，并通过 custom 流推送 ID，客户端按需拉取原图 / 缩略图
+
+    Returns:
+        (本次生成的图表, 本会话累计的图表列表（写回 State）)
+    """
+    from artifact_store import get_artifact_store
+    from langgraph.config import get_stream_writer
+
+    artifacts = get_artifact_store().collect(session_id(runtime), str(directory), since)
+    if artifacts:
+        writer = get_stream_writer()
+        for artifact in artifacts:
+            writer({"type": "artifact", **artifact})
+    names = {artifact["name"] for artifact in artifacts}
+    previous = [
+        artifact
+        for artifact in runtime.state.get("artifacts") or []
+        if artifact["name"] not in names
+    ]
+    return artifacts, previous + artifacts
+
+
+def format_artifacts(artifacts: List[Dict[str, Any]]) -> str:
+    if not artifacts:
+        return ""
+    lines = [f"- {artifact['name']} (artifact: {artifact['id']})" for artifact in artifacts]
+    return "\n\n生成的图表：\n" + "\n".join(lines)
+
+
+def execution_succeeded(
+    runtime: ToolRuntime,
+    code: str,
+    stdout: str,
+    new_artifacts: List[Dict[str, Any]],
+    artifacts: List[Dict[str, Any]],
+    note: str = "",
+    record_fix: bool = True,
+) -> Command:
+    """
+    代码执行成功后的 State 更新：清空失败记录、重置失败次数
+
+    record_fix 为 True 时，若上一次执行失败、这次经 LLM 重新生成后成功，把这次修复记入 fix_cache，
+    下次同类错误可在本地直接修复（本身就来自缓存的修复不再重复记录）。
+    """
+    from fix_cache import get_fix_cache
+
+    failed_code = runtime.state.get("failed_code")
+    if record_fix and failed_code and runtime.state.get("error_message"):
+        get_fix_cache().record(
+            failed_code,
+            runtime.state["error_message"],
+            code,
+            llm_seconds=time.time() - runtime.state.get("failed_at", time.time()),
+        )
+    return Command(
+        update={
+            "generated_code": code,
+            "execution_result": stdout,
+            "error_message": "",  # 清空错误信息
+            "failed_code": "",
+            "codegen_failures": 0,
+            "artifacts": artifacts,
+            "messages": [
+                ToolMessage(
+                    content=f"✅ 代码执行成功{note}\n\n{stdout}" + format_artifacts(new_artifacts),
+                    tool_call_id=runtime.tool_call_id,
+                )
+            ],
+        }
+    )
+
+
+def execution_failed(
+    runtime: ToolRuntime, code: str, error: str, summary: str = "代码执行失败"
+) -> Command:
+    """代码执行失败后的 State 更新：记录失败代码与时间，失败次数加一（达到阈值后代码生成升级到强模型）"""
+    return Command(
+        update={
+            "generated_code": code,
+            "error_message": error,
+            "failed_code": code,
+            "failed_at": time.time(),
+            "codegen_failures": runtime.state.get("codegen_failures", 0) + 1,
+            "messages": [
+                ToolMessage(
+                    content=f"❌ {summary}\n\n错误信息：\n{error}",
+                    tool_call_id=runtime.tool_call_id,
+                )
+            ],
+        }
+    )
+
+
+@tool
+def execute_code(runtime: ToolRuntime):
+    """运行python脚本
+
+    不需要任何参数！直接从 State 读取生成的代码并执行。
+
+    Returns:
+        执行结果描述
+    """
+    from fix_cache import get_fix_cache
+    from offload import preflight_check
+    from sandbox import run_python_code
+
+    code = runtime.state.get("generated_code")
+
+    print("获得的代码:\n", code)
+    print("\n")
+
+    if not code:
+        return Command(
+            update={
+                "error_message": "没有可执行的代码",
+                "messages": [
+                    ToolMessage(
+                        content="❌ 错误：没有可执行的代码。请先调用 generate_code。",
+                        tool_call_id=runtime.tool_call_id,
+                    )
+                ],
+            }
+        )
+
+    data_context = runtime.state.get("data_context")
+    datasets = [data_context.get("file_path")] if isinstance(data_context, dict) else []
+    fix_cache = get_fix_cache()
+
+    # 在会话自己的工作目录中执行，并发会话的输出文件互不覆盖；子进程按会话公平排队
+    session = session_id(runtime)
+    with get_workspaces().use(session, datasets) as workdir, tenant(session):
+        started_at = time.time()
+        # 静态预检：注定失败的代码不再启动子进程
+        # 相对路径按会话工作目录检查，前几步写出的中间文件不会被误判为不存在
+        preflight_errors = preflight_check(code, data_context, cwd=str(workdir))
+        if preflight_errors:
+            # 按一次失败的执行处理：同样计入失败次数、记录失败代码，并尝试缓存中的已知修复
+            result = subprocess.CompletedProcess(
+                args=[],
+                returncode=1,
+                stdout="",
+                stderr="代码预检失败（未执行）:\n" + "\n".join(preflight_errors),
+            )
+        elif isinstance(data_context, dict) and data_context.get("approximate"):
+            # 抽样预估模式：样本运行成功就把初步结果推送给客户端并返回给 Agent，
+            # 全量运行在后台继续，完成后把精确结果和图表通过 custom 流推送（不写回 State）
+            from approximate import run_progressive
+            from artifact_store import get_artifact_store
+            from langgraph.config import get_stream_writer
+
+            writer = get_stream_writer()
+
+            def on_exact(exact: subprocess.CompletedProcess):
+                if exact.returncode != 0:
+                    writer({"type": "exact_result", "error": exact.stderr})
+                    return
+                exact_artifacts = get_artifact_store().collect(
+                    session, str(workdir), started_at
+                )
+                writer(
+                    {
+                        "type": "exact_result",
+                        "output": exact.stdout,
+                        "artifacts": exact_artifacts,
+                    }
+                )
+
+            result = run_progressive(
+                code,
+                data_context,
+                on_preliminary=lambda output: writer(
+                    {"type": "preliminary_result", "output": output}
+                ),
+                on_exact=on_exact,
+                timeout=10,
+                cwd=str(workdir),
+                session=session,
+            )
+        else:
+            result = run_python_code(code, timeout=10, cwd=str(workdir))
+
+        # 失败时先尝试缓存中的已知修复，命中则省掉一轮 LLM 调用
+        cached = None
+        if result.returncode != 0:
+            cached = fix_cache.try_fix(code, result.stderr, data_context, cwd=str(workdir))
+        if result.returncode == 0 or cached is not None:
+            new_artifacts, artifacts = collect_artifacts(runtime, workdir, started_at)
+
+    if result.returncode == 0:
+        return execution_succeeded(runtime, code, result.stdout, new_artifacts, artifacts)
+
+    if cached is not None:
+        fixed_code, fixed_result = cached
+        return execution_succeeded(
+            runtime,
+            fixed_code,
+            fixed_result.stdout,
+            new_artifacts,
+            artifacts,
+            note="（已自动应用缓存中的修复）",
+            record_fix=False,
+        )
+
+    return execution_failed(runtime, code, result.stderr)
+
+
+@tool
+def analyze_results(runtime: ToolRuntime):
+    """
+    分析代码执行结果，生成用户友好的数据分析报告。
+
+    这个工具专注于分析代码的执行输出，将技术性结果转化为业务洞察。
+
+    不需要任何参数，从 State 中读取所有需要的信息（task、output、data_context）。
+
+    Returns:
+        Markdown格式的数据分析报告
+
+    Examples:
+        >>> report = analyze_results()
+        >>> print(report)
+        # 销售数据分析报告
+        ...
+
+    Note:
+        为了让分析更准确，生成的代码应该在输出中包含：
+        - 清晰的任务描述（"正在分析销售趋势..."）
+        - 数据处理步骤说明
+        - 图表类型和保存路径（如果生成了图表）
+        这样分析工具无需查看代码就能理解做了什么。
+    """
+    # 初始化LLM
+    llm = router.get("analyzer", temperature=0.7)  # 分析报告可以稍微有创造性
+
+    original_task = runtime.state.get("current_task", "数据分析任务")
+    data_context = runtime.state.get("data_context", {})
+    execution_output = runtime.state.get("execution_result", "")
+
+    # 构建用户消息（不再包含代码）
+    user_message = f"""
+请基于以下信息，撰写一份专业的数据分析报告。
+
+## 上下文信息
+
+### 1. 用户原始任务
+{original_task}
+
+### 2. 数据上下文
+{data_context or "无额外上下文"}
+
+### 3. 代码执行输出
+```
+{execution_output}
+```
+
+## 分析要求
+
+请按照以下结构撰写报告（使用Markdown格式）：
+
+1. **数据概览**: 解读统计数据，说明数据规模、质量、基本特征
+2. **核心发现**: 3-5个最重要的洞察，每个洞察要有数据支撑和业务解读
+3. **图表解读**: 如果输出中提到生成了图表，解释图表的作用和意义
+4. **结论**: 直接回答用户的原始问题
+5. **建议**: 基于数据提供可行的业务建议
+
+## 写作原则
+
+- 用业务语言，避免技术术语
+- 每个结论都要有数据支撑
+- 关注"So What"（数据的业务含义）
+- 简洁有力，一段话表达一个核心观点
+- 提供具体、可操作的建议
+
+请开始撰写分析报告：˝
+"""
+
+    print("报告用户输入:\n", user_message)
+    print("\n")
+
+    # 调用LLM
+    messages = [
+        SystemMessage(content=RESULT_ANALYZER_SYSTEM_PROMPT),
+        HumanMessage(content=user_message),
+    ]
+
+    # 流式调用：token 通过图的 messages 流直接推送给客户端，
+    # 客户端按 tags 中的 "analysis_report" 过滤即可边生成边展示报告
+    analysis_report = ""
+    for chunk in llm.stream(messages, config={"tags": ["analysis_report"]}):
+        analysis_report += chunk.content
+
+    print("报告结果：\n", analysis_report)
+    print("\n")
+
+    return Command(
+        update={
+            "analysis": analysis_report,
+            "messages": [
+                ToolMessage(content=analysis_report, tool_call_id=runtime.tool_call_id)
+            ],
+        }
+    )
+
+
+@tool
+def speculative_execute(task_description: str, runtime: ToolRuntime) -> Command:
+    """
+    推测式生成并执行代码（相当于并行版的 generate_code + execute_code）。
+
+    并发生成多份不同的候选代码，预检后在独立子进程中并行执行，
+    采用第一个执行成功的结果，其余候选立即取消。
+    适合已经失败过一次、或容易出错的复杂任务。
+
+    Args:
+        task_description: 要完成的任务描述，例如："分析data.csv的销售趋势"
+
+    Returns:
+        执行结果描述
+    """
+    from speculative import speculative_execute as run_speculative
+
+    messages = build_codegen_messages(task_description, runtime.state)
+    code_model = router.get(
+        "codegen",
+        failures=runtime.state.get("codegen_failures", 0),
+        temperature=0.2,
+    )
+
+    data_context = runtime.state.get("data_context")
+    datasets = [data_context.get("file_path")] if isinstance(data_context, dict) else []
+    session = session_id(runtime)
+    with get_workspaces().use(session, datasets) as workdir, tenant(session):
+        started_at = time.time()
+        winner, candidates = run_speculative(
+            messages, code_model, data_context, cwd=str(workdir)
+        )
+        if winner is not None:
+            new_artifacts, artifacts = collect_artifacts(runtime, workdir, started_at)
+
+    if winner is None:
+        # 与 execute_code 一样记录失败，失败次数计入模型升级，成功重试时可记录修复
+        failed = next((c for c in candidates if c.code and c.error), None)
+        return execution_failed(
+            runtime,
+            failed.code if failed else next((c.code for c in candidates if c.code), ""),
+            failed.error if failed else "所有候选代码均执行失败",
+            summary=f"{len(candidates)} 份候选代码均执行失败",
+        )
+
+    print(f"采用候选 {winner.index}（temperature={winner.temperature}）:\n", winner.code)
+    print("\n")
+
+    return execution_succeeded(runtime, winner.code, winner.stdout, new_artifacts, artifacts)
+
+
+@tool
+def batch_analyze(task_descriptions: List[str], runtime: ToolRuntime) -> Command:
+    """
+    批量分析同一数据集上的多个独立问题。
+
+    一次生成包含多个任务函数的脚本，只加载一次数据、只启动一个子进程执行，
+    再把每个任务的输出分别交给结果分析，生成各自的报告。
+
+    Args:
+        task_descriptions: 拆分好的问题列表，例如 ["各商品类型的销售金额", "零售价最高的10个商品"]
+
+    Returns:
+        每个问题的分析报告
+    """
+    from batch import analyze_sections, run_batch
+
+    data_context = runtime.state.get("data_context") or {}
+    if isinstance(data_context, str):
+        data_context = json.loads(data_context)
+
+    code_model = router.get("codegen", temperature=0.2)
+    analysis_model = router.get("analyzer", temperature=0.7)
+
+    datasets = [data_context.get("file_path")]
+    session = session_id(runtime)
+    with get_workspaces().use(session, datasets) as workdir, tenant(session):
+        started_at = time.time()
+        sections = run_batch(task_descriptions, data_context, code_model, cwd=str(workdir))
+        new_artifacts, artifacts = collect_artifacts(runtime, workdir, started_at)
+    reports = analyze_sections(sections, data_context, analysis_model)
+
+    analysis_report = "\n\n---\n\n".join(
+        f"## 问题{section.index}: {section.task}\n\n{report}"
+        for section, report in zip(sections, reports)
+    )
+
+    print("批量报告结果：\n", analysis_report)
+    print("\n")
+
+    return Command(
+        update={
+            "analysis": analysis_report,
+            "artifacts": artifacts,
+            "messages": [
+                ToolMessage(
+                    content=analysis_report + format_artifacts(new_artifacts),
+                    tool_call_id=runtime.tool_call_id,
+                )
+            ],
+        }
+    )
+
+
+@tool
+def sql_query(task_description: str, runtime: ToolRuntime) -> Command:
+    """
+    用 SQL 直接查询数据集，回答聚合类问题。
+
+    适合分组汇总、排名 Top-N、平均值、计数等不需要图表的问题。
+    数据集注册在进程内的 DuckDB 中，不启动子进程，也不把整个文件加载到内存。
+    查询结果会写入 execution_result，之后可以直接调用 analyze_results。
+
+    Args:
+        task_description: 要回答的问题，例如："各商品类型的销售总额"
+
+    Returns:
+        查询结果表格
+    """
+    from sql_engine import get_engine
+
+    data_context = runtime.state.get("data_context") or {}
+    if isinstance(data_context, str):
+        data_context = json.loads(data_context)
+
+    engine = get_engine()
+    sql = ""
+    try:
+        table = engine.register_dataset(data_context["file_path"])
+        schema = ", ".join(f"{name} {dtype}" for name, dtype in engine.schema(table))
+
+        messages = [
+            SystemMessage(content=SQL_GENERATOR_SYSTEM_PROMPT),
+            HumanMessage(
+                content=f'表: "{table}"，列: {schema}\n问题: {task_description}'
+            ),
+        ]
+        sql_model = router.get("codegen", temperature=0)
+        raw_content = sql_model.invoke(messages).content
+        sql = extract_sql_code(raw_content) or raw_content.strip()
+
+        print("生成的SQL:\n", sql)
+        print("\n")
+
+        output = engine.query(sql)
+    except Exception as e:
+        return Command(
+            update={
+                "error_message": str(e),
+                "messages": [
+                    ToolMessage(
+                        content=f"❌ SQL 查询失败\n\n错误信息：\n{e}\n\nSQL:\n{sql}",
+                        tool_call_id=runtime.tool_call_id,
+                    )
+                ],
+            }
+        )
+
+    return Command(
+        update={
+            "current_task": task_description,
+            "generated_code": sql,
+            "execution_result": output,
+            "error_message": "",
+            "messages": [
+                ToolMessage(
+                    content=f"✅ 查询成功\n\n{output}",
+                    tool_call_id=runtime.tool_call_id,
+                )
+            ],
+        }
+    )
+
+
+TOOLS = [
+    generate_code,
+    execute_code,
+    analyze_results,
+    speculative_execute,
+    batch_analyze,
+    sql_query,
+]
+
+
+@register_graph("bi_agent")
+def build_bi_agent():
+    """
+    构建 BI 数据分析 Agent（每个进程只构建一次）
+
+    编译好的图不保存会话状态，可以在多个请求之间并发复用，每次 invoke 传入各自的 State。
+
+    Returns:
+        编译好的 Agent 图
+    """
+    # 预热执行环境：预构建字体缓存并固定中文字体，首张图表不再变慢
+    warm_up()
+    # 预检进程池的 worker 在后台启动，不拖慢构建
+    threading.Thread(target=warm_up_offload, daemon=True).start()
+
+    return create_agent(
+        model=router.get("executor", temperature=1),
+        tools=TOOLS,
+        system_prompt=CODE_INTERPRETER_AGENT_PROMPT,
+        state_schema=BIAgentState,
+    )
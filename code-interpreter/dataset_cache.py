@@ -0,0 +1,556 @@
+"""
+数据集画像缓存
+
+在宿主进程中缓存数据文件的画像（列名等元数据），供预检、代码生成等环节复用，
+避免为了获取列名而启动子进程或完整加载数据。
+缓存按 (绝对路径, 修改时间, 文件大小) 失效。
+"""
+
+import csv
+import hashlib
+import json
+import os
+import shutil
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Dict, List, Literal, Optional, Tuple
+
+# 超过该大小的数据文件不再整体读入内存，改用分块执行模式
+LARGE_DATASET_BYTES = int(os.getenv("LARGE_DATASET_BYTES", 1024 * 1024 * 1024))
+
+# 抽样预估模式下样本的目标行数
+SAMPLE_ROWS = int(os.getenv("SAMPLE_ROWS", 100_000))
+
+# 分层抽样的分层列最多允许的取值个数
+MAX_STRATA = 100
+
+# 单遍画像子进程的超时时间（秒）
+PROFILE_TIMEOUT = int(os.getenv("PROFILE_TIMEOUT", 600))
+
+# 判断文件是否只是追加时，抽样比较旧文件前缀的块数与每块字节数
+FINGERPRINT_BLOCKS = 8
+FINGERPRINT_BLOCK_BYTES = 64 * 1024
+
+# 每个数据文件在清单中保留的最近版本数
+MANIFEST_VERSIONS = 5
+
+# 可以按追加增量更新的文本格式
+APPENDABLE_EXTS = (".csv", ".tsv", ".txt")
+
+# 数据集列式缓存（Parquet）所在目录
+DATASET_CACHE_DIR = Path(
+    os.getenv(
+        "DATASET_CACHE_DIR",
+        Path.home() / ".cache" / "ai-practices" / "datasets",
+    )
+)
+
+
+@dataclass
+class DatasetProfile:
+    """数据文件画像"""
+
+    path: str  # 文件绝对路径
+    size_bytes: int  # 文件大小
+    mtime_ns: int  # 修改时间
+    columns: List[str] = field(default_factory=list)  # 列名
+
+    @property
+    def execution_mode(self) -> Literal["in_memory", "chunked"]:
+        """根据文件大小选择执行模式"""
+        return "chunked" if self.size_bytes > LARGE_DATASET_BYTES else "in_memory"
+
+
+@dataclass
+class DatasetSample:
+    """数据集的分层抽样样本"""
+
+    path: str  # 样本文件路径（与原文件格式相同，生成代码无需修改即可读取）
+    fraction: float  # 抽样比例
+    strata: Optional[str]  # 分层列，None 表示简单随机抽样
+    design: str  # 抽样设计文件（JSON：样本每行所属的层、各层总体行数），供沙箱内按层加权估计
+
+
+_PROFILE_CACHE: Dict[str, Tuple[Tuple[int, int], DatasetProfile]] = {}
+
+# 在沙箱子进程中运行单遍画像（见 sandbox_site/profiler.py），宿主进程不加载 pandas / numpy
+_SUMMARY_CODE = """
+import json
+from profiler import profile_file
+
+print(json.dumps(profile_file({path!r}, state_path={state_path!r}), ensure_ascii=False))
+"""
+
+# 文件追加数据后，从旧版本的画像状态继续，只处理新增的行
+_APPEND_SUMMARY_CODE = """
+import json
+from profiler import profile_append
+
+summary = profile_append({path!r}, {offset!r}, {old_state_path!r}, {state_path!r})
+print(json.dumps(summary, ensure_ascii=False))
+"""
+
+
+def read_columns(path: str) -> List[str]:
+    """
+    只读取表头，获取数据文件的列名
+
+    Args:
+        path: 数据文件路径
+
+    Returns:
+        列名列表，不支持的文件类型返回空列表
+    """
+    ext = os.path.splitext(path)[1].lower()
+
+    if ext in (".csv", ".tsv", ".txt"):
+        with open(path, newline="", encoding="utf-8-sig", errors="replace") as f:
+            delimiter = "\t" if ext == ".tsv" else ","
+            header = next(csv.reader(f, delimiter=delimiter), [])
+        return [name.strip() for name in header]
+
+    if ext in (".xlsx", ".xls"):
+        import pandas as pd
+
+        return [str(c) for c in pd.read_excel(path, nrows=0).columns]
+
+    if ext == ".parquet":
+        import pyarrow.parquet as pq
+
+        return list(pq.read_schema(path).names)
+
+    return []
+
+
+def get_profile(path: str) -> Optional[DatasetProfile]:
+    """
+    获取数据文件画像（带缓存）
+
+    Args:
+        path: 数据文件路径
+
+    Returns:
+        DatasetProfile，文件不存在时返回 None
+    """
+    abs_path = os.path.abspath(path)
+    try:
+        stat = os.stat(abs_path)
+    except OSError:
+        return None
+
+    key = (stat.st_mtime_ns, stat.st_size)
+    cached = _PROFILE_CACHE.get(abs_path)
+    if cached and cached[0] == key:
+        return cached[1]
+
+    profile = DatasetProfile(
+        path=abs_path,
+        size_bytes=stat.st_size,
+        mtime_ns=stat.st_mtime_ns,
+        columns=read_columns(abs_path),
+    )
+    _PROFILE_CACHE[abs_path] = (key, profile)
+    return profile
+
+
+def _file_digest(profile: DatasetProfile) -> str:
+    return hashlib.sha1(profile.path.encode("utf-8")).hexdigest()[:16]
+
+
+def columnar_path(profile: DatasetProfile) -> Path:
+    """数据文件对应的列式缓存路径，文件内容变化（大小/修改时间）后路径随之变化"""
+    return (
+        DATASET_CACHE_DIR
+        / f"{_file_digest(profile)}-{profile.mtime_ns}-{profile.size_bytes}.parquet"
+    )
+
+
+def prefix_fingerprint(path: str, size: int) -> str:
+    """
+    文件前 size 字节的抽样指纹
+
+    取开头、结尾和均匀分布的若干块计算哈希，读取量与文件大小无关；
+    块的位置只由 size 决定，所以同一前缀在追加前后得到的指纹相同。
+    """
+    block = FINGERPRINT_BLOCK_BYTES
+    offsets = {0, max(0, size - block)}
+    offsets.update(size * i // (FINGERPRINT_BLOCKS + 1) for i in range(1, FINGERPRINT_BLOCKS + 1))
+    digest = hashlib.blake2b(str(size).encode("ascii"), digest_size=16)
+    with open(path, "rb") as f:
+        for offset in sorted(offsets):
+            f.seek(offset)
+            digest.update(f.read(min(block, size - offset)))
+    return digest.hexdigest()
+
+
+def _manifest_path(profile: DatasetProfile) -> Path:
+    return DATASET_CACHE_DIR / f"{_file_digest(profile)}.manifest.json"
+
+
+def record_version(profile: DatasetProfile):
+    """把当前版本（大小、修改时间、前缀指纹）记入清单，供下次判断是否只是追加"""
+    if not profile.path.endswith(APPENDABLE_EXTS):
+        return
+    manifest = _manifest_path(profile)
+    versions = json.loads(manifest.read_text(encoding="utf-8")) if manifest.exists() else []
+    if any(v["size"] == profile.size_bytes and v["mtime_ns"] == profile.mtime_ns for v in versions):
+        return
+    versions.insert(
+        0,
+        {
+            "size": profile.size_bytes,
+            "mtime_ns": profile.mtime_ns,
+            "fingerprint": prefix_fingerprint(profile.path, profile.size_bytes),
+        },
+    )
+    DATASET_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    tmp = manifest.with_suffix(".tmp")
+    tmp.write_text(json.dumps(versions[:MANIFEST_VERSIONS]), encoding="utf-8")
+    tmp.replace(manifest)
+
+
+def appended_from(
+    profile: DatasetProfile, artifact: Callable[[DatasetProfile], Path]
+) -> Optional[DatasetProfile]:
+    """
+    判断文件是否是在某个已缓存版本的末尾追加了数据
+
+    旧版本需要满足：比当前文件小、以换行结尾（新增部分从行首开始）、
+    当前文件同样长度的前缀指纹与记录一致，并且该版本的 artifact 缓存仍然存在。
+
+    Args:
+        profile: 当前版本的数据文件画像
+        artifact: 由版本画像得到缓存路径的函数，例如 columnar_path / sketch_path
+
+    Returns:
+        可以在其基础上增量更新的旧版本画像；不是追加或没有可用的旧缓存时返回 None
+    """
+    manifest = _manifest_path(profile)
+    if not profile.path.endswith(APPENDABLE_EXTS) or not manifest.exists():
+        return None
+
+    with open(profile.path, "rb") as f:
+        for version in json.loads(manifest.read_text(encoding="utf-8")):
+            size = version["size"]
+            if not 0 < size < profile.size_bytes:
+                continue
+            previous = DatasetProfile(
+                path=profile.path,
+                size_bytes=size,
+                mtime_ns=version["mtime_ns"],
+                columns=profile.columns,
+            )
+            if not artifact(previous).exists():
+                continue
+            f.seek(size - 1)
+            if f.read(1) != b"\n":
+                continue
+            if prefix_fingerprint(profile.path, size) == version["fingerprint"]:
+                return previous
+    return None
+
+
+def _write_tail(profile: DatasetProfile, offset: int) -> Path:
+    """把 offset 之后新增的字节复制到临时文件"""
+    digest = _file_digest(profile)
+    tail = DATASET_CACHE_DIR / f"{digest}-{profile.mtime_ns}-{profile.size_bytes}.tail"
+    with open(profile.path, "rb") as src, open(tail, "wb") as dst:
+        src.seek(offset)
+        shutil.copyfileobj(src, dst)
+    return tail
+
+
+def _append_columnar(profile: DatasetProfile, previous: DatasetProfile, dest: str):
+    """
+    在旧版本的列式缓存上追加新增的行
+
+    新增部分按旧缓存的列类型解析（不再做类型推断），与旧缓存合并写出；
+    只解析新增的 CSV，旧数据直接从 Parquet 读取。类型不兼容时抛出 duckdb.Error。
+    """
+    import duckdb
+
+    old = str(columnar_path(previous)).replace("'", "''")
+    tail = _write_tail(profile, previous.size_bytes)
+    try:
+        con = duckdb.connect()
+        schema = con.execute(f"DESCRIBE SELECT * FROM read_parquet('{old}')").fetchall()
+        columns = ", ".join(
+            "'{}': '{}'".format(name.replace("'", "''"), dtype) for name, dtype, *_ in schema
+        )
+        delim = "\t" if profile.path.endswith(".tsv") else ","
+        source = str(tail).replace("'", "''")
+        con.execute(
+            f"COPY (SELECT * FROM read_parquet('{old}') UNION ALL "
+            f"SELECT * FROM read_csv('{source}', header=false, delim='{delim}', "
+            f"columns={{{columns}}})) TO '{dest}' (FORMAT PARQUET)"
+        )
+    finally:
+        tail.unlink(missing_ok=True)
+
+
+def ensure_columnar(profile: DatasetProfile) -> Path:
+    """
+    确保数据文件已转换为列式缓存（Parquet），返回缓存路径
+
+    转换只在文件首次出现或发生变化时进行一次，旧版本的缓存会被清理。
+    文件只是在末尾追加了数据时，只解析新增的行并合并到旧版本的缓存上。
+
+    Args:
+        profile: 数据文件画像
+
+    Returns:
+        Parquet 缓存路径
+    """
+    if profile.path.endswith(".parquet"):
+        return Path(profile.path)
+
+    target = columnar_path(profile)
+    if target.exists():
+        return target
+
+    import duckdb
+
+    DATASET_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    tmp = target.with_suffix(".tmp")
+    dest = str(tmp).replace("'", "''")
+    previous = appended_from(profile, columnar_path)
+    if previous is not None:
+        try:
+            _append_columnar(profile, previous, dest)
+        except duckdb.Error as e:
+            print(f"增量更新列式缓存失败，改为全量转换: {str(e).splitlines()[0]}")
+            previous = None
+
+    if previous is None and profile.path.endswith((".xlsx", ".xls")):
+        import pandas as pd
+
+        pd.read_excel(profile.path).to_parquet(tmp)
+    elif previous is None:
+        source = profile.path.replace("'", "''")
+        duckdb.connect().execute(
+            f"COPY (SELECT * FROM read_csv_auto('{source}')) TO '{dest}' (FORMAT PARQUET)"
+        )
+    tmp.replace(target)
+    record_version(profile)
+
+    # 清理同一文件的旧版本缓存
+    prefix = target.name.split("-")[0]
+    for stale in DATASET_CACHE_DIR.glob(f"{prefix}-*.parquet"):
+        if stale != target and ".sample" not in stale.name:
+            stale.unlink(missing_ok=True)
+    return target
+
+
+def _choose_strata(con, source: str, columns: List[Tuple[str, str]]) -> Optional[str]:
+    """选择取值个数适中的文本列作为分层列，保证小类别也能进入样本"""
+    candidates = [name for name, dtype in columns if dtype == "VARCHAR"]
+    if not candidates:
+        return None
+    select = ", ".join(
+        f'approx_count_distinct("{name}")' for name in candidates
+    )
+    counts = con.execute(f"SELECT {select} FROM read_parquet('{source}')").fetchone()
+    for name, count in zip(candidates, counts):
+        if 1 < count <= MAX_STRATA:
+            return name
+    return None
+
+
+def ensure_sample(profile: DatasetProfile) -> Optional[DatasetSample]:
+    """
+    确保数据集已有分层抽样样本（随列式缓存一起维护），返回样本信息
+
+    按取值个数适中的文本列分层，每层按相同比例抽样且至少保留一行；
+    小层因此被超额抽样，估计时需按层加权（N_h / n_h），抽样设计随样本一起写出。
+    文件变化后自动重新抽样。
+
+    Args:
+        profile: 数据文件画像
+
+    Returns:
+        DatasetSample；数据量不超过 SAMPLE_ROWS 或文件格式不支持时返回 None
+    """
+    ext = os.path.splitext(profile.path)[1].lower()
+    if ext not in (".csv", ".parquet"):
+        return None
+
+    base = columnar_path(profile)
+    target = base.with_name(base.stem + f".sample{ext}")
+    meta_path = base.with_name(base.stem + ".sample.json")
+    design_path = base.with_name(base.stem + ".sample.design.json")
+    if target.exists() and meta_path.exists() and design_path.exists():
+        meta = json.loads(meta_path.read_text(encoding="utf-8"))
+        # 旧版本的样本没有抽样设计，重新抽样
+        if "design" in meta:
+            return DatasetSample(**meta)
+
+    import duckdb
+
+    source = str(ensure_columnar(profile)).replace("'", "''")
+    con = duckdb.connect()
+    total = con.execute(f"SELECT count(*) FROM read_parquet('{source}')").fetchone()[0]
+    if total <= SAMPLE_ROWS:
+        return None
+
+    fraction = SAMPLE_ROWS / total
+    columns = con.execute(f"DESCRIBE SELECT * FROM read_parquet('{source}')").fetchall()
+    strata = _choose_strata(con, source, [(c[0], c[1]) for c in columns])
+
+    if strata:
+        quoted = '"' + strata.replace('"', '""') + '"'
+        query = f"""
+            SELECT * EXCLUDE (_rn, _cnt) FROM (
+                SELECT *,
+                    row_number() OVER (PARTITION BY {quoted} ORDER BY random()) AS _rn,
+                    count(*) OVER (PARTITION BY {quoted}) AS _cnt
+                FROM read_parquet('{source}')
+            ) WHERE _rn <= greatest(1, ceil(_cnt * {fraction}))
+        """
+    else:
+        query = (
+            f"SELECT * FROM read_parquet('{source}') "
+            f"USING SAMPLE {fraction * 100:.6f} PERCENT (bernoulli)"
+        )
+
+    # 给样本的每一行标上所属层的编号，并按固定的行序写出样本与抽样设计，
+    # 沙箱内读到的第 i 行与设计中的第 i 个层编号对应
+    key = quoted if strata else "0"
+    con.execute(
+        f"""
+        CREATE TEMP TABLE _population AS
+        SELECT *, row_number() OVER () - 1 AS _code FROM (
+            SELECT {key} AS _value, count(*) AS _n FROM read_parquet('{source}') GROUP BY 1
+        )
+        """
+    )
+    con.execute(
+        f"""
+        CREATE TEMP TABLE _sample AS
+        SELECT *, row_number() OVER () AS _row FROM (
+            SELECT s.*, p._code AS _stratum
+            FROM ({query}) s JOIN _population p
+            ON {"s." + quoted if strata else "0"} IS NOT DISTINCT FROM p._value
+        )
+        """
+    )
+
+    fmt = "FORMAT CSV, HEADER" if ext == ".csv" else "FORMAT PARQUET"
+    dest = str(target).replace("'", "''")
+    con.execute(
+        f"COPY (SELECT * EXCLUDE (_stratum, _row) FROM _sample ORDER BY _row) "
+        f"TO '{dest}' ({fmt})"
+    )
+    design = {
+        "stratum": [
+            row[0] for row in con.execute("SELECT _stratum FROM _sample ORDER BY _row").fetchall()
+        ],
+        "population": [
+            row[0] for row in con.execute("SELECT _n FROM _population ORDER BY _code").fetchall()
+        ],
+    }
+    design_path.write_text(json.dumps(design), encoding="utf-8")
+
+    sample = DatasetSample(
+        path=str(target), fraction=fraction, strata=strata, design=str(design_path)
+    )
+    meta_path.write_text(json.dumps(sample.__dict__, ensure_ascii=False), encoding="utf-8")
+
+    # 清理同一文件旧版本的样本
+    prefix = base.name.split("-")[0]
+    for stale in DATASET_CACHE_DIR.glob(f"{prefix}-*.sample.*"):
+        if not stale.name.startswith(base.stem + "."):
+            stale.unlink(missing_ok=True)
+    return sample
+
+
+def sketch_path(profile: DatasetProfile) -> Path:
+    """数据文件画像状态（各列摘要）的持久化路径"""
+    base = columnar_path(profile)
+    return base.with_name(base.stem + ".sketch.json")
+
+
+def ensure_summary(profile: DatasetProfile) -> Optional[dict]:
+    """
+    确保数据集已有单遍画像（随列式缓存一起维护），返回画像
+
+    计数、空值、min/max/mean/var、近似分位数、不同取值个数、分类 top-k 与相关系数在一次扫描中算出，
+    结果按文件版本持久化，文件变化后自动重新计算。
+    各列的可合并摘要（HyperLogLog / SpaceSaving / t-digest，见 sandbox_site/sketches.py）
+    连同其他统计状态一起保存在 .sketch.json 中，文件只是追加了数据时只处理新增的行再合并。
+
+    Args:
+        profile: 数据文件画像
+
+    Returns:
+        画像 dict（结构见 profiler.Profiler.result），文件格式不支持或计算失败时返回 None
+    """
+    if not profile.columns:
+        return None
+
+    base = columnar_path(profile)
+    target = base.with_name(base.stem + ".profile.json")
+    if target.exists():
+        return json.loads(target.read_text(encoding="utf-8"))
+
+    from sandbox import run_python_code
+
+    state = sketch_path(profile)
+    DATASET_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    previous = appended_from(profile, sketch_path)
+    if previous is not None:
+        code = _APPEND_SUMMARY_CODE.format(
+            path=profile.path,
+            offset=previous.size_bytes,
+            old_state_path=str(sketch_path(previous)),
+            state_path=str(state),
+        )
+    else:
+        code = _SUMMARY_CODE.format(path=profile.path, state_path=str(state))
+    result = run_python_code(code, timeout=PROFILE_TIMEOUT)
+    if result.returncode != 0:
+        print(f"数据画像计算失败: {result.stderr}")
+        return None
+    summary = json.loads(result.stdout.strip().splitlines()[-1])
+
+    tmp = target.with_suffix(".tmp")
+    tmp.write_text(json.dumps(summary, ensure_ascii=False), encoding="utf-8")
+    tmp.replace(target)
+    record_version(profile)
+
+    # 清理同一文件旧版本的画像与摘要
+    prefix = base.name.split("-")[0]
+    for pattern in ("profile", "sketch"):
+        for stale in DATASET_CACHE_DIR.glob(f"{prefix}-*.{pattern}.json"):
+            if stale not in (target, state):
+                stale.unlink(missing_ok=True)
+    return summary
+
+
+def compact_summary(summary: dict, top: int = 5, min_correlation: float = 0.5) -> dict:
+    """
+    把画像压缩成适合放进提示词的大小
+
+    Args:
+        summary: ensure_summary 返回的画像
+        top: 每个分类列保留的高频取值个数
+        min_correlation: 只保留相关系数绝对值不低于该值的列对
+
+    Returns:
+        精简后的画像
+    """
+    columns = {}
+    for name, stats in summary["columns"].items():
+        stats = dict(stats)
+        if "top" in stats:
+            stats["top"] = {item["value"]: item["count"] for item in stats["top"][:top]}
+        columns[name] = stats
+
+    correlated = []
+    names = list(summary["correlation"])
+    for i, a in enumerate(names):
+        for b in names[i + 1 :]:
+            r = summary["correlation"][a].get(b)
+            if r is not None and abs(r) >= min_correlation:
+                correlated.append([a, b, round(r, 3)])
+
+    return {"rows": summary["rows"], "columns": columns, "strong_correlations": correlated}
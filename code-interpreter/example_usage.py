@@ -18,15 +18,19 @@ from langgraph.prebuilt import create_react_agent
 from langchain.tools import BaseTool
 from typing import Dict, Any
 
+from graph_registry import register_graph
+
 # ============================================================================
 # 示例 1: 创建 Code Interpreter ReAct Agent
 # ============================================================================
 
+@register_graph("example_code_interpreter")
 def create_code_interpreter_agent(model_name: str = "gpt-4"):
     """
     创建数据分析 Code Interpreter ReAct Agent
     
     使用优化后的 CODE_INTERPRETER_AGENT_PROMPT
+    同一 model_name 只构建一次，之后的调用直接返回编译好的 Agent（见 graph_registry.py）
     """
     
     # 定义工具（简化示例，实际需要完整实现）
@@ -74,11 +78,13 @@ def create_code_interpreter_agent(model_name: str = "gpt-4"):
 # 示例 2: 创建 Plan-and-Execute Main Agent
 # ============================================================================
 
+@register_graph("example_main_agent")
 def create_main_agent(model_name: str = "gpt-4"):
     """
     创建主 Agent (Plan-and-Execute 模式)
     
     使用优化后的 PLANNER, EXECUTOR, REPLAN Prompts
+    同一 model_name 只构建一次，之后的调用直接返回编译好的图（见 graph_registry.py）
     """
     from langgraph.graph import StateGraph, END
     from typing import TypedDict, List
@@ -93,10 +99,11 @@ def create_main_agent(model_name: str = "gpt-4"):
         status: str
         final_response: str
     
+    # 模型在构建图时创建一次，各节点共用，不在每次请求时重新创建
+    llm = ChatOpenAI(model=model_name, temperature=0.7)
+    
     # Planner 节点
     def planner_node(state: AgentState) -> AgentState:
-        llm = ChatOpenAI(model=model_name, temperature=0.7)
-        
         # ⭐ 使用优化后的 PLANNER_SYSTEM_PROMPT
         response = llm.invoke([
             {"role": "system", "content": PLANNER_SYSTEM_PROMPT},
@@ -116,8 +123,6 @@ def create_main_agent(model_name: str = "gpt-4"):
     
     # Executor 节点
     def executor_node(state: AgentState) -> AgentState:
-        llm = ChatOpenAI(model=model_name, temperature=0.7)
-        
         current_step = state["plan"][state["current_step_index"]]
         
         # ⭐ 使用优化后的 EXECUTOR_SYSTEM_PROMPT
@@ -148,8 +153,6 @@ def create_main_agent(model_name: str = "gpt-4"):
     
     # Replanner 节点
     def replanner_node(state: AgentState) -> AgentState:
-        llm = ChatOpenAI(model=model_name, temperature=0.7)
-        
         # ⭐ 使用优化后的 REPLAN_SYSTEM_PROMPT
         context = f"""
 原始问题: {state["user_query"]}
@@ -0,0 +1,295 @@
+"""
+按错误签名缓存代码修复
+
+重试循环中很多错误反复出现且修法固定（列名写错、漏了 import 等），
+每次都把原始 stderr 交给 LLM 重新生成代码既慢又浪费。这里：
+1. 把 traceback 归一化成错误签名（异常类型 + 去掉行号、路径、数字后的消息）
+2. 某次失败后重试成功时，从失败代码与成功代码的差异中提取局部修复
+   （字符串/标识符替换、补充 import），按签名记录
+3. 再次遇到相同签名时先在本地应用已知修复并重新执行，成功则不必再调用 LLM
+
+同时统计命中率和节省的时间。
+"""
+
+import ast
+import difflib
+import io
+import json
+import os
+import re
+import threading
+import time
+import tokenize
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from offload import preflight_check
+from sandbox import run_python_code
+
+FIX_CACHE_FILE = Path(
+    os.getenv(
+        "FIX_CACHE_FILE",
+        Path.home() / ".cache" / "ai-practices" / "fix_cache.json",
+    )
+)
+
+# 单个修复最多包含的替换数，差异更大的重写不适合作为局部修复
+MAX_REPLACEMENTS = 5
+
+# 每个签名最多保留的修复数
+MAX_FIXES_PER_SIGNATURE = 5
+
+_EXCEPTION_LINE = re.compile(r"^([A-Za-z_][\w.]*(?:Error|Exception|Warning)):?\s*(.*)$")
+
+
+def error_signature(stderr: str) -> Optional[str]:
+    """
+    把 traceback 归一化为错误签名
+
+    保留异常类型和引号内的内容（例如写错的列名），去掉行号、文件路径、十六进制地址和数字。
+
+    Returns:
+        错误签名，无法识别异常时返回 None
+    """
+    for line in reversed(stderr.strip().splitlines()):
+        match = _EXCEPTION_LINE.match(line.strip())
+        if not match:
+            continue
+        exc_type, message = match.groups()
+        message = re.sub(r"0x[0-9a-fA-F]+", "ADDR", message)
+        message = re.sub(r"(/[^\s'\"]+)+", "PATH", message)
+        message = re.sub(r"\bline \d+", "line N", message)
+        message = re.sub(r"第\d+行", "第N行", message)
+        message = re.sub(r"(?<![\w'\"])\d+(\.\d+)?(?![\w'\"])", "N", message)
+        return f"{exc_type.split('.')[-1]}: {message.strip()}"
+    return None
+
+
+def _tokens(code: str) -> List[Tuple[int, str]]:
+    try:
+        return [
+            (tok.type, tok.string)
+            for tok in tokenize.generate_tokens(io.StringIO(code).readline)
+            if tok.type not in (tokenize.NL, tokenize.NEWLINE, tokenize.INDENT,
+                                tokenize.DEDENT, tokenize.COMMENT, tokenize.ENDMARKER)
+        ]
+    except (tokenize.TokenError, IndentationError, SyntaxError):
+        return []
+
+
+def _imports(code: str) -> List[str]:
+    try:
+        tree = ast.parse(code)
+    except SyntaxError:
+        return []
+    return [
+        ast.unparse(node)
+        for node in tree.body
+        if isinstance(node, (ast.Import, ast.ImportFrom))
+    ]
+
+
+@dataclass
+class Fix:
+    """一个可在本地应用的局部修复"""
+
+    replacements: List[Tuple[str, str]] = field(default_factory=list)  # (旧 token, 新 token)
+    imports: List[str] = field(default_factory=list)  # 需要补充的 import 语句
+    hits: int = 0
+
+    def apply(self, code: str) -> Optional[str]:
+        """把修复应用到代码上，修复不适用时返回 None"""
+        fixed = code
+        for old, new in self.replacements:
+            if old not in fixed:
+                return None
+            fixed = re.sub(rf"(?<![\w]){re.escape(old)}(?![\w])", new, fixed)
+
+        existing = set(_imports(fixed))
+        missing = [line for line in self.imports if line not in existing]
+        if missing:
+            fixed = "\n".join(missing) + "\n" + fixed
+        return fixed if fixed != code else None
+
+
+def extract_fix(failed_code: str, fixed_code: str, stderr: str) -> Optional[Fix]:
+    """
+    从失败代码与成功代码的差异中提取局部修复
+
+    只接受与错误信息相关的一一对应的字符串/标识符替换（例如把报错的列名换成正确的列名），
+    以及新增的 import；差异过大时返回 None。
+    """
+    message = error_signature(stderr) or ""
+    old_tokens, new_tokens = _tokens(failed_code), _tokens(fixed_code)
+    if not old_tokens or not new_tokens:
+        return None
+
+    replacements = []
+    matcher = difflib.SequenceMatcher(a=old_tokens, b=new_tokens, autojunk=False)
+    for op, i1, i2, j1, j2 in matcher.get_opcodes():
+        if op != "replace" or i2 - i1 != 1 or j2 - j1 != 1:
+            continue
+        (old_type, old), (new_type, new) = old_tokens[i1], new_tokens[j1]
+        if old_type == new_type and old_type in (tokenize.STRING, tokenize.NAME):
+            # 只保留错误信息里提到的 token，LLM 顺手改动的其他内容不算修复
+            if old.strip("'\"") not in message:
+                continue
+            if (old, new) not in replacements:
+                replacements.append((old, new))
+
+    old_imports = set(_imports(failed_code))
+    imports = [line for line in _imports(fixed_code) if line not in old_imports]
+
+    if not replacements and not imports:
+        return None
+    if len(replacements) > MAX_REPLACEMENTS:
+        return None
+    return Fix(replacements=replacements, imports=imports)
+
+
+class FixCache:
+    """错误签名 → 已知修复，持久化到 JSON 文件"""
+
+    def __init__(self, path: Path = FIX_CACHE_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        self._fixes: Dict[str, List[Fix]] = {}
+        self._stats = {
+            "lookups": 0,
+            "hits": 0,
+            "llm_fix_seconds": 0.0,  # 走 LLM 修复的累计耗时
+            "llm_fixes": 0,
+            "local_fix_seconds": 0.0,  # 命中时本地修复 + 重新执行的累计耗时
+        }
+        if path.exists():
+            try:
+                data = json.loads(path.read_text(encoding="utf-8"))
+                self._fixes = {
+                    signature: [
+                        Fix([tuple(r) for r in f["replacements"]], f["imports"], f["hits"])
+                        for f in fixes
+                    ]
+                    for signature, fixes in data.get("fixes", {}).items()
+                }
+                self._stats.update(data.get("stats", {}))
+            except (json.JSONDecodeError, KeyError, TypeError):
+                pass
+
+    def _save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        data = {
+            "fixes": {
+                signature: [f.__dict__ for f in fixes]
+                for signature, fixes in self._fixes.items()
+            },
+            "stats": self._stats,
+        }
+        tmp = self.path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(data, ensure_ascii=False, indent=2), encoding="utf-8")
+        tmp.replace(self.path)
+
+    def record(
+        self, failed_code: str, stderr: str, fixed_code: str, llm_seconds: float = 0.0
+    ) -> bool:
+        """
+        记录一次经 LLM 修复成功的重试
+
+        Args:
+            failed_code: 失败的代码
+            stderr: 失败时的错误输出
+            fixed_code: 重试成功的代码
+            llm_seconds: 从失败到重试成功所花的时间
+
+        Returns:
+            是否提取并记录了可复用的修复
+        """
+        signature = error_signature(stderr)
+        fix = extract_fix(failed_code, fixed_code, stderr) if signature else None
+
+        with self._lock:
+            if llm_seconds > 0:
+                self._stats["llm_fix_seconds"] += llm_seconds
+                self._stats["llm_fixes"] += 1
+            if fix is not None:
+                fixes = self._fixes.setdefault(signature, [])
+                if not any(
+                    f.replacements == fix.replacements and f.imports == fix.imports
+                    for f in fixes
+                ):
+                    fixes.insert(0, fix)
+                    del fixes[MAX_FIXES_PER_SIGNATURE:]
+            self._save()
+        return fix is not None
+
+    def try_fix(
+        self,
+        code: str,
+        stderr: str,
+        data_context: Any = None,
+        timeout: int = 10,
+        cwd: Optional[str] = None,
+    ) -> Optional[Tuple[str, Any]]:
+        """
+        尝试用已知修复处理这次失败
+
+        Args:
+            code: 失败的代码
+            stderr: 错误输出
+            data_context: 数据上下文（用于预检）
+            timeout: 重新执行的超时时间（秒）
+            cwd: 重新执行的工作目录（会话工作目录）
+
+        Returns:
+            (修复后的代码, 执行结果)；没有可用修复时返回 None
+        """
+        signature = error_signature(stderr)
+        if signature is None:
+            return None
+
+        start = time.perf_counter()
+        with self._lock:
+            self._stats["lookups"] += 1
+            fixes = sorted(self._fixes.get(signature, []), key=lambda f: -f.hits)
+
+        for fix in fixes:
+            fixed_code = fix.apply(code)
+            if not fixed_code or preflight_check(fixed_code, data_context, cwd=cwd):
+                continue
+            result = run_python_code(fixed_code, timeout=timeout, cwd=cwd)
+            if result.returncode == 0:
+                with self._lock:
+                    fix.hits += 1
+                    self._stats["hits"] += 1
+                    self._stats["local_fix_seconds"] += time.perf_counter() - start
+                    self._save()
+                return fixed_code, result
+        return None
+
+    def stats(self) -> Dict[str, float]:
+        """命中率与节省时间的统计"""
+        with self._lock:
+            s = dict(self._stats)
+        avg_llm = s["llm_fix_seconds"] / s["llm_fixes"] if s["llm_fixes"] else 0.0
+        avg_local = s["local_fix_seconds"] / s["hits"] if s["hits"] else 0.0
+        return {
+            "lookups": s["lookups"],
+            "hits": s["hits"],
+            "hit_rate": s["hits"] / s["lookups"] if s["lookups"] else 0.0,
+            "avg_llm_fix_seconds": avg_llm,
+            "avg_local_fix_seconds": avg_local,
+            "saved_seconds": max(0.0, avg_llm - avg_local) * s["hits"],
+        }
+
+
+_cache: Optional[FixCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_fix_cache() -> FixCache:
+    """进程内共享的修复缓存"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = FixCache()
+        return _cache
@@ -0,0 +1,176 @@
+"""
+编译好的 Agent 图注册表
+
+create_agent(...) / workflow.compile() 会构建工具、模型和整张图，放在请求路径上每次都要付出这部分开销。
+这里按 (图名, 构建参数) 只编译一次，之后所有请求并发复用同一个编译好的图：
+- 编译好的图不保存会话状态，每次 invoke / stream 只传入本次请求的 State
+- 同一配置的首次构建加锁，并发的首批请求不会重复构建
+- warm_up() 可在服务启动时预先构建，把构建开销完全移出请求路径
+
+    from graph_registry import register_graph
+
+    @register_graph("bi_agent")
+    def build_bi_agent():
+        return create_agent(...)
+
+    agent = build_bi_agent()  # 第一次构建，之后直接返回同一个图
+"""
+
+import functools
+import importlib
+import inspect
+import json
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+# 图名 → 定义它的模块，get / warm_up 遇到尚未注册的图时按需导入
+GRAPH_MODULES = {
+    "bi_agent": "bi_agent",
+    "plan_execute": "plan_execute",
+    "plan_execute_executor": "plan_execute",
+    "example_code_interpreter": "example_usage",
+    "example_main_agent": "example_usage",
+}
+
+
+def config_key(config: Dict[str, Any]) -> str:
+    """构建参数的稳定 key"""
+    return json.dumps(config, sort_keys=True, ensure_ascii=False, default=repr)
+
+
+def bind_config(
+    builder: Callable[..., Any], args: Tuple[Any, ...], config: Dict[str, Any]
+) -> inspect.BoundArguments:
+    """
+    按构建函数的签名绑定参数并补齐默认值
+
+    f("gpt-4")、f(model="gpt-4") 与（默认值为 "gpt-4" 时的）f() 绑定结果相同，共用一个缓存 key。
+    """
+    bound = inspect.signature(builder).bind(*args, **config)
+    bound.apply_defaults()
+    return bound
+
+
+class GraphRegistry:
+    """按 (图名, 构建参数) 缓存编译好的图"""
+
+    def __init__(self):
+        self._builders: Dict[str, Callable[..., Any]] = {}
+        self._graphs: Dict[Tuple[str, str], Any] = {}
+        self._build_locks: Dict[Tuple[str, str], threading.Lock] = {}
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, float]] = {}
+
+    def register(self, name: str, builder: Callable[..., Any]):
+        """注册图的构建函数（重新注册会清掉该图已编译的缓存）"""
+        with self._lock:
+            self._builders[name] = builder
+            for key in [key for key in self._graphs if key[0] == name]:
+                del self._graphs[key]
+
+    def _builder(self, name: str) -> Callable[..., Any]:
+        if name not in self._builders and name in GRAPH_MODULES:
+            importlib.import_module(GRAPH_MODULES[name])
+        with self._lock:
+            if name not in self._builders:
+                raise KeyError(f"未注册的图: {name}")
+            return self._builders[name]
+
+    def _count(self, name: str, field: str, value: float = 1):
+        with self._lock:
+            stats = self._stats.setdefault(
+                name, {"builds": 0, "hits": 0, "build_seconds": 0.0}
+            )
+            stats[field] += value
+
+    def build(self, name: str, *args: Any, **config: Any) -> Any:
+        """不经缓存直接构建一次（基准测试对比用）"""
+        return self._builder(name)(*args, **config)
+
+    def get(self, name: str, *args: Any, **config: Any) -> Any:
+        """
+        获取编译好的图，同一配置只构建一次
+
+        Args:
+            name: 图名
+            *args, **config: 传给构建函数的参数，按签名绑定并补齐默认值后作为缓存 key，
+                不同参数分别缓存
+
+        Returns:
+            编译好的图
+        """
+        builder = self._builder(name)
+        bound = bind_config(builder, args, config)
+        key = (name, config_key(bound.arguments))
+        graph = self._graphs.get(key)
+        if graph is not None:
+            self._count(name, "hits")
+            return graph
+
+        with self._lock:
+            build_lock = self._build_locks.setdefault(key, threading.Lock())
+        with build_lock:
+            graph = self._graphs.get(key)
+            if graph is not None:
+                self._count(name, "hits")
+                return graph
+            start = time.perf_counter()
+            graph = builder(*bound.args, **bound.kwargs)
+            self._count(name, "builds")
+            self._count(name, "build_seconds", time.perf_counter() - start)
+            with self._lock:
+                self._graphs[key] = graph
+            return graph
+
+    def warm_up(self, names: Optional[Iterable[str]] = None):
+        """预先构建（默认构建参数下的）图，服务启动时调用"""
+        for name in names or ("bi_agent", "plan_execute"):
+            self.get(name)
+
+    def clear(self, name: Optional[str] = None):
+        """清掉已编译的图（例如修改了提示词或模型配置之后）"""
+        with self._lock:
+            for key in [key for key in self._graphs if name in (None, key[0])]:
+                del self._graphs[key]
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """各图的构建次数、缓存命中次数和构建耗时"""
+        with self._lock:
+            return {
+                name: {**stats, "build_seconds": round(stats["build_seconds"], 4)}
+                for name, stats in sorted(self._stats.items())
+            }
+
+
+_registry: Optional[GraphRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def get_registry() -> GraphRegistry:
+    """进程内共享的图注册表"""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = GraphRegistry()
+        return _registry
+
+
+def register_graph(name: str):
+    """
+    把构建函数注册到共享注册表
+
+    被装饰的函数变成带缓存的入口：调用时返回该配置下编译好的图，只有第一次会真正构建。
+    调用方式与原构建函数相同（位置参数或关键字参数），省略的参数按默认值计入缓存 key。
+    """
+
+    def decorator(builder: Callable[..., Any]) -> Callable[..., Any]:
+        get_registry().register(name, builder)
+
+        @functools.wraps(builder)
+        def cached(*args: Any, **config: Any) -> Any:
+            return get_registry().get(name, *args, **config)
+
+        return cached
+
+    return decorator
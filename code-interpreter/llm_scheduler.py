@@ -0,0 +1,437 @@
+"""
+感知限流的 LLM 请求调度器
+
+多个会话同时运行时，plan_node、execute_node、generate_code、analyze_results
+都直接调用模型服务，很容易触发 429，而 LangChain 默认的重试又会在限流时叠加请求。
+这里把所有请求集中到一个调度器：
+1. 请求数、token 数两个令牌桶，按服务商的 RPM / TPM 限额放行
+2. 按优先级排队：面向用户的最终回答优先于后台的重规划
+3. 遇到 429 时按 Retry-After 或带抖动的指数退避重试，并暂停放行其他请求
+4. 完全相同、且仍在进行中的请求合并为一次调用
+
+配置（环境变量）:
+    LLM_RPM: 每分钟请求数，默认 60
+    LLM_TPM: 每分钟 token 数，默认 100000
+    LLM_MAX_CONCURRENCY: 最大并发请求数，默认 8
+    LLM_MAX_RETRIES: 429 / 5xx 时的最大重试次数，默认 5
+"""
+
+import functools
+import hashlib
+import heapq
+import itertools
+import json
+import os
+import random
+import threading
+import time
+from concurrent.futures import Future
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterator, List, Optional
+
+from trace_replay import traced_call, traced_stream
+
+if TYPE_CHECKING:
+    from langchain_core.outputs import ChatGenerationChunk, ChatResult
+    from langchain_openai import ChatOpenAI
+
+# 优先级，数值越小越先放行
+INTERACTIVE = 0  # 直接展示给用户的回答（分析报告、最终回复）
+NORMAL = 1  # 规划、代码生成、步骤执行
+BACKGROUND = 2  # 重规划等后台决策
+
+LLM_RPM = float(os.getenv("LLM_RPM", "60"))
+LLM_TPM = float(os.getenv("LLM_TPM", "100000"))
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "5"))
+
+# 未指定 max_tokens 时，预估的输出 token 数
+DEFAULT_OUTPUT_TOKENS = 512
+
+
+class TokenBucket:
+    """令牌桶：容量为每分钟限额，按秒匀速补充（调用方负责加锁）"""
+
+    def __init__(self, per_minute: float):
+        self.capacity = per_minute
+        self.rate = per_minute / 60
+        self.tokens = per_minute
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """取出 amount 个令牌还需要等待的秒数，0 表示可以立即取出"""
+        self._refill()
+        # 单次请求超过桶容量时按桶满放行，避免永远等待
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def take(self, amount: float):
+        self._refill()
+        self.tokens -= amount
+
+    def drain(self):
+        """清空令牌（收到 429 时让其他请求一起退让）"""
+        self._refill()
+        self.tokens = min(self.tokens, 0.0)
+
+
+def is_retryable(error: BaseException) -> bool:
+    """429 和 5xx 可以重试"""
+    status = getattr(error, "status_code", None)
+    return status == 429 or (isinstance(status, int) and status >= 500)
+
+
+def retry_after(error: BaseException) -> Optional[float]:
+    """从错误响应中读取 Retry-After（秒）"""
+    response = getattr(error, "response", None)
+    value = getattr(response, "headers", {}).get("retry-after") if response else None
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+class LLMScheduler:
+    """集中调度所有 LLM 请求"""
+
+    def __init__(
+        self,
+        requests_per_minute: float = LLM_RPM,
+        tokens_per_minute: float = LLM_TPM,
+        max_concurrency: int = LLM_MAX_CONCURRENCY,
+        max_retries: int = LLM_MAX_RETRIES,
+        base_delay: float = 1.0,
+        max_delay: float = 30.0,
+    ):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+        self._cond = threading.Condition()
+        self._queue: List[tuple] = []  # (优先级, 序号)
+        self._seq = itertools.count()
+        self._running = 0
+        self._paused_until = 0.0  # 收到 429 后暂停放行到这个时间点
+        self._inflight: Dict[str, Future] = {}
+        self._stats = {
+            "requests": 0,
+            "retries": 0,
+            "rate_limited": 0,
+            "coalesced": 0,
+            "queue_seconds": 0.0,
+        }
+
+    def _acquire(self, priority: int, tokens: float):
+        """按优先级排队，直到并发数和两个令牌桶都允许放行"""
+        start = time.monotonic()
+        ticket = (priority, next(self._seq))
+        with self._cond:
+            heapq.heappush(self._queue, ticket)
+            while True:
+                wait = None
+                if self._queue[0] == ticket and self._running < self.max_concurrency:
+                    wait = max(
+                        self._paused_until - time.monotonic(),
+                        self.requests.wait_time(1),
+                        self.tokens.wait_time(tokens),
+                    )
+                    if wait <= 0:
+                        heapq.heappop(self._queue)
+                        self.requests.take(1)
+                        self.tokens.take(tokens)
+                        self._running += 1
+                        self._stats["queue_seconds"] += time.monotonic() - start
+                        # 队首变了，唤醒下一个
+                        self._cond.notify_all()
+                        return
+                self._cond.wait(timeout=wait)
+
+    def _release(self, estimated_tokens: float, used_tokens: Optional[float]):
+        with self._cond:
+            self._running -= 1
+            if used_tokens is not None:
+                # 用实际 token 数修正预估值
+                self.tokens.take(used_tokens - estimated_tokens)
+            self._cond.notify_all()
+
+    def _backoff(self, attempt: int, error: BaseException) -> float:
+        delay = retry_after(error)
+        if delay is None:
+            # full jitter: 在 [0, base * 2^attempt] 之间随机，避免大量请求同时重试
+            delay = random.uniform(0, min(self.max_delay, self.base_delay * 2**attempt))
+        if getattr(error, "status_code", None) == 429:
+            with self._cond:
+                self._stats["rate_limited"] += 1
+                self._paused_until = max(self._paused_until, time.monotonic() + delay)
+                self.requests.drain()
+        return delay
+
+    def call(
+        self,
+        fn: Callable[[], Any],
+        priority: int = NORMAL,
+        tokens: float = 0,
+        key: Optional[str] = None,
+        usage: Optional[Callable[[Any], Optional[float]]] = None,
+    ) -> Any:
+        """
+        通过调度器执行一次请求
+
+        Args:
+            fn: 实际发起请求的函数
+            priority: 优先级，INTERACTIVE / NORMAL / BACKGROUND
+            tokens: 预估的 token 数（输入 + 输出）
+            key: 请求的唯一标识，相同 key 的进行中请求会合并
+            usage: 从返回值中取实际 token 数的函数，用于修正令牌桶
+
+        Returns:
+            fn 的返回值
+        """
+        if key is not None:
+            with self._cond:
+                leader = self._inflight.get(key)
+                if leader is None:
+                    self._inflight[key] = Future()
+                else:
+                    self._stats["coalesced"] += 1
+            if leader is not None:
+                # 相同请求已在进行中，直接等待它的结果
+                return leader.result()
+
+        try:
+            result = self._call_with_retries(fn, priority, tokens, usage)
+        except BaseException as e:
+            if key is not None:
+                self._finish(key, error=e)
+            raise
+        if key is not None:
+            self._finish(key, result=result)
+        return result
+
+    def _finish(self, key: str, result: Any = None, error: Optional[BaseException] = None):
+        with self._cond:
+            future = self._inflight.pop(key)
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def _call_with_retries(self, fn, priority, tokens, usage):
+        attempt = 0
+        while True:
+            self._acquire(priority, tokens)
+            used = None
+            try:
+                with self._cond:
+                    self._stats["requests"] += 1
+                result = fn()
+                used = usage(result) if usage else None
+                return result
+            except Exception as e:
+                if not is_retryable(e) or attempt >= self.max_retries:
+                    raise
+                delay = self._backoff(attempt, e)
+            finally:
+                self._release(tokens, used)
+
+            attempt += 1
+            with self._cond:
+                self._stats["retries"] += 1
+            time.sleep(delay)
+
+    def stream(
+        self,
+        fn: Callable[[], Iterator[Any]],
+        priority: int = NORMAL,
+        tokens: float = 0,
+    ) -> Iterator[Any]:
+        """
+        通过调度器执行一次流式请求
+
+        只有在收到第一个 chunk 之前失败才会重试，已经输出的内容不会重复。
+        流式请求不做合并。
+        """
+        attempt = 0
+        while True:
+            self._acquire(priority, tokens)
+            started = False
+            try:
+                with self._cond:
+                    self._stats["requests"] += 1
+                for chunk in fn():
+                    started = True
+                    yield chunk
+                return
+            except Exception as e:
+                if started or not is_retryable(e) or attempt >= self.max_retries:
+                    raise
+                delay = self._backoff(attempt, e)
+            finally:
+                self._release(tokens, None)
+
+            attempt += 1
+            with self._cond:
+                self._stats["retries"] += 1
+            time.sleep(delay)
+
+    def stats(self) -> Dict[str, float]:
+        """调度统计"""
+        with self._cond:
+            return {
+                **self._stats,
+                "queued": len(self._queue),
+                "running": self._running,
+                "inflight_keys": len(self._inflight),
+            }
+
+
+def _estimate_tokens(messages: list, max_tokens: Optional[int]) -> float:
+    """粗略预估 token 数：中文约 1.5 字/token，英文约 4 字符/token，这里按 2 字符/token"""
+    chars = sum(len(str(message.content)) for message in messages)
+    return chars / 2 + (max_tokens or DEFAULT_OUTPUT_TOKENS)
+
+
+def _request_key(model: "ChatOpenAI", messages: list, stop, kwargs: dict) -> str:
+    payload = json.dumps(
+        {
+            "model": model.model_name,
+            "temperature": model.temperature,
+            "messages": [message.model_dump() for message in messages],
+            "stop": stop,
+            "kwargs": kwargs,
+        },
+        sort_keys=True,
+        ensure_ascii=False,
+        default=str,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _result_tokens(result: "ChatResult") -> Optional[float]:
+    usage = (result.llm_output or {}).get("token_usage") or {}
+    return usage.get("total_tokens")
+
+
+def _encode_result(result: "ChatResult") -> dict:
+    message = result.generations[0].message
+    return {
+        "content": message.content,
+        "tool_calls": message.tool_calls,
+        "usage_metadata": message.usage_metadata,
+        "llm_output": result.llm_output,
+    }
+
+
+def _decode_result(data: dict) -> "ChatResult":
+    from langchain_core.messages import AIMessage
+    from langchain_core.outputs import ChatGeneration, ChatResult
+
+    message = AIMessage(
+        content=data["content"],
+        tool_calls=data["tool_calls"],
+        usage_metadata=data["usage_metadata"],
+    )
+    return ChatResult(generations=[ChatGeneration(message=message)], llm_output=data["llm_output"])
+
+
+def _encode_chunk(chunk: "ChatGenerationChunk") -> dict:
+    message = chunk.message
+    return {
+        "content": message.content,
+        "tool_call_chunks": message.tool_call_chunks,
+        "usage_metadata": message.usage_metadata,
+    }
+
+
+def _decode_chunk(data: dict) -> "ChatGenerationChunk":
+    from langchain_core.messages import AIMessageChunk
+    from langchain_core.outputs import ChatGenerationChunk
+
+    return ChatGenerationChunk(
+        message=AIMessageChunk(
+            content=data["content"],
+            tool_call_chunks=data["tool_call_chunks"],
+            usage_metadata=data["usage_metadata"],
+        )
+    )
+
+
+@functools.lru_cache(maxsize=None)
+def _scheduled_chat_openai() -> type:
+    """首次使用时才导入 langchain_openai 并定义 ScheduledChatOpenAI，加快进程启动"""
+    from langchain_openai import ChatOpenAI
+
+    class ScheduledChatOpenAI(ChatOpenAI):
+        """所有请求都经过 LLMScheduler 的 ChatOpenAI，重试由调度器负责"""
+
+        priority: int = NORMAL
+        role: str = ""  # 调用方角色，录制 / 回放按顺序匹配时使用
+        max_retries: Optional[int] = 0
+
+        def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+            key = _request_key(self, messages, stop, kwargs)
+            generate = functools.partial(
+                super()._generate, messages, stop, run_manager, **kwargs
+            )
+            return traced_call(
+                "llm",
+                self.role,
+                key,
+                lambda: get_scheduler().call(
+                    generate,
+                    priority=self.priority,
+                    tokens=_estimate_tokens(messages, self.max_tokens),
+                    key=key,
+                    usage=_result_tokens,
+                ),
+                encode=_encode_result,
+                decode=_decode_result,
+            )
+
+        def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+            stream = functools.partial(
+                super()._stream, messages, stop, run_manager, **kwargs
+            )
+            yield from traced_stream(
+                "llm",
+                self.role,
+                _request_key(self, messages, stop, kwargs),
+                lambda: get_scheduler().stream(
+                    stream,
+                    priority=self.priority,
+                    tokens=_estimate_tokens(messages, self.max_tokens),
+                ),
+                encode=_encode_chunk,
+                decode=_decode_chunk,
+            )
+
+    return ScheduledChatOpenAI
+
+
+def __getattr__(name: str):
+    # ScheduledChatOpenAI 按需定义，见 _scheduled_chat_openai
+    if name == "ScheduledChatOpenAI":
+        return _scheduled_chat_openai()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+_scheduler: Optional[LLMScheduler] = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler() -> LLMScheduler:
+    """进程内共享的调度器"""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = LLMScheduler()
+        return _scheduler
@@ -0,0 +1,384 @@
+"""
+本地模拟的 OpenAI 兼容服务
+
+ChatOpenAI 通过 BASE_URL 指定服务地址，把它指向这个服务即可离线运行
+plan-and-execute 与 BI Agent，用于压测和延迟测试：
+- 支持 /v1/chat/completions 的普通响应、SSE 流式响应和工具调用（含强制 tool_choice）
+- 回复来自脚本文件（按正则匹配最后一条用户消息），未匹配时按工具的 JSON Schema 自动构造参数
+- 可配置首 token 延迟（TTFT）和输出速度（tokens/秒）
+- 可注入故障：按比例或对最先到达的若干请求返回 429 / 500，或模拟服务商的 RPM 限额
+
+用法:
+    python mock_llm_server.py --port 8765 --ttft 0.5 --tps 40 --error-rate 0.05
+    # .env 中设置 BASE_URL=http://127.0.0.1:8765/v1
+
+脚本文件格式（JSON，规则按顺序匹配）:
+    [
+        {"match": "生成.*代码", "content": "```python\\nprint('hello')\\n```"},
+        {"match": "计划", "tool_call": {"name": "Plan", "arguments": {"steps": ["读取数据"]}}}
+    ]
+"""
+
+import argparse
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from collections import deque
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+
+DEFAULT_CONTENT = "这是模拟服务返回的回复。"
+
+
+@dataclass
+class MockConfig:
+    """模拟服务的延迟与故障配置"""
+
+    ttft: float = 0.3  # 首 token 延迟（秒）
+    ttft_jitter: float = 0.1  # 首 token 延迟的随机波动（秒）
+    tokens_per_second: float = 50.0  # 输出速度，0 表示不限速
+    error_rate: float = 0.0  # 随机返回错误的比例
+    error_status: int = 429  # 随机错误使用的状态码
+    rate_limit_rpm: int = 0  # 模拟服务商的每分钟请求限额，0 表示不限
+    fail_first: int = 0  # 最先到达的多少个请求固定返回错误（用于测试重试）
+    retry_after: float = 1.0  # 429 响应中的 Retry-After（秒）
+
+
+def _split_tokens(text: str) -> List[str]:
+    """把文本切成近似 token 的片段：中文按 2 字，英文按单词"""
+    return re.findall(r"[一-鿿]{1,2}|\s*[A-Za-z0-9_]+|\s*[^\sA-Za-z0-9_一-鿿]|\s+", text)
+
+
+def example_from_schema(schema: Dict[str, Any], defs: Optional[Dict[str, Any]] = None) -> Any:
+    """按 JSON Schema 构造一个合法的示例值"""
+    defs = defs if defs is not None else schema.get("$defs", {})
+    if "$ref" in schema:
+        return example_from_schema(defs[schema["$ref"].split("/")[-1]], defs)
+    for key in ("anyOf", "oneOf"):
+        if key in schema:
+            options = [s for s in schema[key] if s.get("type") != "null"] or schema[key]
+            return example_from_schema(options[0], defs)
+    if "enum" in schema:
+        return schema["enum"][0]
+    if "const" in schema:
+        return schema["const"]
+
+    kind = schema.get("type")
+    if kind == "object" or "properties" in schema:
+        return {
+            name: example_from_schema(prop, defs)
+            for name, prop in schema.get("properties", {}).items()
+        }
+    if kind == "array":
+        return [example_from_schema(schema.get("items", {}), defs)]
+    if kind == "string":
+        return DEFAULT_CONTENT
+    if kind in ("integer", "number"):
+        return 0
+    if kind == "boolean":
+        return False
+    return None
+
+
+class ScriptedResponses:
+    """按脚本规则生成回复"""
+
+    def __init__(self, rules: Optional[List[Dict[str, Any]]] = None):
+        self.rules = [(re.compile(rule.get("match", ".*"), re.DOTALL), rule) for rule in rules or []]
+
+    @classmethod
+    def from_file(cls, path: str) -> "ScriptedResponses":
+        with open(path, encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    def respond(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        根据请求生成回复
+
+        Returns:
+            {"content": str, "tool_calls": [{"name": str, "arguments": dict}]}
+        """
+        messages = request.get("messages", [])
+        last_user = next(
+            (m.get("content") for m in reversed(messages) if m.get("role") == "user"), ""
+        )
+        if not isinstance(last_user, str):
+            last_user = json.dumps(last_user, ensure_ascii=False)
+
+        tools = {t["function"]["name"]: t["function"] for t in request.get("tools", [])}
+        forced = request.get("tool_choice")
+        if isinstance(forced, dict):
+            forced = forced.get("function", {}).get("name")
+        elif forced not in tools:
+            forced = None
+
+        for pattern, rule in self.rules:
+            if not pattern.search(last_user):
+                continue
+            if "tool_call" in rule:
+                return {"content": "", "tool_calls": [rule["tool_call"]]}
+            if not forced:
+                return {"content": rule.get("content", DEFAULT_CONTENT), "tool_calls": []}
+
+        if forced:
+            arguments = example_from_schema(tools[forced].get("parameters", {}))
+            return {"content": "", "tool_calls": [{"name": forced, "arguments": arguments}]}
+        return {"content": DEFAULT_CONTENT, "tool_calls": []}
+
+
+class MockServer(ThreadingHTTPServer):
+    """模拟服务，保存配置、回复来源和统计"""
+
+    daemon_threads = True
+    request_queue_size = 1024
+
+    def __init__(self, address, config: MockConfig, responses: ScriptedResponses):
+        super().__init__(address, _Handler)
+        self.config = config
+        self.responses = responses
+        self.lock = threading.Lock()
+        self.recent = deque()  # 最近一分钟的请求时间，用于模拟 RPM 限额
+        self.stats = {"requests": 0, "errors": 0, "active": 0, "peak_active": 0}
+
+    def admit(self) -> Optional[int]:
+        """判断本次请求是否要注入故障，返回错误状态码或 None"""
+        config = self.config
+        now = time.monotonic()
+        with self.lock:
+            self.stats["requests"] += 1
+            if config.rate_limit_rpm:
+                while self.recent and now - self.recent[0] > 60:
+                    self.recent.popleft()
+                if len(self.recent) >= config.rate_limit_rpm:
+                    self.stats["errors"] += 1
+                    return 429
+                self.recent.append(now)
+            if self.stats["requests"] <= config.fail_first:
+                self.stats["errors"] += 1
+                return config.error_status
+            if config.error_rate and random.random() < config.error_rate:
+                self.stats["errors"] += 1
+                return config.error_status
+        return None
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server: MockServer
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status: int, body: Dict[str, Any], headers: Optional[Dict[str, str]] = None):
+        data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path.rstrip("/").endswith("/models"):
+            self._send_json(200, {"object": "list", "data": [{"id": "mock", "object": "model"}]})
+        elif self.path.rstrip("/").endswith("/stats"):
+            with self.server.lock:
+                self._send_json(200, dict(self.server.stats))
+        else:
+            self._send_json(404, {"error": {"message": "not found"}})
+
+    def do_POST(self):
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": "not found"}})
+            return
+
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+
+        status = self.server.admit()
+        if status is not None:
+            self._send_json(
+                status,
+                {"error": {"message": "模拟故障", "type": "rate_limit_error" if status == 429 else "server_error"}},
+                headers={"Retry-After": str(self.server.config.retry_after)} if status == 429 else None,
+            )
+            return
+
+        with self.server.lock:
+            self.server.stats["active"] += 1
+            self.server.stats["peak_active"] = max(
+                self.server.stats["peak_active"], self.server.stats["active"]
+            )
+        try:
+            reply = self.server.responses.respond(request)
+            config = self.server.config
+            time.sleep(max(0.0, config.ttft + random.uniform(-1, 1) * config.ttft_jitter))
+            if request.get("stream"):
+                self._stream(request, reply)
+            else:
+                self._complete(request, reply)
+        finally:
+            with self.server.lock:
+                self.server.stats["active"] -= 1
+
+    def _usage(self, request: Dict[str, Any], output_tokens: int) -> Dict[str, int]:
+        prompt = sum(len(_split_tokens(str(m.get("content") or ""))) for m in request.get("messages", []))
+        return {
+            "prompt_tokens": prompt,
+            "completion_tokens": output_tokens,
+            "total_tokens": prompt + output_tokens,
+        }
+
+    def _pieces(self, reply: Dict[str, Any]) -> List[str]:
+        if reply["tool_calls"]:
+            return [
+                piece
+                for call in reply["tool_calls"]
+                for piece in _split_tokens(json.dumps(call["arguments"], ensure_ascii=False))
+            ]
+        return _split_tokens(reply["content"])
+
+    def _pace(self, count: int):
+        tps = self.server.config.tokens_per_second
+        if tps > 0:
+            time.sleep(count / tps)
+
+    def _complete(self, request: Dict[str, Any], reply: Dict[str, Any]):
+        pieces = self._pieces(reply)
+        self._pace(len(pieces))
+        message: Dict[str, Any] = {"role": "assistant", "content": reply["content"] or None}
+        if reply["tool_calls"]:
+            message["tool_calls"] = [
+                {
+                    "id": f"call_{uuid.uuid4().hex[:24]}",
+                    "type": "function",
+                    "function": {
+                        "name": call["name"],
+                        "arguments": json.dumps(call["arguments"], ensure_ascii=False),
+                    },
+                }
+                for call in reply["tool_calls"]
+            ]
+        self._send_json(
+            200,
+            {
+                "id": f"chatcmpl-{uuid.uuid4().hex}",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": request.get("model", "mock"),
+                "choices": [
+                    {
+                        "index": 0,
+                        "message": message,
+                        "finish_reason": "tool_calls" if reply["tool_calls"] else "stop",
+                    }
+                ],
+                "usage": self._usage(request, len(pieces)),
+            },
+        )
+
+    def _stream(self, request: Dict[str, Any], reply: Dict[str, Any]):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+
+        chunk_id = f"chatcmpl-{uuid.uuid4().hex}"
+        model = request.get("model", "mock")
+
+        def send(delta: Dict[str, Any], finish_reason: Optional[str] = None, usage=None):
+            chunk = {
+                "id": chunk_id,
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [] if usage else [
+                    {"index": 0, "delta": delta, "finish_reason": finish_reason}
+                ],
+            }
+            if usage:
+                chunk["usage"] = usage
+            self.wfile.write(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+
+        send({"role": "assistant", "content": ""})
+        count = 0
+        if reply["tool_calls"]:
+            for index, call in enumerate(reply["tool_calls"]):
+                send({
+                    "tool_calls": [{
+                        "index": index,
+                        "id": f"call_{uuid.uuid4().hex[:24]}",
+                        "type": "function",
+                        "function": {"name": call["name"], "arguments": ""},
+                    }]
+                })
+                for piece in _split_tokens(json.dumps(call["arguments"], ensure_ascii=False)):
+                    self._pace(1)
+                    send({"tool_calls": [{"index": index, "function": {"arguments": piece}}]})
+                    count += 1
+            send({}, "tool_calls")
+        else:
+            for piece in _split_tokens(reply["content"]):
+                self._pace(1)
+                send({"content": piece})
+                count += 1
+            send({}, "stop")
+
+        if (request.get("stream_options") or {}).get("include_usage"):
+            send({}, usage=self._usage(request, count))
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+
+def serve(
+    host: str = "127.0.0.1",
+    port: int = 8765,
+    config: Optional[MockConfig] = None,
+    responses: Optional[ScriptedResponses] = None,
+) -> MockServer:
+    """在后台线程启动模拟服务，返回服务对象（调用 shutdown() 停止）"""
+    server = MockServer((host, port), config or MockConfig(), responses or ScriptedResponses())
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地模拟的 OpenAI 兼容服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--script", help="脚本回复文件（JSON）")
+    parser.add_argument("--ttft", type=float, default=0.3, help="首 token 延迟（秒）")
+    parser.add_argument("--ttft-jitter", type=float, default=0.1, help="首 token 延迟的随机波动（秒）")
+    parser.add_argument("--tps", type=float, default=50.0, help="输出速度（tokens/秒），0 表示不限速")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="随机返回错误的比例")
+    parser.add_argument("--error-status", type=int, default=429, help="随机错误的状态码")
+    parser.add_argument("--rpm", type=int, default=0, help="模拟的每分钟请求限额，0 表示不限")
+    args = parser.parse_args()
+
+    config = MockConfig(
+        ttft=args.ttft,
+        ttft_jitter=args.ttft_jitter,
+        tokens_per_second=args.tps,
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+        rate_limit_rpm=args.rpm,
+    )
+    responses = ScriptedResponses.from_file(args.script) if args.script else ScriptedResponses()
+    server = MockServer((args.host, args.port), config, responses)
+    print(f"模拟服务已启动: BASE_URL=http://{args.host}:{args.port}/v1")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
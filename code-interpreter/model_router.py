@@ -0,0 +1,225 @@
+"""
+按角色路由模型
+
+planner / executor / replanner / codegen / analyzer 原来都使用 .env 中同一个 MODEL_NAME。
+这里按角色选择模型：规划、重规划这类简单决策走小而快的模型，代码生成走强模型，
+同一任务连续失败后自动升级到更强的模型；同时按角色统计延迟、token 用量和费用，
+方便根据数据调整默认配置。
+
+模型通过环境变量配置（都可不填，缺省时回退到 MODEL_NAME）:
+    FAST_MODEL_NAME: 小模型，planner / replanner 默认使用
+    STRONG_MODEL_NAME: 强模型，codegen 默认使用，也是失败后升级的目标
+    MODEL_NAME_<ROLE>: 单独指定某个角色的模型，例如 MODEL_NAME_REPLANNER
+    ESCALATE_AFTER_FAILURES: 连续失败多少次后升级到强模型，默认 1
+    MODEL_PRICES: 每百万 token 的价格 JSON，例如 {"deepseek-v3.2-exp": [0.28, 0.42]}（输入, 输出）
+"""
+
+import functools
+import json
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Tuple
+
+from llm_scheduler import BACKGROUND, INTERACTIVE, NORMAL
+
+ROLES = ("planner", "executor", "replanner", "codegen", "analyzer")
+
+# 各角色默认使用的模型档位
+DEFAULT_TIERS = {
+    "planner": "fast",
+    "replanner": "fast",
+    "executor": "default",
+    "analyzer": "default",
+    "codegen": "strong",
+}
+
+# 各角色请求在调度器中的优先级：直接展示给用户的分析报告优先，重规划在后台排队
+# （重规划要给出最终回复时，plan_execute.replan_priority 会按 INTERACTIVE 请求）
+ROLE_PRIORITIES = {
+    "analyzer": INTERACTIVE,
+    "planner": NORMAL,
+    "executor": NORMAL,
+    "codegen": NORMAL,
+    "replanner": BACKGROUND,
+}
+
+ESCALATE_AFTER_FAILURES = int(os.getenv("ESCALATE_AFTER_FAILURES", "1"))
+
+
+@dataclass
+class RoleStats:
+    """某个角色在某个模型上的调用统计"""
+
+    calls: int = 0
+    errors: int = 0
+    seconds: float = 0.0
+    input_tokens: int = 0
+    output_tokens: int = 0
+    cost: float = 0.0
+
+    def as_dict(self) -> Dict[str, float]:
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "avg_latency": self.seconds / self.calls if self.calls else 0.0,
+            "input_tokens": self.input_tokens,
+            "output_tokens": self.output_tokens,
+            "cost": self.cost,
+        }
+
+
+@functools.lru_cache(maxsize=None)
+def _stats_callback_class() -> type:
+    """首次使用时才导入 langchain_core 并定义统计回调，加快进程启动"""
+    from langchain_core.callbacks import BaseCallbackHandler
+
+    class StatsCallback(BaseCallbackHandler):
+        """记录一次 LLM 调用的耗时和 token 用量"""
+
+        def __init__(self, router: "ModelRouter", role: str, model_name: str):
+            self.router = router
+            self.role = role
+            self.model_name = model_name
+            self._starts: Dict[Any, float] = {}
+
+        def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+            self._starts[run_id] = time.perf_counter()
+
+        def on_llm_end(self, response, *, run_id, **kwargs):
+            seconds = time.perf_counter() - self._starts.pop(run_id, time.perf_counter())
+            input_tokens = output_tokens = 0
+            for generations in response.generations:
+                for generation in generations:
+                    message = getattr(generation, "message", None)
+                    usage = getattr(message, "usage_metadata", None)
+                    if usage:
+                        input_tokens += usage.get("input_tokens", 0)
+                        output_tokens += usage.get("output_tokens", 0)
+            self.router.record(
+                self.role, self.model_name, seconds, input_tokens, output_tokens
+            )
+
+        def on_llm_error(self, error, *, run_id, **kwargs):
+            seconds = time.perf_counter() - self._starts.pop(run_id, time.perf_counter())
+            self.router.record(self.role, self.model_name, seconds, error=True)
+
+    return StatsCallback
+
+
+class ModelRouter:
+    """按角色选择模型，并收集各角色的延迟 / 费用统计"""
+
+    def __init__(
+        self,
+        base_url: Optional[str] = None,
+        api_key: Optional[str] = None,
+        default_model: Optional[str] = None,
+    ):
+        self.base_url = base_url or os.getenv("BASE_URL")
+        self.api_key = api_key or os.getenv("API_KEY")
+        self.default_model = default_model or os.getenv("MODEL_NAME")
+        self.tiers = {
+            "default": self.default_model,
+            "fast": os.getenv("FAST_MODEL_NAME") or self.default_model,
+            "strong": os.getenv("STRONG_MODEL_NAME") or self.default_model,
+        }
+        self.prices: Dict[str, Tuple[float, float]] = {
+            name: tuple(price)
+            for name, price in json.loads(os.getenv("MODEL_PRICES") or "{}").items()
+        }
+        self._lock = threading.Lock()
+        self._stats: Dict[Tuple[str, str], RoleStats] = {}
+        self._models: Dict[Tuple[str, str, str], Any] = {}
+
+    def model_name(self, role: str, failures: int = 0) -> str:
+        """
+        选择某个角色使用的模型名
+
+        Args:
+            role: 角色，见 ROLES
+            failures: 当前任务已连续失败的次数，达到阈值后升级到强模型
+
+        Returns:
+            模型名
+        """
+        if role not in ROLES:
+            raise ValueError(f"未知角色: {role}，可选: {', '.join(ROLES)}")
+        if failures >= ESCALATE_AFTER_FAILURES and failures > 0:
+            return self.tiers["strong"]
+        return os.getenv(f"MODEL_NAME_{role.upper()}") or self.tiers[DEFAULT_TIERS[role]]
+
+    def get(self, role: str, failures: int = 0, **kwargs: Any):
+        """
+        获取某个角色的聊天模型
+
+        Args:
+            role: 角色，见 ROLES
+            failures: 当前任务已连续失败的次数
+            **kwargs: 传给 ChatOpenAI 的其他参数（例如 temperature、priority）
+
+        Returns:
+            带统计回调、经调度器限流的聊天模型（同一角色、模型和参数只创建一次，之后复用）
+        """
+        from llm_scheduler import ScheduledChatOpenAI
+
+        name = self.model_name(role, failures)
+        kwargs.setdefault("priority", ROLE_PRIORITIES[role])
+        key = (role, name, json.dumps(kwargs, sort_keys=True, default=repr))
+        with self._lock:
+            model = self._models.get(key)
+        if model is None:
+            model = ScheduledChatOpenAI(
+                role=role,
+                base_url=self.base_url,
+                model=name,
+                api_key=self.api_key,
+                callbacks=[_stats_callback_class()(self, role, name)],
+                stream_usage=True,
+                **kwargs,
+            )
+            with self._lock:
+                model = self._models.setdefault(key, model)
+        return model
+
+    def record(
+        self,
+        role: str,
+        model_name: str,
+        seconds: float,
+        input_tokens: int = 0,
+        output_tokens: int = 0,
+        error: bool = False,
+    ):
+        """记录一次调用"""
+        input_price, output_price = self.prices.get(model_name, (0.0, 0.0))
+        with self._lock:
+            stats = self._stats.setdefault((role, model_name), RoleStats())
+            stats.calls += 1
+            stats.errors += int(error)
+            stats.seconds += seconds
+            stats.input_tokens += input_tokens
+            stats.output_tokens += output_tokens
+            stats.cost += (input_tokens * input_price + output_tokens * output_price) / 1e6
+
+    def stats(self) -> Dict[str, Dict[str, Dict[str, float]]]:
+        """按 角色 → 模型 汇总的统计"""
+        with self._lock:
+            result: Dict[str, Dict[str, Dict[str, float]]] = {}
+            for (role, model_name), stats in sorted(self._stats.items()):
+                result.setdefault(role, {})[model_name] = stats.as_dict()
+            return result
+
+
+_router: Optional[ModelRouter] = None
+_router_lock = threading.Lock()
+
+
+def get_router() -> ModelRouter:
+    """进程内共享的模型路由"""
+    global _router
+    with _router_lock:
+        if _router is None:
+            _router = ModelRouter()
+        return _router
@@ -0,0 +1,313 @@
+"""
+宿主侧 CPU 密集型辅助任务的卸载
+
+BI Agent 工具周围有不少在宿主进程中执行的辅助工作：生成代码的 AST 预检、数据集画像、
+生成图表的内容哈希（收进 artifact_store）、缩略图生成。放到异步服务里，这些工作要么占着 GIL、
+要么阻塞等待沙箱子进程，都会拖慢同一事件循环上的 LLM 流式 I/O。这里把它们放到两条独立的通道：
+- cpu: 进程池（spawn），执行纯 Python 的 CPU 密集计算（AST 预检），不与事件循环争抢 GIL
+- io:  线程池，执行主要在等待沙箱子进程或做 hashlib 计算（释放 GIL）的任务，
+       以及必须修改宿主进程内状态的任务（artifact_store 索引）
+每条通道排队 + 运行中的任务数有上限，超出时调用方等待（背压）；任务可取消：尚未开始的直接丢弃，
+已经开始的在后台完成后结果被丢弃。LLM 请求不经过这里，只受 llm_scheduler 的限流约束。
+
+配置（环境变量）:
+    OFFLOAD_CPU_WORKERS: 进程池大小，默认 min(4, 可用核数)；0 表示在调用线程内直接执行
+    OFFLOAD_IO_WORKERS: 线程池大小，默认 8
+    OFFLOAD_QUEUE_SIZE: 每条通道排队 + 运行中的任务上限，默认 64
+
+    from offload import apreflight_check, athumbnail
+
+    errors = await apreflight_check(code, data_context)
+    path = await athumbnail(artifact_id)
+"""
+
+import asyncio
+import functools
+import importlib
+import multiprocessing
+import os
+import threading
+import time
+import weakref
+from concurrent.futures import (
+    Executor,
+    Future,
+    InvalidStateError,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+)
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from sandbox_scheduler import available_cpus
+
+OFFLOAD_CPU_WORKERS = int(
+    os.getenv("OFFLOAD_CPU_WORKERS", str(min(4, len(available_cpus()))))
+)
+OFFLOAD_IO_WORKERS = int(os.getenv("OFFLOAD_IO_WORKERS", "8"))
+OFFLOAD_QUEUE_SIZE = int(os.getenv("OFFLOAD_QUEUE_SIZE", "64"))
+
+
+def _timed(fn: Callable, args: tuple, kwargs: dict, submitted: float):
+    """在 worker 中执行，同时返回排队与执行耗时"""
+    started = time.time()
+    result = fn(*args, **kwargs)
+    return result, started - submitted, time.time() - started
+
+
+def _release_async(loop: asyncio.AbstractEventLoop, slots: asyncio.Semaphore):
+    try:
+        loop.call_soon_threadsafe(slots.release)
+    except RuntimeError:
+        # 事件循环已关闭，信号量随之失效
+        pass
+
+
+class Lane:
+    """一条有界的卸载通道"""
+
+    def __init__(self, name: str, factory: Callable[[], Executor], max_pending: int):
+        self.name = name
+        self.max_pending = max_pending
+        self._factory = factory
+        self._executor: Optional[Executor] = None
+        self._lock = threading.Lock()
+        # 同步调用方与各事件循环分别限流
+        self._sync_slots = threading.BoundedSemaphore(max_pending)
+        self._async_slots: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+        self._stats = {
+            "submitted": 0,
+            "completed": 0,
+            "failed": 0,
+            "cancelled": 0,
+            "queue_seconds": 0.0,
+            "run_seconds": 0.0,
+        }
+        self._pending = 0
+
+    @property
+    def executor(self) -> Executor:
+        with self._lock:
+            # worker 异常退出后进程池不可再用（BrokenProcessPool），重新创建
+            if self._executor is None or getattr(self._executor, "_broken", False):
+                self._executor = self._factory()
+            return self._executor
+
+    def _submit(
+        self, fn: Callable, args: tuple, kwargs: dict, release: Callable[[], None]
+    ) -> Future:
+        with self._lock:
+            self._stats["submitted"] += 1
+            self._pending += 1
+        try:
+            inner = self.executor.submit(_timed, fn, args, kwargs, time.time())
+        except BaseException:
+            self._finish(None)
+            release()
+            raise
+
+        # 对外的 Future 只携带结果；槽位在任务真正结束（或被取消）后才释放，保证上限成立
+        outer: Future = Future()
+
+        def done(future: Future):
+            self._finish(future)
+            release()
+            try:
+                if future.cancelled():
+                    outer.cancel()
+                elif future.exception() is not None:
+                    outer.set_exception(future.exception())
+                else:
+                    outer.set_result(future.result()[0])
+            except InvalidStateError:
+                # 调用方已经取消，结果丢弃
+                pass
+
+        def cancel(future: Future):
+            if future.cancelled():
+                inner.cancel()
+
+        inner.add_done_callback(done)
+        outer.add_done_callback(cancel)
+        return outer
+
+    def _finish(self, future: Optional[Future]):
+        with self._lock:
+            self._pending -= 1
+            if future is None or future.cancelled():
+                self._stats["cancelled"] += 1
+            elif future.exception() is not None:
+                self._stats["failed"] += 1
+            else:
+                _, queued, ran = future.result()
+                self._stats["completed"] += 1
+                self._stats["queue_seconds"] += queued
+                self._stats["run_seconds"] += ran
+
+    def submit(self, fn: Callable, *args, **kwargs) -> Future:
+        """同步提交：通道已满时阻塞等待，返回 concurrent.futures.Future"""
+        self._sync_slots.acquire()
+        return self._submit(fn, args, kwargs, self._sync_slots.release)
+
+    def call(self, fn: Callable, *args, timeout: Optional[float] = None, **kwargs) -> Any:
+        """同步执行并等待结果，超时则取消"""
+        future = self.submit(fn, *args, **kwargs)
+        try:
+            return future.result(timeout=timeout)
+        except BaseException:
+            future.cancel()
+            raise
+
+    async def run(self, fn: Callable, *args, timeout: Optional[float] = None, **kwargs) -> Any:
+        """
+        异步执行：通道已满时在事件循环上等待（不占线程），超时或协程被取消时一并取消任务
+
+        Raises:
+            asyncio.TimeoutError: 超过 timeout 秒
+        """
+        loop = asyncio.get_running_loop()
+        slots = self._async_slots.get(loop)
+        if slots is None:
+            slots = self._async_slots[loop] = asyncio.Semaphore(self.max_pending)
+        await slots.acquire()
+        try:
+            future = self._submit(fn, args, kwargs, functools.partial(_release_async, loop, slots))
+        except BaseException:
+            slots.release()
+            raise
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout)
+        except BaseException:
+            future.cancel()
+            raise
+
+    def shutdown(self, wait: bool = True):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait, cancel_futures=True)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {**self._stats, "pending": self._pending, "max_pending": self.max_pending}
+
+
+class _InlineExecutor(Executor):
+    """OFFLOAD_CPU_WORKERS=0 时在调用线程内直接执行"""
+
+    def submit(self, fn, *args, **kwargs):
+        future: Future = Future()
+        try:
+            future.set_result(fn(*args, **kwargs))
+        except BaseException as e:
+            future.set_exception(e)
+        return future
+
+
+def _cpu_executor() -> Executor:
+    if OFFLOAD_CPU_WORKERS <= 0:
+        return _InlineExecutor()
+    # 宿主进程里有多个线程（调度器、LLM 请求等），fork 出的子进程可能继承被持有的锁，改用 spawn
+    return ProcessPoolExecutor(
+        max_workers=OFFLOAD_CPU_WORKERS, mp_context=multiprocessing.get_context("spawn")
+    )
+
+
+_lanes: Dict[str, Lane] = {}
+_lanes_lock = threading.Lock()
+
+
+def get_lane(name: str) -> Lane:
+    """获取进程内共享的通道："cpu" 或 "io" """
+    with _lanes_lock:
+        if name not in _lanes:
+            if name == "cpu":
+                factory = _cpu_executor
+            elif name == "io":
+                factory = functools.partial(
+                    ThreadPoolExecutor,
+                    max_workers=OFFLOAD_IO_WORKERS,
+                    thread_name_prefix="offload-io",
+                )
+            else:
+                raise ValueError(f"未知的卸载通道: {name}")
+            _lanes[name] = Lane(name, factory, OFFLOAD_QUEUE_SIZE)
+        return _lanes[name]
+
+
+def stats() -> Dict[str, Dict[str, Any]]:
+    with _lanes_lock:
+        lanes = dict(_lanes)
+    return {name: lane.stats() for name, lane in lanes.items()}
+
+
+def _preload(module: str):
+    importlib.import_module(module)
+
+
+def warm_up():
+    """启动进程池的 worker 并预先导入预检模块，把 spawn 开销移出请求路径"""
+    get_lane("cpu").call(_preload, "preflight")
+
+
+# ---- 同步入口（供现有的同步工具在线程中调用） ----
+
+
+def preflight_check(
+    code: str,
+    data_context: Any = None,
+    cwd: Optional[str] = None,
+    frame_names: Iterable[str] = (),
+) -> List[str]:
+    """在进程池中执行 AST 预检，参数与返回值同 preflight.preflight_check"""
+    from preflight import preflight_check as check
+
+    # worker 的当前目录固定在启动时，相对路径按调用方的当前目录检查
+    return get_lane("cpu").call(
+        check, code, data_context, cwd=cwd or os.getcwd(), frame_names=list(frame_names)
+    )
+
+
+# ---- 异步入口（供异步服务在事件循环上调用） ----
+
+
+async def apreflight_check(
+    code: str,
+    data_context: Any = None,
+    cwd: Optional[str] = None,
+    frame_names: Iterable[str] = (),
+) -> List[str]:
+    """AST 预检（cpu 通道）"""
+    from preflight import preflight_check as check
+
+    return await get_lane("cpu").run(
+        check, code, data_context, cwd=cwd or os.getcwd(), frame_names=list(frame_names)
+    )
+
+
+async def aensure_summary(file_path: str) -> Optional[dict]:
+    """数据集画像（io 通道：画像在沙箱子进程中计算，这里只等待并读写缓存）"""
+    from dataset_cache import ensure_summary, get_profile
+
+    def summarize():
+        profile = get_profile(file_path)
+        return ensure_summary(profile) if profile else None
+
+    return await get_lane("io").run(summarize)
+
+
+async def acollect_artifacts(
+    session_id: str, directory: str, since: float
+) -> List[Dict[str, Any]]:
+    """把执行输出的图表按内容哈希收进 artifact_store（io 通道，需修改宿主进程内的索引）"""
+    from artifact_store import get_artifact_store
+
+    return await get_lane("io").run(get_artifact_store().collect, session_id, directory, since)
+
+
+async def athumbnail(artifact_id: str, size: Optional[int] = None):
+    """生成 / 取缩略图（io 通道：缩略图在沙箱子进程中生成）"""
+    from artifact_store import THUMBNAIL_SIZE, get_artifact_store
+
+    return await get_lane("io").run(
+        get_artifact_store().thumbnail, artifact_id, size or THUMBNAIL_SIZE
+    )
@@ -0,0 +1,334 @@
+"""
+Plan-and-Execute 主 Agent
+
+原先定义在 adv_code_interpreter.ipynb 中的规划 → 执行 → 重规划图。
+执行步骤的子 Agent 通过 data_analysis 工具调用 BI 数据分析 Agent（见 bi_agent.py）。
+build_plan_execute_app() 经图注册表（graph_registry.py）在进程内只编译一次，之后复用编译好的图。
+
+    from plan_execute import build_plan_execute_app
+
+    app = build_plan_execute_app()
+    for mode, event in app.stream(
+        {"user_query": "帮我分析一下 ./data.csv 中的数据"},
+        stream_mode=["updates", "custom"],
+    ):
+        print(mode, event)
+"""
+
+import operator
+from typing import Annotated, List, Literal, Optional, Tuple, TypedDict
+
+from langchain.agents import create_agent
+from langchain.messages import HumanMessage, SystemMessage
+from langchain.tools import tool
+from langchain_core.runnables.config import ContextThreadPoolExecutor
+from langgraph.config import get_stream_writer
+from langgraph.graph import END, START, StateGraph
+from pydantic import BaseModel, Field
+
+from bi_agent import build_bi_agent
+from graph_registry import register_graph
+from llm_scheduler import BACKGROUND, INTERACTIVE
+from model_router import get_router
+from prompt import EXECUTOR_SYSTEM_PROMPT, PLANNER_SYSTEM_PROMPT, REPLAN_SYSTEM_PROMPT
+from structured_stream import stream_structured
+
+router = get_router()
+
+DEFAULT_FILE_PATH = "./data.csv"
+
+# 与规划重叠执行的第一步在这里运行（复制上下文，执行过程仍进入图的流）
+_step_executor = ContextThreadPoolExecutor(max_workers=4)
+
+
+@tool
+def data_analysis(task_description: str, file_path: str) -> str:
+    """
+    数据分析
+
+    自动生成并执行 Python 代码进行数据分析，具备错误自动修复能力。
+    从 State 中读取数据上下文，不需要 LLM 重复传参。
+
+    Args:
+        task_description: 分析任务描述（LLM 决策）
+        file_path: 要分析的数据所在路径
+
+    Returns:
+        分析报告
+
+    Examples:
+        >>> # 在 Plan-and-Execute 中使用
+        >>> result = data_analysis(
+        ...     {"task_description": "分析销售数据",file_path:"./data.csv"},
+        ... )
+    """
+
+    response = build_bi_agent().invoke(
+        {
+            "messages": [
+                {
+                    "role": "user",
+                    "content": f"""请完成以下数据分析任务：
+
+        ## 用户查询
+        {task_description}
+
+        ## 数据上下文
+        ```json
+        无
+        ```
+
+        请按照标准流程开始执行任务。
+        """,
+                }
+            ],
+            "data_context": {"file_path": file_path},
+        },
+    )
+
+    return response.get("analysis")
+
+
+class PlanExecuteAgentState(TypedDict):
+    user_query: str  # 用户问题
+    steps: List[str]  # 将要执行的计划
+    past_steps: Annotated[
+        List[Tuple], operator.add
+    ]  # 已经执行了的步骤 [step,result]元组
+    response: str
+    file_path: str  # 要分析的数据文件，默认 ./data.csv
+
+
+class Plan(BaseModel):
+    """执行计划"""
+
+    steps: List[str] = Field(description="要遵循的不同步骤，应按顺序排列")
+
+
+def run_step(user_query: str, current_plan: str, past_steps: List[Tuple]) -> str:
+    """执行计划中的一个步骤，返回执行结果"""
+    # 拿到之前完成了的步骤和结果
+    history_steps = "暂无历史记录(这是第一步)"
+
+    if past_steps:
+        history_steps = "\n".join(
+            f"步骤:{step}\n结果:{result}\n" for step, result in past_steps
+        )
+    # 构造messages
+    messages = [
+        SystemMessage(content=EXECUTOR_SYSTEM_PROMPT),
+        HumanMessage(
+            content=f"""请利用工具执行以下具体任务：
+
+### 1. 项目背景 (Context)
+**总体目标**: {user_query}
+
+### 2. 参考资料 (Execution History)
+*以下是前序步骤的执行结果，请从中提取你需要的参数（如ID、链接、关键数据），不要重复做这些工作：*
+----------------------------------------
+{history_steps}
+----------------------------------------
+
+### 3. 当前任务 (Current Mission)
+**请立即执行此步骤**: {current_plan}
+"""
+        ),
+    ]
+
+    # 调用执行当前节点
+    response = build_executor().invoke(input={"messages": messages})
+
+    return response["messages"][-1].content
+
+
+def plan_node(state: PlanExecuteAgentState):
+
+    # 构造messages
+    messages = [
+        SystemMessage(content=PLANNER_SYSTEM_PROMPT),
+        HumanMessage(
+            f"""
+**用户问题：** "{state['user_query']}"
+
+**文件信息：**
+- **File Path**: `{state.get('file_path') or DEFAULT_FILE_PATH}`
+- **Known Schema**: 无 
+(如果 Known Schema 为空，请先制定计划去获取它。)
+"""
+        ),
+    ]
+
+    # 流式解析计划：每个步骤生成完就推送给客户端，
+    # 第一步一生成完就在后台开始执行，与后续步骤的生成重叠
+    writer = get_stream_writer()
+    first_step = {}
+
+    def on_item(field: str, index: int, step: str):
+        if field != "steps":
+            return
+        writer({"type": "plan_step", "index": index, "step": step})
+        if index == 0:
+            first_step["step"] = step
+            first_step["future"] = _step_executor.submit(
+                run_step, state["user_query"], step, []
+            )
+
+    result = stream_structured(
+        router.get("planner"), Plan, messages, on_item=on_item
+    )
+
+    if "future" not in first_step:
+        return {"steps": result.steps}
+
+    # 第一步的执行结果直接计入历史，图会跳过 executor 直接进入 replaner；
+    # 剩余计划里去掉已执行的第一步，避免重规划把它当成未完成的步骤再规划一次
+    return {
+        "steps": result.steps[1:],
+        "past_steps": [(first_step["step"], first_step["future"].result())],
+    }
+
+
+def execute_node(state: PlanExecuteAgentState):
+    # 拿到当前要执行的步骤
+    current_plan = state["steps"][0]
+
+    result = run_step(state["user_query"], current_plan, state["past_steps"])
+
+    return {"past_steps": [(current_plan, result)]}
+
+
+class Replan(BaseModel):
+    """重规划者的决策结果"""
+
+    status: Literal["done", "continue"] = Field(
+        description="如果是 'done'，表示任务已完成。如果是 'continue'，表示需要执行新计划。"
+    )
+    new_plan: Optional[List[str]] = Field(
+        default=None,
+        description="如果 status 是 'continue'，这里必须包含剩余的、更新后的步骤列表。",
+    )
+    final_response: Optional[str] = Field(
+        default=None,
+        description="如果 status 是 'done'，这里必须包含回答用户问题的最终完整回复。",
+    )
+
+
+def replan_priority(state: PlanExecuteAgentState) -> int:
+    """
+    重规划请求的调度优先级
+
+    重规划与最终回复是同一次调用，只能在发起前判断：计划中的步骤都已执行完时，
+    这次调用多半直接给出展示给用户的最终回复，按交互优先级排队；还有未执行的步骤时多半是调整计划，在后台排队。
+    """
+    done = {step for step, _ in state["past_steps"]}
+    remaining = [step for step in state["steps"] if step not in done]
+    return BACKGROUND if remaining else INTERACTIVE
+
+
+def replan_node(state: PlanExecuteAgentState):
+
+    # 拿到所有还没执行的步骤
+    current_plan_list = "无"
+
+    if state["steps"]:
+        current_plan_list = "".join(f"{step}," for step in state["steps"])
+
+    # 拿到之前执行完了的步骤和结果
+    history_steps = "暂无历史记录"
+
+    if state["past_steps"]:
+        history_steps = "\n".join(
+            f"步骤:{step}\n结果:{result}\n" for step, result in state["past_steps"]
+        )
+
+    # 构造messages
+    messages = [
+        SystemMessage(content=REPLAN_SYSTEM_PROMPT),
+        HumanMessage(
+            content=f"""
+        请基于以下最新的项目状态进行决策：
+
+# 1. 原始目标 (Goal)
+{state['user_query']}
+
+# 2. 当前剩余计划 (Current Plan)
+{current_plan_list}
+
+# 3. 执行历史档案 (Execution History)
+----------------------------------------
+{history_steps}
+----------------------------------------
+"""
+        ),
+    ]
+
+    # 流式解析结构化输出：final_response 每解码出一段就通过 custom 流推送给客户端，
+    # 不必等整个 Replan JSON 生成完（messages 流中是未解码的 JSON 片段）
+    writer = get_stream_writer()
+
+    def on_field_delta(field: str, text: str):
+        if field == "final_response":
+            writer({"type": "final_response", "delta": text})
+
+    result = stream_structured(
+        router.get("replanner", priority=replan_priority(state)),
+        Replan,
+        messages,
+        on_field_delta=on_field_delta,
+        config={"tags": ["replan"]},
+    )
+
+    if result.status == "done":
+        return {"steps": [], "response": result.final_response}
+    else:
+        return {"steps": result.new_plan}
+
+
+# 判断是否执行步骤还是结束
+def should_end(state: PlanExecuteAgentState):
+    if "response" in state and state["response"]:
+        return END
+    else:
+        return "executor"
+
+
+@register_graph("plan_execute_executor")
+def build_executor():
+    """执行单个步骤的子 Agent（每个进程只构建一次），通过 data_analysis 调用 BI Agent"""
+    return create_agent(
+        tools=[data_analysis],
+        model=router.get("executor", temperature=1),
+    )
+
+
+@register_graph("plan_execute")
+def build_plan_execute_app():
+    """
+    构建 Plan-and-Execute 图（每个进程只编译一次）
+
+    编译好的图不保存会话状态，可以在多个请求之间并发复用，每次 invoke / stream 传入各自的输入。
+
+    Returns:
+        编译好的图
+    """
+    workflow = StateGraph(PlanExecuteAgentState)
+
+    workflow.add_node("planner", plan_node)
+
+    workflow.add_node("executor", execute_node)
+
+    workflow.add_node("replaner", replan_node)
+
+    workflow.add_edge(START, "planner")
+
+    # 第一步已在规划时执行完的，直接进入 replaner
+    workflow.add_conditional_edges(
+        "planner",
+        lambda state: "replaner" if state["past_steps"] else "executor",
+    )
+
+    workflow.add_edge("executor", "replaner")
+
+    workflow.add_conditional_edges("replaner", should_end)
+
+    return workflow.compile()
@@ -0,0 +1,168 @@
+"""
+沙箱绘图配置
+
+为执行生成代码的子进程预先配置 matplotlib：
+- 固定使用无界面的 Agg 后端
+- 预置中文字体，避免中文标题触发字体回退扫描
+- 按部署限制 DPI 与画布尺寸，可选输出 WebP 低清预览，并按需延迟渲染高清原图
+
+策略通过环境变量在宿主进程与沙箱子进程之间传递（见 PlotPolicy.to_env），
+子进程侧的补丁逻辑位于 sandbox_site/sitecustomize.py。
+"""
+
+import os
+import subprocess
+import sys
+from dataclasses import dataclass, replace
+from pathlib import Path
+from typing import Dict, Literal, Optional
+
+# 常见平台的中文字体（按优先级），最后以 DejaVu Sans 兜底西文字符
+CJK_FONT_CANDIDATES = [
+    "Noto Sans CJK SC",
+    "WenQuanYi Zen Hei",
+    "PingFang SC",
+    "Heiti TC",
+    "Arial Unicode MS",
+    "Microsoft YaHei",
+    "SimHei",
+]
+
+# 延迟渲染时保存的 Figure 序列化文件后缀
+FIGURE_PICKLE_SUFFIX = ".fig.pickle"
+
+# 在沙箱子进程中反序列化 Figure 并渲染原图，宿主进程不导入 matplotlib
+_RENDER_CODE = """
+import pickle
+
+with open({pickle_path!r}, "rb") as f:
+    payload = pickle.load(f)
+
+payload["figure"].savefig({image_path!r}, **{{**payload["kwargs"], "dpi": {dpi!r}}})
+"""
+
+
+@dataclass(frozen=True)
+class PlotPolicy:
+    """图表渲染策略（每个部署一份）"""
+
+    max_dpi: int = 120  # 保存图片允许的最大 DPI
+    max_width: float = 12.0  # 画布最大宽度（英寸）
+    max_height: float = 8.0  # 画布最大高度（英寸）
+    render_mode: Literal["eager", "lazy"] = "eager"  # lazy: 只出预览，原图按需渲染
+    preview_format: str = ""  # 预览图格式，例如 "webp"；为空表示不生成预览
+    preview_dpi: int = 60  # 预览图 DPI
+
+    @classmethod
+    def from_env(cls) -> "PlotPolicy":
+        """从环境变量（.env）读取策略，未设置的字段使用默认值"""
+        default = cls()
+        return cls(
+            max_dpi=int(os.getenv("PLOT_MAX_DPI", default.max_dpi)),
+            max_width=float(os.getenv("PLOT_MAX_WIDTH", default.max_width)),
+            max_height=float(os.getenv("PLOT_MAX_HEIGHT", default.max_height)),
+            render_mode=os.getenv("PLOT_RENDER_MODE", default.render_mode),
+            preview_format=os.getenv("PLOT_PREVIEW_FORMAT", default.preview_format),
+            preview_dpi=int(os.getenv("PLOT_PREVIEW_DPI", default.preview_dpi)),
+        )
+
+    def to_env(self) -> Dict[str, str]:
+        """转换为传给沙箱子进程的环境变量"""
+        return {
+            "PLOT_MAX_DPI": str(self.max_dpi),
+            "PLOT_MAX_WIDTH": str(self.max_width),
+            "PLOT_MAX_HEIGHT": str(self.max_height),
+            "PLOT_RENDER_MODE": self.render_mode,
+            "PLOT_PREVIEW_FORMAT": self.preview_format,
+            "PLOT_PREVIEW_DPI": str(self.preview_dpi),
+        }
+
+
+def build_matplotlibrc(policy: PlotPolicy, fonts: Optional[list] = None) -> str:
+    """
+    生成沙箱使用的 matplotlibrc 内容
+
+    Args:
+        policy: 图表渲染策略
+        fonts: 中文字体列表，默认使用 CJK_FONT_CANDIDATES
+
+    Returns:
+        matplotlibrc 文本
+    """
+    font_list = ", ".join([*(fonts or CJK_FONT_CANDIDATES), "DejaVu Sans"])
+    return "\n".join(
+        [
+            "backend: Agg",
+            "font.family: sans-serif",
+            f"font.sans-serif: {font_list}",
+            "axes.unicode_minus: False",
+            f"figure.figsize: {min(10.0, policy.max_width)}, {min(6.0, policy.max_height)}",
+            f"savefig.dpi: {policy.max_dpi}",
+            "",
+        ]
+    )
+
+
+def write_matplotlibrc(
+    config_dir: Path, policy: PlotPolicy, fonts: Optional[list] = None
+) -> Path:
+    """
+    将 matplotlibrc 写入配置目录，内容未变化时不重复写入
+
+    Args:
+        config_dir: 沙箱的 MPLCONFIGDIR
+        policy: 图表渲染策略
+        fonts: 中文字体列表
+
+    Returns:
+        matplotlibrc 文件路径
+    """
+    config_dir.mkdir(parents=True, exist_ok=True)
+    rc_path = config_dir / "matplotlibrc"
+    content = build_matplotlibrc(policy, fonts)
+    if not rc_path.exists() or rc_path.read_text(encoding="utf-8") != content:
+        rc_path.write_text(content, encoding="utf-8")
+    return rc_path
+
+
+def render_full_res(image_path: str, policy: Optional[PlotPolicy] = None) -> str:
+    """
+    按需渲染延迟模式下的高清原图
+
+    沙箱在 lazy 模式下只输出预览图，并把 Figure 序列化到
+    `<image_path>.fig.pickle`。客户端真正需要原图时再调用本函数，
+    渲染同样在沙箱子进程中进行。
+
+    Args:
+        image_path: 生成代码中 savefig 的目标路径
+        policy: 图表渲染策略，默认从环境变量读取
+
+    Returns:
+        渲染后的原图路径
+    """
+    from sandbox import build_sandbox_env
+    from sandbox_scheduler import get_sandbox_scheduler
+
+    policy = policy or PlotPolicy.from_env()
+    pickle_path = Path(image_path + FIGURE_PICKLE_SUFFIX)
+    if not pickle_path.exists():
+        if Path(image_path).exists():
+            return image_path
+        raise FileNotFoundError(f"没有找到可渲染的图表: {image_path}")
+
+    # 渲染子进程按 eager 模式直接输出原图，不再生成预览和序列化文件
+    env = build_sandbox_env(replace(policy, render_mode="eager", preview_format=""))
+    code = _RENDER_CODE.format(
+        pickle_path=str(pickle_path), image_path=image_path, dpi=policy.max_dpi
+    )
+    with get_sandbox_scheduler().slot() as slot:
+        result = subprocess.run(
+            [sys.executable, "-c", code],
+            capture_output=True,
+            text=True,
+            env={**env, **slot.env()},
+        )
+    if result.returncode != 0:
+        raise RuntimeError(f"渲染原图失败: {result.stderr}")
+    pickle_path.unlink()
+    return image_path
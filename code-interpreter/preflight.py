@@ -0,0 +1,395 @@
+"""
+生成代码的静态预检
+
+在启动子进程之前，用 AST 对生成代码做快速检查，提前发现注定失败的运行：
+- 语法错误（SyntaxError）
+- 执行环境中不存在的模块（ImportError）
+- 读取不存在的文件（FileNotFoundError）
+- 引用数据集中不存在的列（KeyError）
+
+检查偏保守：无法确定的写法一律放行，只拦截确定会失败的情况。
+"""
+
+import ast
+import difflib
+import importlib.util
+import json
+import os
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from dataset_cache import get_profile
+from sandbox import SANDBOX_SITE_DIR
+
+# pandas 读取数据的函数
+READ_FUNCS = {"read_csv", "read_excel", "read_parquet", "read_json", "read_table"}
+
+# 第一个参数是输出路径的写文件函数 / 方法
+WRITE_FUNCS = {"to_csv", "to_excel", "to_parquet", "to_json", "to_pickle", "savefig"}
+
+# 写文件函数中指定输出路径的关键字参数
+_PATH_KEYWORDS = {"path_or_buf", "path", "excel_writer", "fname"}
+
+# 第一个参数（或 by=）是列名的 DataFrame 方法
+COLUMN_METHODS = {"groupby", "sort_values", "set_index"}
+
+# 能捕获导入失败的异常类型
+_IMPORT_GUARDS = {"ImportError", "ModuleNotFoundError", "Exception", "BaseException"}
+
+
+@lru_cache(maxsize=None)
+def module_available(name: str) -> bool:
+    """判断执行环境中能否导入某个顶层模块（沙箱与宿主使用同一解释器）"""
+    if (SANDBOX_SITE_DIR / f"{name}.py").exists():
+        return True
+    try:
+        return importlib.util.find_spec(name) is not None
+    except (ImportError, ValueError):
+        return False
+
+
+def _parse_context(data_context: Any) -> Dict[str, Any]:
+    if isinstance(data_context, str):
+        try:
+            data_context = json.loads(data_context)
+        except json.JSONDecodeError:
+            return {}
+    return data_context if isinstance(data_context, dict) else {}
+
+
+def _known_columns(context: Dict[str, Any]) -> Set[str]:
+    if context.get("columns"):
+        return set(context["columns"])
+    file_path = context.get("file_path")
+    profile = get_profile(file_path) if file_path else None
+    return set(profile.columns) if profile else set()
+
+
+def _string_values(node: Optional[ast.AST]) -> List[str]:
+    """提取 'a' 或 ['a', 'b'] 形式的字符串常量，其他写法返回空列表"""
+    if isinstance(node, ast.Constant) and isinstance(node.value, str):
+        return [node.value]
+    if isinstance(node, (ast.List, ast.Tuple)):
+        values = [_string_values(elt) for elt in node.elts]
+        if all(len(v) == 1 for v in values):
+            return [v[0] for v in values]
+    return []
+
+
+def _guarded_imports(tree: ast.AST) -> Set[ast.AST]:
+    """找出被 try/except ImportError 包裹的导入语句"""
+    guarded = set()
+    for node in ast.walk(tree):
+        if not isinstance(node, ast.Try):
+            continue
+        names = set()
+        for handler in node.handlers:
+            if handler.type is None:
+                names.add("BaseException")
+            for elt in ast.walk(handler.type) if handler.type else []:
+                if isinstance(elt, ast.Name):
+                    names.add(elt.id)
+        if names & _IMPORT_GUARDS:
+            for stmt in node.body:
+                guarded.update(
+                    n for n in ast.walk(stmt) if isinstance(n, (ast.Import, ast.ImportFrom))
+                )
+    return guarded
+
+
+def _check_imports(tree: ast.AST) -> Iterable[str]:
+    guarded = _guarded_imports(tree)
+    for node in ast.walk(tree):
+        if node in guarded:
+            continue
+        if isinstance(node, ast.Import):
+            modules = [alias.name for alias in node.names]
+        elif isinstance(node, ast.ImportFrom) and node.level == 0 and node.module:
+            modules = [node.module]
+        else:
+            continue
+        for module in modules:
+            top = module.split(".")[0]
+            if top != "__future__" and not module_available(top):
+                yield (
+                    f"ModuleNotFoundError: 第{node.lineno}行导入的模块 '{top}' "
+                    f"在执行环境中不存在"
+                )
+
+
+def _string_vars(tree: ast.AST) -> Dict[str, str]:
+    """只被赋值过一次字符串常量的变量，例如 file_path = './data.csv'"""
+    values: Dict[str, List[Any]] = {}
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Assign):
+            for target in node.targets:
+                if isinstance(target, ast.Name):
+                    values.setdefault(target.id, []).append(node.value)
+    return {
+        name: nodes[0].value
+        for name, nodes in values.items()
+        if len(nodes) == 1
+        and isinstance(nodes[0], ast.Constant)
+        and isinstance(nodes[0].value, str)
+    }
+
+
+def _read_call_name(node: ast.AST) -> Optional[str]:
+    if isinstance(node, ast.Call):
+        func = node.func
+        if isinstance(func, ast.Attribute) and func.attr in READ_FUNCS:
+            return func.attr
+        if isinstance(func, ast.Name) and func.id == "open":
+            return "open"
+    return None
+
+
+def _open_mode(node: ast.Call) -> Optional[str]:
+    """open() 的打开模式，无法静态确定时返回 None"""
+    mode = node.args[1] if len(node.args) > 1 else None
+    for kw in node.keywords:
+        if kw.arg == "mode":
+            mode = kw.value
+    if mode is None:
+        return "r"
+    values = _string_values(mode)
+    return values[0] if len(values) == 1 else None
+
+
+def _path_value(node: Optional[ast.AST], string_vars: Dict[str, str]) -> Optional[str]:
+    """路径参数的字符串值：字符串常量或只赋值过一次的字符串变量，其他写法返回 None"""
+    if isinstance(node, ast.Name):
+        return string_vars.get(node.id)
+    if isinstance(node, ast.Constant) and isinstance(node.value, str):
+        return node.value
+    return None
+
+
+def _normalize(path: str, cwd: str) -> str:
+    return os.path.normpath(os.path.join(cwd, os.path.expanduser(path)))
+
+
+def _read_paths(tree: ast.AST, string_vars: Dict[str, str]) -> Iterable[Tuple[ast.Call, str]]:
+    """(调用节点, 读取的路径)，路径无法静态确定的调用跳过"""
+    for node in ast.walk(tree):
+        name = _read_call_name(node)
+        if not name or not node.args:
+            continue
+        if name == "open":
+            mode = _open_mode(node)
+            if not mode or not mode.startswith("r"):
+                continue
+        path = _path_value(node.args[0], string_vars)
+        if path and "://" not in path:
+            yield node, path
+
+
+def _written_paths(tree: ast.AST, string_vars: Dict[str, str], cwd: str) -> Set[str]:
+    """代码自己写出的文件（to_csv / savefig / open(..., 'w') 等），读取它们不算读取不存在的文件"""
+    written = set()
+    for node in ast.walk(tree):
+        if not isinstance(node, ast.Call):
+            continue
+        func = node.func
+        target = None
+        if isinstance(func, ast.Attribute) and func.attr in WRITE_FUNCS:
+            target = node.args[0] if node.args else None
+            for kw in node.keywords:
+                if kw.arg in _PATH_KEYWORDS:
+                    target = kw.value
+        elif isinstance(func, ast.Name) and func.id == "open" and node.args:
+            mode = _open_mode(node)
+            if mode and (not mode.startswith("r") or "+" in mode):
+                target = node.args[0]
+        path = _path_value(target, string_vars)
+        if path:
+            written.add(_normalize(path, cwd))
+    return written
+
+
+def _check_paths(
+    tree: ast.AST, string_vars: Dict[str, str], context: Dict[str, Any], cwd: str
+) -> Iterable[str]:
+    written = _written_paths(tree, string_vars, cwd)
+    for node, path in _read_paths(tree, string_vars):
+        full_path = _normalize(path, cwd)
+        if full_path in written or os.path.exists(full_path):
+            continue
+        message = f"FileNotFoundError: 第{node.lineno}行读取的文件 '{path}' 不存在"
+        if context.get("file_path"):
+            message += f"，数据上下文中的文件路径是 '{context['file_path']}'"
+        yield message
+
+
+def _is_copy_call(node: ast.AST) -> bool:
+    return (
+        isinstance(node, ast.Call)
+        and isinstance(node.func, ast.Attribute)
+        and node.func.attr == "copy"
+        and isinstance(node.func.value, ast.Name)
+    )
+
+
+def _reads_dataset(
+    node: ast.AST, dataset: Optional[str], string_vars: Dict[str, str], cwd: str
+) -> bool:
+    """node 是否为按默认列名读取数据上下文中数据集的 pd.read_* 调用"""
+    if not dataset or _read_call_name(node) not in READ_FUNCS or not node.args:
+        return False
+    if any(kw.arg in ("names", "header") for kw in node.keywords):
+        return False
+    path = _path_value(node.args[0], string_vars)
+    return path is not None and _normalize(path, cwd) == _normalize(dataset, cwd)
+
+
+def _frame_names(
+    tree: ast.AST,
+    dataset: Optional[str],
+    string_vars: Dict[str, str],
+    cwd: str,
+    extra: Iterable[str] = (),
+) -> Set[str]:
+    """
+    只由 pd.read_* 读取数据集（dataset）直接赋值、且没有自定义列名的变量；读取其他文件的变量不做列检查
+
+    extra 中的变量由调用方保证指向已加载的数据集（例如批量模式下函数的 df 参数），
+    只要没有被 copy() 以外的表达式重新赋值，就视为数据集。
+    """
+    assigned: Dict[str, List[ast.AST]] = {}
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.Assign, ast.AugAssign, ast.AnnAssign)):
+            targets = node.targets if isinstance(node, ast.Assign) else [node.target]
+            for target in targets:
+                # df['col'] = ... 这类下标赋值不算重新绑定变量
+                names = target.elts if isinstance(target, (ast.Tuple, ast.List)) else [target]
+                for name in names:
+                    if isinstance(name, ast.Starred):
+                        name = name.value
+                    if isinstance(name, ast.Name):
+                        assigned.setdefault(name.id, []).append(node.value)
+
+    # 作为函数参数或循环变量出现的同名变量可能指向其他对象
+    rebound = {node.arg for node in ast.walk(tree) if isinstance(node, ast.arg)}
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.For, ast.comprehension, ast.withitem)):
+            target = node.optional_vars if isinstance(node, ast.withitem) else node.target
+            rebound.update(
+                n.id for n in ast.walk(target or ast.Tuple(elts=[])) if isinstance(n, ast.Name)
+            )
+
+    frames = {
+        name
+        for name in extra
+        if all(_is_copy_call(value) for value in assigned.get(name, []))
+    }
+    for name, values in assigned.items():
+        if name in rebound:
+            continue
+        if all(_reads_dataset(value, dataset, string_vars, cwd) for value in values):
+            frames.add(name)
+    return frames
+
+
+def _check_columns(
+    tree: ast.AST,
+    columns: Set[str],
+    dataset: Optional[str],
+    string_vars: Dict[str, str],
+    cwd: str,
+    frame_names: Iterable[str] = (),
+) -> Iterable[str]:
+    frames = _frame_names(tree, dataset, string_vars, cwd, frame_names)
+    if not frames or not columns:
+        return
+
+    created = set()
+    for node in ast.walk(tree):
+        # 重命名或整体替换列名后，无法再静态推断列名
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute):
+            if node.func.attr == "rename":
+                return
+            if node.func.attr == "insert" and len(node.args) > 1:
+                created.update(_string_values(node.args[1]))
+        if isinstance(node, ast.Attribute) and node.attr == "columns":
+            if isinstance(node.ctx, ast.Store):
+                return
+        if (
+            isinstance(node, ast.Subscript)
+            and isinstance(node.ctx, ast.Store)
+            and isinstance(node.value, ast.Name)
+            and node.value.id in frames
+        ):
+            created.update(_string_values(node.slice))
+
+    known = columns | created
+    for node in ast.walk(tree):
+        refs: List[str] = []
+        if (
+            isinstance(node, ast.Subscript)
+            and isinstance(node.ctx, ast.Load)
+            and isinstance(node.value, ast.Name)
+            and node.value.id in frames
+        ):
+            refs = _string_values(node.slice)
+        elif (
+            isinstance(node, ast.Call)
+            and isinstance(node.func, ast.Attribute)
+            and node.func.attr in COLUMN_METHODS
+            and isinstance(node.func.value, ast.Name)
+            and node.func.value.id in frames
+        ):
+            by = node.args[0] if node.args else None
+            for kw in node.keywords:
+                if kw.arg in ("by", "keys"):
+                    by = kw.value
+            refs = _string_values(by) if by is not None else []
+
+        for ref in refs:
+            if ref not in known:
+                message = f"KeyError: 第{node.lineno}行引用的列 '{ref}' 不存在"
+                suggestion = difflib.get_close_matches(ref, list(columns), n=1)
+                if suggestion:
+                    message += f"，是否是 '{suggestion[0]}'？"
+                message += f" 可用列: {sorted(columns)}"
+                yield message
+
+
+def preflight_check(
+    code: str,
+    data_context: Any = None,
+    cwd: Optional[str] = None,
+    frame_names: Iterable[str] = (),
+) -> List[str]:
+    """
+    对生成代码做静态预检
+
+    Args:
+        code: 生成的Python代码
+        data_context: 数据上下文（dict 或 JSON 字符串），用于获取文件路径与列名
+        cwd: 代码执行时的工作目录，默认当前目录
+        frame_names: 额外确定指向数据集 DataFrame 的变量名
+
+    Returns:
+        错误信息列表，为空表示通过预检
+    """
+    try:
+        tree = ast.parse(code)
+    except SyntaxError as e:
+        return [f"SyntaxError: {e.msg} (第{e.lineno}行)"]
+
+    context = _parse_context(data_context)
+    string_vars = _string_vars(tree)
+    cwd = cwd or os.getcwd()
+    errors = list(_check_imports(tree))
+    errors.extend(_check_paths(tree, string_vars, context, cwd))
+    errors.extend(
+        _check_columns(
+            tree,
+            _known_columns(context),
+            context.get("file_path"),
+            string_vars,
+            cwd,
+            frame_names,
+        )
+    )
+    return errors
@@ -163,29 +163,27 @@ CODE_GENERATOR_SYSTEM_PROMPT = """你是一个专业的Python数据分析代码
    print("\n描述性统计:")
    print(df.describe())
    ```
+   需要完整画像（空值、分位数、高频取值、相关系数）时，用执行环境提供的单遍画像代替分别调用
+   `describe()` / `isnull().sum()` / `corr()` / `value_counts()`（每个都要扫描一遍数据）:
+   ```python
+   from profiler import profile_frame
+   summary = profile_frame(df)   # {'rows', 'columns': {列名: 统计}, 'correlation'}
+   ```
 
-3. **可视化（重要：中文字体配置）**
+3. **可视化（执行环境已预配置）**
    ```python
    import matplotlib.pyplot as plt
-   import matplotlib as mpl
-   
-   # 配置中文字体（解决中文乱码问题）
-   plt.rcParams['font.sans-serif'] = ['Arial Unicode MS', 'SimHei', 'Microsoft YaHei', 
-                                        'PingFang SC', 'Heiti TC', 'WenQuanYi Zen Hei']
-   plt.rcParams['axes.unicode_minus'] = False  # 解决负号显示问题
    
    plt.figure(figsize=(10, 6))
    # ... 绘图代码 ...
-   plt.savefig('./output.png', dpi=300, bbox_inches='tight')
+   plt.savefig('./output.png', bbox_inches='tight')
    plt.close()
    print("图表已保存到: ./output.png")
    ```
    
-   **字体配置说明**:
-   - macOS: 'Arial Unicode MS', 'PingFang SC', 'Heiti TC'
-   - Windows: 'SimHei', 'Microsoft YaHei'
-   - Linux: 'WenQuanYi Zen Hei'
-   - 设置字体列表后，matplotlib会自动选择系统中可用的第一个字体
+   **执行环境说明**:
+   - 已使用 Agg 后端并预置中文字体，**不要**再设置 `matplotlib.use()` 或 `plt.rcParams['font.sans-serif']`
+   - 图片 DPI 和尺寸由执行环境统一控制，`savefig` 时**不要**指定 `dpi`
 
 4. **函数封装**
    - 将主要逻辑封装到函数中
@@ -359,20 +357,9 @@ def plot_sales_trend():
             print("❌ 错误: 未找到数值列用于绘图")
             return None
         
-        # 步骤4: 配置matplotlib中文字体
-        print("\n" + "=" * 60)
-        print("步骤4: 配置matplotlib中文字体")
-        print("=" * 60)
-        
-        # 配置中文字体，解决中文乱码问题
-        plt.rcParams['font.sans-serif'] = ['Arial Unicode MS', 'SimHei', 'Microsoft YaHei',
-                                             'PingFang SC', 'Heiti TC', 'WenQuanYi Zen Hei']
-        plt.rcParams['axes.unicode_minus'] = False  # 解决负号显示问题
-        print("✓ 中文字体配置完成")
-        
-        # 步骤5: 绘制趋势图
+        # 步骤4: 绘制趋势图
         print("\n" + "=" * 60)
-        print("步骤5: 生成销售趋势图")
+        print("步骤4: 生成销售趋势图")
         print("=" * 60)
         
         plt.figure(figsize=(12, 6))
@@ -392,9 +379,9 @@ def plot_sales_trend():
         plt.xticks(rotation=45)
         plt.tight_layout()
         
-        # 步骤6: 保存图表
+        # 步骤5: 保存图表
         output_path = './sales_trend.png'
-        plt.savefig(output_path, dpi=300, bbox_inches='tight')
+        plt.savefig(output_path, bbox_inches='tight')
         plt.close()
         
         print(f"\n✓ 图表类型: 折线图（趋势分析）")
@@ -655,9 +642,22 @@ CODE_INTERPRETER_AGENT_PROMPT = """你是一个专业的BI数据分析代码解
 1. **generate_python_code**: 生成Python数据分析代码
 2. **execute_python_code**: 在安全环境中执行代码
 3. **analyze_results**: 分析执行结果并生成用户友好的报告
+4. **batch_analyze**: 针对同一数据集的多个独立问题，一次生成、一次执行、分别出报告
+5. **sql_query**: 用 SQL 直接查询数据集，适合纯聚合类问题（分组汇总、排名 Top-N、平均值、计数）
+6. **speculative_execute**: 并行生成多份候选代码并执行，采用第一个成功的结果（相当于并行版的生成 + 执行）
 
 ## 工作流程
 
+### SQL 快速流程 (纯聚合问题，不需要图表)
+1. 调用 `sql_query` 得到查询结果
+2. 调用 `analyze_results` 生成分析报告
+3. 如果 `sql_query` 失败，或问题需要可视化/复杂处理，改走标准流程
+
+### 批量流程 (同一数据集上的多个问题)
+如果用户一次提出了多个彼此独立的问题，且都针对同一个数据文件:
+1. 调用 `batch_analyze`，传入拆分好的问题列表
+2. 根据返回的每个问题的报告汇总回复；只对失败的问题再走标准流程
+
 ### 标准流程 (无错误)
 1. 调用 `generate_python_code` 生成代码
 2. 调用 `execute_python_code` 执行代码
@@ -670,7 +670,7 @@ CODE_INTERPRETER_AGENT_PROMPT = """你是一个专业的BI数据分析代码解
 2. **决策**: 
    - 如果是简单错误（语法、变量名等），重新生成代码
    - 如果是数据问题（列不存在等），可能需要先探索数据
-3. **重试**: 调用 `generate_python_code`，**务必传入错误信息**
+3. **重试**: 调用 `generate_python_code`，**务必传入错误信息**；如果已经失败过一次，改用 `speculative_execute` 一次尝试多份候选
 4. **限制**: 最多重试3次，如果仍然失败，向用户报告
 
 ## 重要规则
@@ -698,3 +698,121 @@ CODE_INTERPRETER_AGENT_PROMPT = """你是一个专业的BI数据分析代码解
 - 最多重试3次
 - 成功后一定要调用 analyze_results 提供洞察
 """
+
+
+BATCH_CODE_GENERATOR_SYSTEM_PROMPT = """你是一个专业的Python数据分析代码生成器。你需要在**同一份数据**上一次性完成多个分析任务。
+
+## 代码结构（必须严格遵守）
+
+执行环境会负责加载数据并依次调用你的函数，你**只需要**输出:
+1. 需要的 import 语句
+2. 每个任务一个函数: `task_1(df)`, `task_2(df)`, ..., 编号与任务编号一致
+
+```python
+import pandas as pd
+import matplotlib.pyplot as plt
+
+
+def task_1(df):
+    print("任务1: 统计各商品类型的销售金额")
+    # ... 分析代码 ...
+
+
+def task_2(df):
+    print("任务2: 销售金额最高的前10个商品")
+    # ... 分析代码 ...
+```
+
+## 规则
+
+1. **不要**自己读取数据文件，**不要**在函数外调用任何函数，参数 `df` 就是已加载好的 DataFrame
+2. 每个函数只完成对应的任务，函数之间不能互相依赖
+3. 不要修改传入的 `df` 本身，需要新列时先 `df = df.copy()`
+4. 使用 print() 详细输出关键信息，便于后续分别分析每个任务的结果
+5. 如果生成图表，文件名以任务编号开头（例如 `./task_1_sales.png`），保存时不要指定 dpi
+6. 代码必须放在 ```python 代码块内，不要有任何解释文字
+"""
+
+
+CHUNKED_EXECUTION_PROMPT = """
+**⚠️ 大数据集：分块执行模式**
+数据文件约 {size_mb:.0f} MB，超出内存预算，**禁止**使用 `pd.read_csv(file_path)` 整体读入。
+请使用执行环境提供的 `ChunkedFrame` 按块流式处理:
+
+```python
+from chunked_frame import ChunkedFrame
+
+cf = ChunkedFrame(file_path)                # 不会立即读取数据
+print(cf.columns)                            # 列名
+print(cf.head())                             # 前几行
+print(cf.shape)                              # 行数、列数（需要一次扫描）
+print(cf.describe())                         # 数值列 count/mean/std/min/max
+print(cf.profile())                          # 单遍画像：空值、分位数、高频取值、相关系数
+print(cf.value_counts('商品类型', top=10))    # 分类计数
+print(cf.groupby_agg('商品类型', {{'销售金额': 'sum', '零售价': 'mean'}}))
+```
+
+- `groupby_agg` 只支持 sum / count / size / min / max / mean
+- 其他计算使用 `cf.map_reduce(map_func, reduce_func, usecols=[...])`，map_func 对每块返回很小的部分结果
+- 只读取需要的列（usecols），绘图前先聚合到少量数据
+- 取值很多的列（例如商品名称）不要做全量 `value_counts()`，用 `cf.profile()` 中的近似 distinct / top，
+  或 `from sketches import SpaceSaving, HyperLogLog` 按块更新固定大小的摘要
+"""
+
+
+DATA_SUMMARY_PROMPT = """
+**数据画像（已对全量数据预先计算，不必再用 describe / isnull / corr / value_counts 重复探索）:**
+```json
+{summary}
+```
+distinct 与 quantiles 是近似值；top 中的 error 表示该计数可能多算的上限。
+"""
+
+
+SQL_GENERATOR_SYSTEM_PROMPT = """你是一个专业的 DuckDB SQL 生成器。你的任务是把用户的数据分析问题转换为一条 SQL 查询。
+
+## 规则
+
+1. 只输出**一条** `SELECT`（可以使用 `WITH`）查询，放在 ```sql 代码块内，不要有任何解释文字
+2. 只能查询给定的表，列名必须来自给定的表结构，**不要**猜测列名
+3. 中文表名、列名必须使用双引号，例如 `"商品类型"`
+4. 使用 DuckDB 语法；Top-N 使用 `ORDER BY ... LIMIT N`
+5. 结果列使用有意义的别名，例如 `SUM("销售金额") AS "销售总额"`
+6. 返回的结果应当是汇总后的少量行，不要 `SELECT *` 全表
+
+## 示例
+
+表: "data"，列: 商品类型 VARCHAR, 商品名称 VARCHAR, 销售金额 DOUBLE, 销售数量 BIGINT, 零售价 DOUBLE
+问题: 各商品类型的销售总额，从高到低
+
+```sql
+SELECT "商品类型", SUM("销售金额") AS "销售总额"
+FROM "data"
+GROUP BY "商品类型"
+ORDER BY "销售总额" DESC
+```
+"""
+
+
+APPROXIMATE_MODE_PROMPT = """
+**抽样预估模式**
+这段代码会先在分层抽样的样本上运行（给用户初步结果），再在全量数据上运行（精确结果）。
+代码本身**不需要**区分两种情况，但所有统计量请使用执行环境提供的 `sampling` 模块输出，
+抽样运行时会自动给出估计值和 95% 置信区间，全量运行时自动退化为精确值:
+
+```python
+from sampling import estimate_count, estimate_total, mean_with_ci, proportion_with_ci
+
+rows, rows_margin = estimate_count(df)
+total, total_margin = estimate_total(df['销售金额'])
+mean, mean_margin = mean_with_ci(df['零售价'])
+share, share_margin = proportion_with_ci(df['商品类型'] == '饮料')
+print(f"销售总额: {total:,.2f} ± {total_margin:,.2f}")
+```
+
+- 总量类指标（行数、求和）使用 `estimate_count` / `estimate_total`，不要直接 `len(df)` 或 `.sum()`
+- 均值、比例使用 `mean_with_ci` / `proportion_with_ci`，并打印误差范围
+- 样本按层抽样、各层权重不同：传入从 df 中取出（可以先筛选）的 DataFrame / Series，
+  不要先 `reset_index()`，也不要传 `len(...)` 等已汇总的数字，否则无法按层加权
+- 排名、分布等结论照常计算即可
+"""
@@ -616,7 +616,7 @@ CODE_GENERATOR_SYSTEM_PROMPT = """你是专业的 Python 数据分析代码生
 - 生成图表时说明类型和路径
 
 ### 4. 中文支持
-- 配置 matplotlib 中文字体
+- 执行环境已预置 Agg 后端和中文字体，不要再设置字体或后端
 - 支持中文列名和标题
 
 ---
@@ -672,13 +672,6 @@ result = main()
 ### 可视化模板
 
 ```python
-# 配置中文字体
-plt.rcParams['font.sans-serif'] = [
-    'Arial Unicode MS', 'SimHei', 'Microsoft YaHei',
-    'PingFang SC', 'Heiti TC', 'WenQuanYi Zen Hei'
-]
-plt.rcParams['axes.unicode_minus'] = False
-
 # 创建输出目录
 output_dir = './analysis_output'
 os.makedirs(output_dir, exist_ok=True)
@@ -689,7 +682,7 @@ plt.figure(figsize=(10, 6))
 plt.tight_layout()
 
 output_path = f'{output_dir}/chart.png'
-plt.savefig(output_path, dpi=300, bbox_inches='tight')
+plt.savefig(output_path, bbox_inches='tight')  # DPI 由执行环境统一控制
 plt.close()
 
 print(f"✓ 图表已保存: {output_path}")
@@ -752,7 +745,7 @@ print(df.isnull().sum())
 
 - ✅ **DO**: 使用函数封装
 - ✅ **DO**: 详细的 print 说明每一步
-- ✅ **DO**: 配置中文字体
+- ✅ **DO**: 直接使用中文标题（字体已预置）
 - ✅ **DO**: 相对路径保存文件
 - ❌ **DON'T**: 假设列名
 - ❌ **DON'T**: 使用不常见的库
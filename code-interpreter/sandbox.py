@@ -0,0 +1,240 @@
+"""
+生成代码的执行环境
+
+统一负责启动运行生成代码的 Python 子进程，并预先配置好执行环境
+（绘图后端、中文字体、图表渲染策略等），避免每段生成代码自己处理。
+"""
+
+import json
+import os
+import subprocess
+import sys
+import threading
+from pathlib import Path
+from typing import Dict, Optional
+
+from plotting import CJK_FONT_CANDIDATES, PlotPolicy, write_matplotlibrc
+from sandbox_scheduler import get_sandbox_scheduler
+from trace_replay import traced_call
+
+# 子进程启动钩子所在目录（包含 sitecustomize.py）
+SANDBOX_SITE_DIR = Path(__file__).resolve().parent / "sandbox_site"
+
+# 沙箱共享的 matplotlib 配置目录（matplotlibrc、字体缓存）
+MPL_CONFIG_DIR = Path(
+    os.getenv(
+        "SANDBOX_MPLCONFIGDIR",
+        Path.home() / ".cache" / "ai-practices" / "matplotlib",
+    )
+)
+
+# 预热时解析出的中文字体（名称与字体文件路径）
+PINNED_FONT_FILE = MPL_CONFIG_DIR / "cjk_font.json"
+
+# 在沙箱子进程中构建字体缓存，并找到第一个可用的中文字体
+_RESOLVE_FONT_CODE = """
+import json
+from matplotlib import font_manager
+
+for name in {candidates!r}:
+    try:
+        path = font_manager.findfont(
+            font_manager.FontProperties(family=name), fallback_to_default=False
+        )
+    except ValueError:
+        continue
+    print(json.dumps({{"name": name, "path": path}}))
+    break
+"""
+
+
+def load_pinned_font() -> Optional[Dict[str, str]]:
+    """
+    读取预热时固定下来的中文字体
+
+    Returns:
+        {"name": 字体名称, "path": 字体文件路径}，未预热或字体文件已不存在时返回 None
+    """
+    if not PINNED_FONT_FILE.exists():
+        return None
+    try:
+        pinned = json.loads(PINNED_FONT_FILE.read_text(encoding="utf-8"))
+    except json.JSONDecodeError:
+        return None
+    if not os.path.exists(pinned.get("path", "")):
+        return None
+    return pinned
+
+
+def warm_up(
+    policy: Optional[PlotPolicy] = None, force: bool = False
+) -> Optional[Dict[str, str]]:
+    """
+    预热执行环境（进程/工作池启动时调用一次）
+
+    在共享的 MPLCONFIGDIR 中预先构建 matplotlib 字体缓存，并把解析到的中文字体
+    固定写入 matplotlibrc。之后每个沙箱子进程直接复用缓存与固定字体，
+    首张图表不再触发字体缓存重建和候选字体的回退查找。
+
+    Args:
+        policy: 图表渲染策略，默认从环境变量读取
+        force: 忽略已有结果，重新构建
+
+    Returns:
+        固定的中文字体信息；系统中没有可用中文字体时返回 None
+    """
+    policy = policy or PlotPolicy.from_env()
+    pinned = None if force else load_pinned_font()
+
+    if pinned is None:
+        result = subprocess.run(
+            [
+                sys.executable,
+                "-c",
+                _RESOLVE_FONT_CODE.format(candidates=CJK_FONT_CANDIDATES),
+            ],
+            capture_output=True,
+            text=True,
+            timeout=300,  # 首次构建字体缓存可能较慢
+            env=build_sandbox_env(policy),
+        )
+        output = result.stdout.strip()
+        if result.returncode != 0 or not output:
+            return None
+        pinned = json.loads(output)
+        PINNED_FONT_FILE.write_text(
+            json.dumps(pinned, ensure_ascii=False), encoding="utf-8"
+        )
+
+    write_matplotlibrc(MPL_CONFIG_DIR, policy, fonts=[pinned["name"]])
+    return pinned
+
+
+def build_sandbox_env(policy: Optional[PlotPolicy] = None) -> Dict[str, str]:
+    """
+    构造沙箱子进程的环境变量
+
+    Args:
+        policy: 图表渲染策略，默认从环境变量读取
+
+    Returns:
+        子进程使用的环境变量字典
+    """
+    policy = policy or PlotPolicy.from_env()
+    pinned = load_pinned_font()
+    rc_path = write_matplotlibrc(
+        MPL_CONFIG_DIR, policy, fonts=[pinned["name"]] if pinned else None
+    )
+
+    env = dict(os.environ)
+    python_path = [str(SANDBOX_SITE_DIR)]
+    if env.get("PYTHONPATH"):
+        python_path.append(env["PYTHONPATH"])
+
+    env.update(policy.to_env())
+    env.update(
+        {
+            "PYTHONPATH": os.pathsep.join(python_path),
+            "MPLBACKEND": "Agg",
+            "MPLCONFIGDIR": str(MPL_CONFIG_DIR),
+            "MATPLOTLIBRC": str(rc_path),
+        }
+    )
+    return env
+
+
+def run_python_code(
+    code: str,
+    timeout: int = 10,
+    policy: Optional[PlotPolicy] = None,
+    extra_env: Optional[Dict[str, str]] = None,
+    cwd: Optional[str] = None,
+) -> subprocess.CompletedProcess:
+    """
+    在预配置的子进程中运行Python代码
+
+    Args:
+        code: 要执行的Python代码
+        timeout: 超时时间（秒）
+        policy: 图表渲染策略，默认从环境变量读取
+        extra_env: 额外传给子进程的环境变量
+        cwd: 子进程的工作目录（会话工作目录，见 workspace.py），默认为当前目录
+
+    Returns:
+        subprocess.CompletedProcess，包含 returncode / stdout / stderr
+    """
+    env = build_sandbox_env(policy)
+    env.update(extra_env or {})
+    args = [sys.executable, "-c", code]
+
+    def execute() -> subprocess.CompletedProcess:
+        # 排队等待沙箱调度器放行，超时时间从开始执行算起
+        with get_sandbox_scheduler().slot() as slot:
+            return subprocess.run(
+                args,
+                capture_output=True,
+                text=True,
+                timeout=timeout,
+                env={**env, **slot.env()},
+                cwd=cwd,
+            )
+
+    # 录制 / 回放模式下执行结果来自 trace 文件，见 trace_replay.py
+    return traced_call(
+        "exec",
+        "python",
+        {"code": code, "extra_env": extra_env},
+        execute,
+        encode=lambda result: [result.returncode, result.stdout, result.stderr],
+        decode=lambda data: subprocess.CompletedProcess(args, *data),
+    )
+
+
+def spawn_python_code(
+    code: str,
+    policy: Optional[PlotPolicy] = None,
+    extra_env: Optional[Dict[str, str]] = None,
+    cwd: Optional[str] = None,
+) -> subprocess.Popen:
+    """
+    在预配置的子进程中异步启动Python代码，调用方负责等待或终止进程
+
+    启动前排队等待沙箱调度器放行，占用的名额在进程退出后释放。
+
+    Args:
+        code: 要执行的Python代码
+        policy: 图表渲染策略，默认从环境变量读取
+        extra_env: 额外传给子进程的环境变量
+        cwd: 子进程的工作目录（会话工作目录，见 workspace.py），默认为当前目录
+
+    Returns:
+        subprocess.Popen（stdout / stderr 为文本管道）
+    """
+    env = build_sandbox_env(policy)
+    env.update(extra_env or {})
+    scheduler = get_sandbox_scheduler()
+    slot = scheduler.acquire()
+    try:
+        process = subprocess.Popen(
+            [sys.executable, "-c", code],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True,
+            env={**env, **slot.env()},
+            cwd=cwd,
+        )
+    except BaseException:
+        scheduler.release(slot)
+        raise
+
+    def release_on_exit():
+        process.wait()
+        scheduler.release(slot)
+
+    threading.Thread(target=release_on_exit, daemon=True).start()
+    return process
+
+
+if __name__ == "__main__":
+    # 部署构建阶段执行一次，预先生成字体缓存：python sandbox.py
+    print("固定中文字体:", warm_up(force=True))
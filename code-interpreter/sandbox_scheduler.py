@@ -0,0 +1,258 @@
+"""
+沙箱执行调度器
+
+多个 BI 会话各自启动 `python -c` 子进程，互不协调：负载高时子进程数远超 CPU 核数，
+pandas / numpy 底层的 BLAS 又默认按核数开线程，超额订阅成倍放大。这里把所有沙箱子进程集中调度：
+1. 同时运行的子进程数不超过可用核数（按 cgroup 配额与 CPU 亲和性计算）除以每个任务的线程数
+2. 每个任务通过 OMP / OpenBLAS / MKL 等环境变量限定线程数
+3. 为每个任务分配独占的 CPU，子进程启动时在 sitecustomize 中绑核（SANDBOX_CPUS）
+4. 按租户（会话）公平排队：正在运行任务少、累计占用 CPU 时间少的租户先放行，
+   单个会话的大量任务不会饿死其他会话
+5. 统计排队时间（总计 / P50 / P95 / 最大）与各租户的占用
+
+配置（环境变量）:
+    SANDBOX_MAX_CONCURRENCY: 最大并发子进程数，默认 可用核数 / 每任务线程数
+    SANDBOX_THREADS_PER_JOB: 每个任务的线程数，默认 1
+    SANDBOX_PIN_CPUS: 是否绑核，默认 1
+
+    from sandbox_scheduler import get_sandbox_scheduler, tenant
+
+    with tenant("session-1"):
+        with get_sandbox_scheduler().slot() as slot:
+            subprocess.run(args, env={**env, **slot.env()})
+"""
+
+import collections
+import contextlib
+import contextvars
+import itertools
+import math
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Deque, Dict, Iterator, List, Optional, Tuple
+
+SANDBOX_MAX_CONCURRENCY = int(os.getenv("SANDBOX_MAX_CONCURRENCY", "0"))
+SANDBOX_THREADS_PER_JOB = int(os.getenv("SANDBOX_THREADS_PER_JOB", "1"))
+SANDBOX_PIN_CPUS = os.getenv("SANDBOX_PIN_CPUS", "1").lower() not in ("0", "false", "no")
+
+# 限定线程数的环境变量（BLAS / OpenMP / numexpr）
+THREAD_ENV_VARS = [
+    "OMP_NUM_THREADS",
+    "OPENBLAS_NUM_THREADS",
+    "MKL_NUM_THREADS",
+    "VECLIB_MAXIMUM_THREADS",
+    "NUMEXPR_NUM_THREADS",
+]
+
+# 排队时间统计保留的最近样本数
+QUEUE_SAMPLES = 1000
+
+# 保留累计占用的租户数上限，超出时清理不活跃的租户
+MAX_TENANTS = 1024
+
+DEFAULT_TENANT = "default"
+
+_current_tenant: contextvars.ContextVar[str] = contextvars.ContextVar(
+    "sandbox_tenant", default=DEFAULT_TENANT
+)
+
+
+@contextlib.contextmanager
+def tenant(name: str) -> Iterator[None]:
+    """在此范围内启动的沙箱子进程记在 name 名下（线程池中执行时需用 contextvars.copy_context 传递）"""
+    token = _current_tenant.set(name)
+    try:
+        yield
+    finally:
+        _current_tenant.reset(token)
+
+
+def current_tenant() -> str:
+    return _current_tenant.get()
+
+
+def _cgroup_cpu_limit() -> Optional[float]:
+    """cgroup v2 的 CPU 配额（核数），未限制时返回 None"""
+    try:
+        quota, period = open("/sys/fs/cgroup/cpu.max").read().split()
+    except (OSError, ValueError):
+        return None
+    if quota == "max":
+        return None
+    return int(quota) / int(period)
+
+
+def available_cpus() -> List[int]:
+    """本进程可用的 CPU 编号（受亲和性限制），并按 cgroup 配额截断"""
+    if hasattr(os, "sched_getaffinity"):
+        cpus = sorted(os.sched_getaffinity(0))
+    else:
+        cpus = list(range(os.cpu_count() or 1))
+    limit = _cgroup_cpu_limit()
+    if limit is not None:
+        cpus = cpus[: max(1, math.ceil(limit))]
+    return cpus
+
+
+@dataclass
+class Slot:
+    """一次放行：运行子进程期间占用的并发名额与 CPU"""
+
+    tenant: str
+    threads: int
+    cpus: Tuple[int, ...]
+    queued_seconds: float
+    started: float = 0.0
+
+    def env(self) -> Dict[str, str]:
+        """传给子进程的线程数与绑核环境变量"""
+        env = {name: str(self.threads) for name in THREAD_ENV_VARS}
+        if self.cpus:
+            env["SANDBOX_CPUS"] = ",".join(map(str, self.cpus))
+        return env
+
+
+class SandboxScheduler:
+    """按核数限流、按租户公平排队的沙箱子进程调度器"""
+
+    def __init__(
+        self,
+        max_concurrency: int = SANDBOX_MAX_CONCURRENCY,
+        threads_per_job: int = SANDBOX_THREADS_PER_JOB,
+        pin_cpus: bool = SANDBOX_PIN_CPUS,
+    ):
+        self.cpus = available_cpus()
+        self.threads_per_job = max(1, threads_per_job)
+        self.max_concurrency = max_concurrency or max(1, len(self.cpus) // self.threads_per_job)
+        # 并发数超过核数 / 线程数时无法给每个任务独占的 CPU，此时不绑核
+        self.pin_cpus = (
+            pin_cpus
+            and hasattr(os, "sched_setaffinity")
+            and self.max_concurrency * self.threads_per_job <= len(self.cpus)
+        )
+
+        self._cond = threading.Condition()
+        self._seq = itertools.count()
+        self._free_cpus = list(self.cpus)
+        self._queues: Dict[str, Deque[int]] = collections.defaultdict(collections.deque)
+        self._running: Dict[str, int] = collections.defaultdict(int)
+        self._usage: Dict[str, float] = collections.defaultdict(float)  # 累计占用的 CPU 秒数
+        self._total_running = 0
+        self._waits: Deque[float] = collections.deque(maxlen=QUEUE_SAMPLES)
+        self._stats = {"jobs": 0, "queued_jobs": 0, "queue_seconds": 0.0}
+
+    def _active(self, name: str) -> bool:
+        return bool(self._queues.get(name)) or self._running.get(name, 0) > 0
+
+    def _next_tenant(self) -> Optional[str]:
+        """下一个放行的租户：运行中任务最少，其次累计占用最少，再次队首最早"""
+        waiting = [name for name, queue in self._queues.items() if queue]
+        if not waiting:
+            return None
+        return min(
+            waiting,
+            key=lambda name: (self._running[name], self._usage[name], self._queues[name][0]),
+        )
+
+    def acquire(self, name: Optional[str] = None) -> Slot:
+        """排队直到放行，返回占用的 Slot（用完必须 release）"""
+        name = name or current_tenant()
+        start = time.monotonic()
+        with self._cond:
+            if not self._active(name):
+                # 重新活跃的租户从当前最小占用开始计，不能凭闲置期间攒下的额度插队
+                others = [self._usage[other] for other in self._usage if self._active(other)]
+                if others:
+                    self._usage[name] = max(self._usage[name], min(others))
+            ticket = next(self._seq)
+            self._queues[name].append(ticket)
+            while not (
+                self._total_running < self.max_concurrency
+                and self._next_tenant() == name
+                and self._queues[name][0] == ticket
+            ):
+                self._cond.wait()
+            self._queues[name].popleft()
+            if not self._queues[name]:
+                del self._queues[name]
+            self._running[name] += 1
+            self._total_running += 1
+
+            cpus: Tuple[int, ...] = ()
+            if self.pin_cpus:
+                cpus = tuple(self._free_cpus[: self.threads_per_job])
+                del self._free_cpus[: self.threads_per_job]
+
+            waited = time.monotonic() - start
+            self._waits.append(waited)
+            self._stats["jobs"] += 1
+            self._stats["queue_seconds"] += waited
+            if waited > 0.001:
+                self._stats["queued_jobs"] += 1
+            # 队首变了，唤醒其他等待者
+            self._cond.notify_all()
+        return Slot(name, self.threads_per_job, cpus, waited, started=time.monotonic())
+
+    def release(self, slot: Slot):
+        with self._cond:
+            self._running[slot.tenant] -= 1
+            if not self._running[slot.tenant]:
+                del self._running[slot.tenant]
+            self._total_running -= 1
+            self._usage[slot.tenant] += (time.monotonic() - slot.started) * slot.threads
+            if len(self._usage) > MAX_TENANTS:
+                for name in [name for name in self._usage if not self._active(name)]:
+                    del self._usage[name]
+            self._free_cpus.extend(slot.cpus)
+            self._cond.notify_all()
+
+    @contextlib.contextmanager
+    def slot(self, name: Optional[str] = None) -> Iterator[Slot]:
+        slot = self.acquire(name)
+        try:
+            yield slot
+        finally:
+            self.release(slot)
+
+    def stats(self) -> Dict:
+        """调度统计（排队时间单位为秒）"""
+        with self._cond:
+            waits = sorted(self._waits)
+
+            def percentile(q: float) -> float:
+                return waits[min(int(len(waits) * q), len(waits) - 1)] if waits else 0.0
+
+            return {
+                **self._stats,
+                "max_concurrency": self.max_concurrency,
+                "threads_per_job": self.threads_per_job,
+                "pinned": self.pin_cpus,
+                "running": self._total_running,
+                "queued": sum(len(queue) for queue in self._queues.values()),
+                "queue_p50": percentile(0.5),
+                "queue_p95": percentile(0.95),
+                "queue_max": waits[-1] if waits else 0.0,
+                "tenants": {
+                    name: {
+                        "running": self._running.get(name, 0),
+                        "queued": len(self._queues.get(name, ())),
+                        "cpu_seconds": round(usage, 3),
+                    }
+                    for name, usage in self._usage.items()
+                },
+            }
+
+
+_scheduler: Optional[SandboxScheduler] = None
+_scheduler_lock = threading.Lock()
+
+
+def get_sandbox_scheduler() -> SandboxScheduler:
+    """进程内共享的沙箱调度器"""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = SandboxScheduler()
+        return _scheduler
@@ -0,0 +1,191 @@
+"""
+沙箱内的分块数据集接口
+
+数据文件超出内存预算时，生成代码改用 ChunkedFrame 按块流式处理，
+常见聚合（分组聚合、计数、描述统计）在有界内存内完成：
+
+    from chunked_frame import ChunkedFrame
+
+    cf = ChunkedFrame('./data.csv')
+    print(cf.groupby_agg('商品类型', {'销售金额': 'sum', '零售价': 'mean'}))
+"""
+
+import os
+from typing import Callable, Dict, Iterator, List, Optional
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_CHUNKSIZE = int(os.getenv("SANDBOX_CHUNKSIZE", "200000"))
+
+# 可以按块合并的聚合方式
+_MERGEABLE_AGGS = {"sum", "count", "min", "max", "mean", "size"}
+
+
+class ChunkedFrame:
+    """按块读取的大数据集，只在需要时把当前块载入内存"""
+
+    def __init__(
+        self,
+        path: str,
+        chunksize: int = DEFAULT_CHUNKSIZE,
+        usecols: Optional[List[str]] = None,
+        **read_kwargs,
+    ):
+        self.path = path
+        self.chunksize = chunksize
+        self.usecols = usecols
+        self.read_kwargs = read_kwargs
+
+    def chunks(self, usecols: Optional[List[str]] = None) -> Iterator[pd.DataFrame]:
+        """逐块产出 DataFrame"""
+        usecols = usecols or self.usecols
+        if self.path.endswith(".parquet"):
+            import pyarrow.parquet as pq
+
+            parquet = pq.ParquetFile(self.path)
+            for batch in parquet.iter_batches(batch_size=self.chunksize, columns=usecols):
+                yield batch.to_pandas()
+            return
+
+        yield from pd.read_csv(
+            self.path, chunksize=self.chunksize, usecols=usecols, **self.read_kwargs
+        )
+
+    @property
+    def columns(self) -> List[str]:
+        return list(self.head(0).columns)
+
+    def head(self, n: int = 5) -> pd.DataFrame:
+        if self.path.endswith(".parquet"):
+            return next(self.chunks()).head(n)
+        return pd.read_csv(self.path, nrows=n, usecols=self.usecols, **self.read_kwargs)
+
+    def __len__(self) -> int:
+        first_column = self.columns[:1]
+        return sum(len(chunk) for chunk in self.chunks(usecols=first_column))
+
+    @property
+    def shape(self):
+        return (len(self), len(self.columns))
+
+    def map_reduce(
+        self,
+        map_func: Callable[[pd.DataFrame], object],
+        reduce_func: Callable[[list], object] = pd.concat,
+        usecols: Optional[List[str]] = None,
+    ):
+        """
+        通用的分块计算：对每块执行 map_func，再用 reduce_func 合并所有块的结果
+
+        map_func 的结果应远小于数据块本身（例如过滤后的少量行、部分聚合结果）。
+        """
+        return reduce_func([map_func(chunk) for chunk in self.chunks(usecols=usecols)])
+
+    def groupby_agg(self, by, agg: Dict[str, str]) -> pd.DataFrame:
+        """
+        分块分组聚合，支持 sum / count / size / min / max / mean
+
+        Args:
+            by: 分组列（列名或列名列表）
+            agg: {列名: 聚合方式}
+
+        Returns:
+            与 df.groupby(by).agg(agg) 相同形状的结果
+        """
+        unsupported = set(agg.values()) - _MERGEABLE_AGGS
+        if unsupported:
+            raise ValueError(
+                f"分块模式不支持聚合方式 {sorted(unsupported)}，"
+                f"只支持 {sorted(_MERGEABLE_AGGS)}"
+            )
+
+        keys = [by] if isinstance(by, str) else list(by)
+        usecols = list(dict.fromkeys([*keys, *agg]))
+
+        # 每块先做部分聚合：mean 拆成 sum + count，其他方式可直接合并
+        partial_spec = {}
+        for column, how in agg.items():
+            for part in (("sum", "count") if how == "mean" else (how,)):
+                partial_spec[f"{column}__{part}"] = (column, part)
+
+        partials = [
+            chunk.groupby(keys, dropna=False).agg(**partial_spec)
+            for chunk in self.chunks(usecols=usecols)
+        ]
+        if not partials:
+            return pd.DataFrame(columns=list(agg))
+
+        merge_how = {
+            name: ("sum" if part in ("count", "size") else part)
+            for name, (_, part) in partial_spec.items()
+        }
+        merged = pd.concat(partials).groupby(level=keys, dropna=False).agg(merge_how)
+
+        result = pd.DataFrame(index=merged.index)
+        for column, how in agg.items():
+            if how == "mean":
+                result[column] = merged[f"{column}__sum"] / merged[f"{column}__count"]
+            else:
+                result[column] = merged[f"{column}__{how}"]
+        return result
+
+    def value_counts(self, column: str, top: Optional[int] = None) -> pd.Series:
+        """分块计数，返回按次数降序排列的结果"""
+        counts = pd.Series(dtype="int64")
+        for chunk in self.chunks(usecols=[column]):
+            counts = counts.add(chunk[column].value_counts(dropna=False), fill_value=0)
+        counts = counts.astype("int64").sort_values(ascending=False)
+        counts.name = "count"
+        return counts.head(top) if top else counts
+
+    def profile(self, **kwargs) -> dict:
+        """
+        单遍画像：计数、空值、min/max/mean/var、近似分位数、分类 top-k 与相关系数一次扫描完成
+
+        见 profiler.py，kwargs 传给 Profiler（top_k）。
+        """
+        from profiler import profile_chunks
+
+        return profile_chunks(self.chunks(), **kwargs)
+
+    def describe(self) -> pd.DataFrame:
+        """
+        数值列的描述统计（count / mean / std / min / max），一次扫描完成
+
+        按块计算均值与二阶中心矩，再用并行合并公式合并，避免大数相减的精度问题。
+        分位数需要完整数据，这里不提供。
+        """
+        stats: Dict[str, Dict[str, float]] = {}
+        for chunk in self.chunks():
+            for column in chunk.select_dtypes(include="number").columns:
+                values = chunk[column].dropna().to_numpy(dtype="float64")
+                if values.size == 0:
+                    continue
+                n_b, mean_b = values.size, values.mean()
+                m2_b = ((values - mean_b) ** 2).sum()
+                s = stats.setdefault(
+                    column,
+                    {"count": 0, "mean": 0.0, "m2": 0.0, "min": np.inf, "max": -np.inf},
+                )
+                n_a = s["count"]
+                n = n_a + n_b
+                delta = mean_b - s["mean"]
+                s["mean"] += delta * n_b / n
+                s["m2"] += m2_b + delta**2 * n_a * n_b / n
+                s["count"] = n
+                s["min"] = min(s["min"], values.min())
+                s["max"] = max(s["max"], values.max())
+
+        return pd.DataFrame(
+            {
+                column: {
+                    "count": s["count"],
+                    "mean": s["mean"],
+                    "std": np.sqrt(s["m2"] / (s["count"] - 1)) if s["count"] > 1 else np.nan,
+                    "min": s["min"],
+                    "max": s["max"],
+                }
+                for column, s in stats.items()
+            }
+        )
@@ -0,0 +1,506 @@
+"""
+沙箱内的单遍数据集画像
+
+describe()、isnull().sum()、corr()、value_counts() 各自要扫描一遍数据，
+这里在一次扫描中同时计算：
+- 行数、每列的非空数 / 空值数
+- 数值列的 min / max / mean / var（并行合并公式）与近似分位数（t-digest）
+- 每列的近似不同取值个数（HyperLogLog）、分类列的 top-k 取值（SpaceSaving）
+- 数值列两两之间的相关系数（成对去除空值，与 DataFrame.corr() 一致）
+
+全部基于 NumPy 数组的向量化计算，支持分块输入，内存与行数、取值个数无关。
+块与块（以及不同进程）的结果可以合并，Profiler.to_dict() 保存的状态可以随画像持久化，
+文件追加数据后只需处理新增部分再合并（profile_append，摘要见 sketches.py）：
+
+    from profiler import profile_file
+
+    summary = profile_file('./data.csv')
+    print(summary['columns']['销售金额'])
+"""
+
+import json
+import os
+import warnings
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Union
+
+import numpy as np
+import pandas as pd
+
+from sketches import HyperLogLog, SpaceSaving, TDigest
+
+DEFAULT_CHUNKSIZE = int(os.getenv("SANDBOX_CHUNKSIZE", "200000"))
+
+# t-digest 压缩参数，越大质心越多、分位数越准
+TDIGEST_COMPRESSION = 200
+
+# HyperLogLog 精度，2^precision 个寄存器
+HLL_PRECISION = 14
+
+# SpaceSaving 保留的取值个数
+HEAVY_HITTERS_CAPACITY = 1024
+
+# 输出的分位点
+QUANTILES = (0.05, 0.25, 0.5, 0.75, 0.95)
+
+# 分类列输出的高频取值个数
+TOP_K = 10
+
+Chunk = Union[pd.DataFrame, Mapping[str, np.ndarray]]
+
+
+def _float(value) -> Optional[float]:
+    """转成可 JSON 序列化的 float，NaN / inf 转成 None"""
+    value = float(value)
+    return value if np.isfinite(value) else None
+
+
+class NumericStats:
+    """数值列的单遍统计：矩用并行合并公式，分位数与不同取值个数用固定大小的摘要"""
+
+    def __init__(self, compression: float = TDIGEST_COMPRESSION, precision: int = HLL_PRECISION):
+        self.count = 0
+        self.nulls = 0
+        self.min = np.inf
+        self.max = -np.inf
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.digest = TDigest(compression)
+        self.distinct = HyperLogLog(precision)
+
+    def update(self, values: np.ndarray):
+        """加入一块数据（float64，空值为 NaN）"""
+        present = ~np.isnan(values)
+        x = values[present]
+        self.nulls += values.size - x.size
+        if x.size == 0:
+            return
+        self._merge_moments(x.size, x.min(), x.max(), x.mean(), ((x - x.mean()) ** 2).sum())
+        self.digest.update(x)
+        self.distinct.update(x)
+
+    def merge(self, other: "NumericStats"):
+        """合并另一部分数据的统计"""
+        self.nulls += other.nulls
+        if other.count:
+            self._merge_moments(other.count, other.min, other.max, other.mean, other.m2)
+            self.digest.merge(other.digest)
+            self.distinct.merge(other.distinct)
+
+    def _merge_moments(self, n_b: int, min_b: float, max_b: float, mean_b: float, m2_b: float):
+        n_a = self.count
+        n = n_a + n_b
+        delta = mean_b - self.mean
+        self.mean += delta * n_b / n
+        self.m2 += m2_b + delta**2 * n_a * n_b / n
+        self.count = n
+        self.min = min(self.min, min_b)
+        self.max = max(self.max, max_b)
+
+    def result(self) -> Dict[str, Any]:
+        result = {
+            "type": "numeric",
+            "count": self.count,
+            "nulls": self.nulls,
+            "distinct": self.distinct.estimate(),
+            "min": _float(self.min) if self.count else None,
+            "max": _float(self.max) if self.count else None,
+            "mean": _float(self.mean) if self.count else None,
+            "var": _float(self.m2 / (self.count - 1)) if self.count > 1 else None,
+        }
+        if self.count:
+            result["quantiles"] = {
+                str(q): _float(v) for q, v in zip(QUANTILES, self.digest.quantile(QUANTILES))
+            }
+        return result
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "type": "numeric",
+            "count": self.count,
+            "nulls": self.nulls,
+            "min": _float(self.min),
+            "max": _float(self.max),
+            "mean": self.mean,
+            "m2": self.m2,
+            "digest": self.digest.to_dict(),
+            "distinct": self.distinct.to_dict(),
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "NumericStats":
+        stats = cls()
+        stats.count, stats.nulls = data["count"], data["nulls"]
+        stats.min = data["min"] if data["min"] is not None else np.inf
+        stats.max = data["max"] if data["max"] is not None else -np.inf
+        stats.mean, stats.m2 = data["mean"], data["m2"]
+        stats.digest = TDigest.from_dict(data["digest"])
+        stats.distinct = HyperLogLog.from_dict(data["distinct"])
+        return stats
+
+
+class CategoricalStats:
+    """
+    分类列的单遍统计
+
+    不同取值个数用 HyperLogLog、高频取值用 SpaceSaving，内存与取值个数无关，
+    百万级不同取值的列（例如商品名称）也不需要精确的 value_counts()。
+    """
+
+    def __init__(
+        self,
+        top_k: int = TOP_K,
+        capacity: int = HEAVY_HITTERS_CAPACITY,
+        precision: int = HLL_PRECISION,
+    ):
+        self.count = 0
+        self.nulls = 0
+        self.top_k = top_k
+        self.heavy_hitters = SpaceSaving(capacity)
+        self.distinct = HyperLogLog(precision)
+
+    def update(self, values):
+        """加入一块数据（数组或 Series，空值为 None / NaN）"""
+        # 块内哈希分组一次（空值编码为 -1）：计数交给 SpaceSaving，只有不同的取值需要进 HyperLogLog
+        codes, uniques = pd.factorize(values)
+        counts = np.bincount(codes[codes >= 0], minlength=len(uniques))
+        present = int(counts.sum())
+        self.nulls += len(codes) - present
+        self.count += present
+        if present:
+            self.heavy_hitters.update_counts(uniques, counts)
+            self.distinct.update(np.asarray(uniques).astype(str))
+
+    def merge(self, other: "CategoricalStats"):
+        """合并另一部分数据的统计"""
+        self.count += other.count
+        self.nulls += other.nulls
+        self.heavy_hitters.merge(other.heavy_hitters)
+        self.distinct.merge(other.distinct)
+
+    def result(self) -> Dict[str, Any]:
+        top = []
+        for value, n, error in self.heavy_hitters.top(self.top_k):
+            item = {"value": value, "count": n}
+            if error:
+                item["error"] = error  # 计数可能多算的上限
+            top.append(item)
+        return {
+            "type": "categorical",
+            "count": self.count,
+            "nulls": self.nulls,
+            "distinct": self.distinct.estimate(),
+            "top": top,
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "type": "categorical",
+            "count": self.count,
+            "nulls": self.nulls,
+            "top_k": self.top_k,
+            "heavy_hitters": self.heavy_hitters.to_dict(),
+            "distinct": self.distinct.to_dict(),
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "CategoricalStats":
+        stats = cls(data["top_k"])
+        stats.count, stats.nulls = data["count"], data["nulls"]
+        stats.heavy_hitters = SpaceSaving.from_dict(data["heavy_hitters"])
+        stats.distinct = HyperLogLog.from_dict(data["distinct"])
+        return stats
+
+
+class CorrelationStats:
+    """
+    数值列之间的相关系数，成对去除空值
+
+    对每对列累计共同非空的行数、和、平方和与乘积和（矩阵乘法一次算出所有列对），
+    累计前先减去第一块开头若干行的均值，避免大数相减的精度损失。
+    """
+
+    def __init__(self, columns: List[str]):
+        self.columns = columns
+        k = len(columns)
+        self.shift: Optional[np.ndarray] = None
+        self.n = np.zeros((k, k))
+        self.sx = np.zeros((k, k))  # sx[i, j]: 列 i、j 均非空的行上列 i 的和
+        self.sxx = np.zeros((k, k))
+        self.sxy = np.zeros((k, k))
+
+    def update(self, matrix: np.ndarray):
+        """加入一块数据（行 × 列的 float64 矩阵，空值为 NaN）"""
+        if self.shift is None:
+            with np.errstate(invalid="ignore"), warnings.catch_warnings():
+                warnings.simplefilter("ignore", RuntimeWarning)  # 全空的列
+                self.shift = np.nan_to_num(np.nanmean(matrix[:1024], axis=0))
+        x = matrix - self.shift
+        present = ~np.isnan(x)
+        x = np.where(present, x, 0.0)
+        mask = present.astype(np.float64)
+        self.n += mask.T @ mask
+        self.sx += x.T @ mask
+        self.sxx += (x * x).T @ mask
+        self.sxy += x.T @ x
+
+    def _shift_to(self, shift: np.ndarray):
+        """把累计量换算到新的平移量下"""
+        d = (self.shift - shift)[:, None]
+        self.sxy += d.T * self.sx + d * self.sx.T + d * d.T * self.n
+        self.sxx += 2 * d * self.sx + d * d * self.n
+        self.sx += d * self.n
+        self.shift = shift
+
+    def merge(self, other: "CorrelationStats"):
+        """合并另一部分数据的统计"""
+        if other.shift is None:
+            return
+        if self.shift is None:
+            self.shift = other.shift.copy()
+        elif not np.array_equal(self.shift, other.shift):
+            other_sums = CorrelationStats(other.columns)
+            other_sums.shift = other.shift.copy()
+            for name in ("n", "sx", "sxx", "sxy"):
+                setattr(other_sums, name, getattr(other, name).copy())
+            other_sums._shift_to(self.shift)
+            other = other_sums
+        self.n += other.n
+        self.sx += other.sx
+        self.sxx += other.sxx
+        self.sxy += other.sxy
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "columns": self.columns,
+            "shift": None if self.shift is None else self.shift.tolist(),
+            **{name: getattr(self, name).tolist() for name in ("n", "sx", "sxx", "sxy")},
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "CorrelationStats":
+        stats = cls(data["columns"])
+        if data["shift"] is not None:
+            stats.shift = np.array(data["shift"], dtype=np.float64)
+        k = len(stats.columns)
+        for name in ("n", "sx", "sxx", "sxy"):
+            setattr(stats, name, np.array(data[name], dtype=np.float64).reshape(k, k))
+        return stats
+
+    def result(self) -> Dict[str, Dict[str, Optional[float]]]:
+        with np.errstate(invalid="ignore", divide="ignore"):
+            cov = self.n * self.sxy - self.sx * self.sx.T
+            var = self.n * self.sxx - self.sx**2
+            corr = cov / np.sqrt(var * var.T)
+        corr[self.n < 2] = np.nan
+        return {
+            a: {b: _float(np.clip(corr[i, j], -1, 1)) for j, b in enumerate(self.columns)}
+            for i, a in enumerate(self.columns)
+        }
+
+
+class Profiler:
+    """
+    单遍数据集画像
+
+    第一块数据决定每列的类型（整数 / 浮点为数值列，其余为分类列）；
+    后续块中数值列出现无法解析的值时按空值处理。
+    """
+
+    def __init__(self, top_k: int = TOP_K):
+        self.top_k = top_k
+        self.rows = 0
+        self.columns: Dict[str, Union[NumericStats, CategoricalStats]] = {}
+        self.numeric: List[str] = []
+        self.correlation: Optional[CorrelationStats] = None
+
+    def _init_columns(self, is_numeric: Dict[str, bool]):
+        for name, numeric in is_numeric.items():
+            if numeric:
+                self.columns[name] = NumericStats()
+                self.numeric.append(name)
+            else:
+                self.columns[name] = CategoricalStats(self.top_k)
+        self.correlation = CorrelationStats(self.numeric)
+
+    def update(self, chunk: Chunk):
+        """加入一块数据（DataFrame 或 {列名: 数组}）"""
+        if self.correlation is None:
+            self._init_columns({name: _is_numeric(chunk[name]) for name in chunk})
+
+        # 数值列拼成一个矩阵：各列统计取矩阵的列视图，相关系数直接用整个矩阵
+        numeric = [_as_float(chunk[name]) for name in self.numeric]
+        self.rows += _num_rows(chunk)
+
+        if numeric:
+            matrix = np.column_stack(numeric)
+            for j, name in enumerate(self.numeric):
+                self.columns[name].update(matrix[:, j])
+            self.correlation.update(matrix)
+
+        for name, stats in self.columns.items():
+            if isinstance(stats, CategoricalStats):
+                stats.update(chunk[name])
+
+    def merge(self, other: "Profiler"):
+        """合并另一部分数据（例如另一个进程处理的块）的画像，列必须一致"""
+        if other.correlation is None:
+            return
+        if self.correlation is None:
+            self._init_columns(
+                {name: isinstance(stats, NumericStats) for name, stats in other.columns.items()}
+            )
+        self.rows += other.rows
+        for name, stats in self.columns.items():
+            stats.merge(other.columns[name])
+        self.correlation.merge(other.correlation)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """全部统计与摘要的状态（可 JSON 序列化），用于持久化后继续合并新数据"""
+        return {
+            "rows": self.rows,
+            "top_k": self.top_k,
+            "columns": {name: stats.to_dict() for name, stats in self.columns.items()},
+            "correlation": self.correlation.to_dict() if self.correlation else None,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Profiler":
+        """从 to_dict() 的状态恢复"""
+        profiler = cls(data["top_k"])
+        profiler.rows = data["rows"]
+        for name, stats in data["columns"].items():
+            if stats["type"] == "numeric":
+                profiler.columns[name] = NumericStats.from_dict(stats)
+                profiler.numeric.append(name)
+            else:
+                profiler.columns[name] = CategoricalStats.from_dict(stats)
+        if data["correlation"] is not None:
+            profiler.correlation = CorrelationStats.from_dict(data["correlation"])
+        return profiler
+
+    def result(self) -> Dict[str, Any]:
+        """画像结果（可 JSON 序列化）"""
+        return {
+            "rows": self.rows,
+            "columns": {name: stats.result() for name, stats in self.columns.items()},
+            "correlation": self.correlation.result() if self.correlation else {},
+        }
+
+
+def _is_numeric(values) -> bool:
+    dtype = values.dtype if hasattr(values, "dtype") else np.asarray(values).dtype
+    return pd.api.types.is_numeric_dtype(dtype) and not pd.api.types.is_bool_dtype(dtype)
+
+
+def _as_float(values) -> np.ndarray:
+    """转成 float64 数组，空值和无法解析的值为 NaN"""
+    array = np.asarray(values)
+    if array.dtype.kind in "iuf":
+        return array.astype(np.float64, copy=False)
+    return pd.to_numeric(pd.Series(array), errors="coerce").to_numpy(np.float64, na_value=np.nan)
+
+
+def _num_rows(chunk: Chunk) -> int:
+    if isinstance(chunk, pd.DataFrame):
+        return len(chunk)
+    return len(next(iter(chunk.values()), ()))
+
+
+def profile_chunks(chunks: Iterable[Chunk], **kwargs) -> Dict[str, Any]:
+    """
+    对分块数据做单遍画像
+
+    Args:
+        chunks: DataFrame 或 {列名: 数组} 的可迭代对象
+        **kwargs: 传给 Profiler 的参数（top_k）
+
+    Returns:
+        画像结果
+    """
+    profiler = Profiler(**kwargs)
+    for chunk in chunks:
+        profiler.update(chunk)
+    return profiler.result()
+
+
+def profile_frame(df: pd.DataFrame, **kwargs) -> Dict[str, Any]:
+    """对已加载的 DataFrame 做单遍画像"""
+    return profile_chunks([df], **kwargs)
+
+
+def read_chunks(path: str, chunksize: int = DEFAULT_CHUNKSIZE) -> Iterable[pd.DataFrame]:
+    """按块读取数据文件（csv / tsv / parquet / xlsx）"""
+    if path.endswith((".xlsx", ".xls")):
+        yield pd.read_excel(path)
+        return
+
+    from chunked_frame import ChunkedFrame
+
+    read_kwargs = {"sep": "\t"} if path.endswith(".tsv") else {}
+    yield from ChunkedFrame(path, chunksize=chunksize, **read_kwargs).chunks()
+
+
+def profile_file(
+    path: str,
+    chunksize: int = DEFAULT_CHUNKSIZE,
+    state_path: Optional[str] = None,
+    **kwargs,
+) -> Dict[str, Any]:
+    """
+    按块读取数据文件并做单遍画像，内存占用与块大小相关、与文件大小无关
+
+    Args:
+        path: 数据文件路径（csv / tsv / parquet / xlsx）
+        chunksize: 每块行数
+        state_path: 指定时把 Profiler 状态（含各列摘要）写入该 JSON 文件
+        **kwargs: 传给 Profiler 的参数
+
+    Returns:
+        画像结果
+    """
+    profiler = Profiler(**kwargs)
+    for chunk in read_chunks(path, chunksize):
+        profiler.update(chunk)
+    if state_path:
+        with open(state_path, "w", encoding="utf-8") as f:
+            json.dump(profiler.to_dict(), f, ensure_ascii=False)
+    return profiler.result()
+
+
+def profile_append(
+    path: str,
+    offset: int,
+    state_path: str,
+    new_state_path: str,
+    chunksize: int = DEFAULT_CHUNKSIZE,
+) -> Dict[str, Any]:
+    """
+    文件追加数据后增量更新画像：恢复旧状态，只读取 offset 之后新增的行，合并后写出新状态
+
+    Args:
+        path: csv / tsv 数据文件路径
+        offset: 旧版本文件的字节数（新增部分从这里开始，位于行首）
+        state_path: 旧版本的 Profiler 状态
+        new_state_path: 新版本状态的写入路径
+        chunksize: 每块行数
+
+    Returns:
+        新版本的画像结果
+    """
+    with open(state_path, encoding="utf-8") as f:
+        profiler = Profiler.from_dict(json.load(f))
+
+    sep = "\t" if path.endswith(".tsv") else ","
+    with open(path, "rb") as f:
+        f.seek(offset)
+        try:
+            for chunk in pd.read_csv(
+                f, header=None, names=list(profiler.columns), sep=sep, chunksize=chunksize
+            ):
+                profiler.update(chunk)
+        except pd.errors.EmptyDataError:
+            pass  # 只追加了空行
+
+    with open(new_state_path, "w", encoding="utf-8") as f:
+        json.dump(profiler.to_dict(), f, ensure_ascii=False)
+    return profiler.result()
@@ -0,0 +1,201 @@
+"""
+沙箱内的抽样预估工具
+
+抽样预估模式下，同一段生成代码会先在分层样本上运行、再在全量数据上运行。
+执行环境通过 SAMPLE_FRACTION 环境变量告知当前的抽样比例（全量运行时为 1），
+通过 SAMPLE_DESIGN 给出抽样设计（样本每行所属的层、各层总体行数）。
+生成代码用这里的函数输出估计值与 95% 置信区间，全量运行时自动退化为精确值：
+
+    from sampling import estimate_total, mean_with_ci
+
+    total, margin = estimate_total(df['销售金额'])
+    print(f"销售总额: {total:,.0f} ± {margin:,.0f}")
+
+分层样本中每层至少保留一行，小层被超额抽样，各层的行按 N_h / n_h 加权。
+传入的是从样本 DataFrame 中取出（可以先筛选、排序）的 Series / DataFrame 时，
+按行索引对应到所属的层做分层估计；索引对不上样本行号（如 reset_index、groupby 之后）
+或传入普通序列时，退化为按 SAMPLE_FRACTION 的简单随机抽样估计。
+"""
+
+import functools
+import json
+import math
+import os
+from typing import Optional, Tuple
+
+import numpy as np
+
+SAMPLE_FRACTION = float(os.getenv("SAMPLE_FRACTION", "1"))
+SAMPLE_DESIGN = os.getenv("SAMPLE_DESIGN", "")
+
+# 95% 置信水平对应的 z 值
+Z_95 = 1.96
+
+
+def is_sample() -> bool:
+    """当前是否在抽样数据上运行"""
+    return SAMPLE_FRACTION < 1
+
+
+@functools.lru_cache(maxsize=None)
+def _design() -> Optional[Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+    """(样本每行所属的层, 各层总体行数 N_h, 各层样本行数 n_h)；非抽样运行或没有抽样设计时为 None"""
+    if not is_sample() or not SAMPLE_DESIGN:
+        return None
+    with open(SAMPLE_DESIGN, encoding="utf-8") as f:
+        design = json.load(f)
+    stratum = np.asarray(design["stratum"], dtype=np.int64)
+    population = np.asarray(design["population"], dtype=float)
+    sampled = np.bincount(stratum, minlength=len(population)).astype(float)
+    return stratum, population, sampled
+
+
+def _rows(values) -> Optional[np.ndarray]:
+    """values 各元素对应的样本行号；无法对应到样本行时返回 None"""
+    design = _design()
+    index = getattr(values, "index", None)
+    if design is None or index is None:
+        return None
+    rows = np.asarray(index)
+    if rows.dtype.kind not in "iu":
+        return None
+    if len(rows) and (rows.min() < 0 or rows.max() >= len(design[0])):
+        return None
+    if len(np.unique(rows)) != len(rows):
+        return None
+    return rows
+
+
+def _stratified_total(rows: np.ndarray, y: np.ndarray) -> Tuple[float, float]:
+    """
+    分层估计 Σy 及其方差
+
+    y 只给出 rows 这些样本行上的取值，同层其余样本行按 0 计（子总体估计）。
+    """
+    stratum, population, sampled = _design()
+    strata = stratum[rows]
+    sums = np.bincount(strata, weights=y, minlength=len(population))
+    squares = np.bincount(strata, weights=y * y, minlength=len(population))
+    n = np.maximum(sampled, 1)
+    total = float((population / n * sums).sum())
+    # 各层样本方差（只有一行的层无法估计方差，按 0 计）
+    variance_h = np.where(
+        sampled > 1, (squares - sums**2 / n) / np.maximum(sampled - 1, 1), 0.0
+    )
+    fpc = np.clip(1 - sampled / np.maximum(population, 1), 0.0, 1.0)
+    variance = float((population**2 * fpc * np.maximum(variance_h, 0.0) / n).sum())
+    return total, variance
+
+
+def _finite_population_correction() -> float:
+    return math.sqrt(max(0.0, 1 - SAMPLE_FRACTION))
+
+
+def _numeric(values) -> np.ndarray:
+    """转成 float 数组并去掉 NaN（pandas Series / numpy 数组不经 Python 对象逐个转换）"""
+    if not hasattr(values, "__len__"):
+        values = list(values)
+    array = np.asarray(values, dtype=float)
+    return array[~np.isnan(array)]
+
+
+def _numeric_rows(values) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+    """(去掉 NaN 的数值, 对应的样本行号)；无法对应到样本行时行号为 None"""
+    rows = _rows(values)
+    if rows is None:
+        return _numeric(values), None
+    array = np.asarray(values, dtype=float)
+    keep = ~np.isnan(array)
+    return array[keep], rows[keep]
+
+
+def estimate_count(count) -> Tuple[float, float]:
+    """
+    由样本估计全量行数
+
+    Args:
+        count: 样本中（筛选后）的行，传 DataFrame / Series 时按层加权；
+            传整数行数时按简单随机抽样估计
+
+    Returns:
+        (估计值, 95% 置信区间半宽)
+    """
+    rows = _rows(count)
+    if rows is not None:
+        total, variance = _stratified_total(rows, np.ones(len(rows)))
+        return total, Z_95 * math.sqrt(variance)
+    if hasattr(count, "__len__"):
+        count = len(count)
+    estimate = count / SAMPLE_FRACTION
+    margin = Z_95 * math.sqrt(count) / SAMPLE_FRACTION * _finite_population_correction()
+    return estimate, margin
+
+
+def estimate_total(values) -> Tuple[float, float]:
+    """
+    由样本估计全量总和（pandas Series 或数值序列）
+
+    Returns:
+        (估计值, 95% 置信区间半宽)
+    """
+    values, rows = _numeric_rows(values)
+    n = len(values)
+    if n == 0:
+        return 0.0, 0.0
+    if rows is not None:
+        total, variance = _stratified_total(rows, values)
+        return total, Z_95 * math.sqrt(variance)
+    total = float(values.sum()) / SAMPLE_FRACTION
+    if n < 2 or not is_sample():
+        return total, 0.0
+    variance = float(values.var(ddof=1))
+    population = n / SAMPLE_FRACTION
+    margin = Z_95 * population * math.sqrt(variance / n) * _finite_population_correction()
+    return total, margin
+
+
+def mean_with_ci(values) -> Tuple[float, float]:
+    """
+    均值估计及其 95% 置信区间半宽
+
+    分层时为加权均值 Σw·x / Σw，误差按线性化方法估计。
+
+    Returns:
+        (均值, 95% 置信区间半宽)，全量运行时半宽为 0
+    """
+    values, rows = _numeric_rows(values)
+    n = len(values)
+    if n == 0:
+        return float("nan"), 0.0
+    if rows is not None:
+        size, _ = _stratified_total(rows, np.ones(n))
+        total, _ = _stratified_total(rows, values)
+        mean = total / size
+        _, variance = _stratified_total(rows, (values - mean) / size)
+        return mean, Z_95 * math.sqrt(variance)
+    mean = float(values.mean())
+    if n < 2 or not is_sample():
+        return mean, 0.0
+    variance = float(values.var(ddof=1))
+    return mean, Z_95 * math.sqrt(variance / n) * _finite_population_correction()
+
+
+def proportion_with_ci(successes, n=None) -> Tuple[float, float]:
+    """
+    比例估计及其 95% 置信区间半宽
+
+    Args:
+        successes: 布尔 Series（例如 df['退货'] == '是'，按层加权），或满足条件的行数
+        n: 传行数时为总行数
+
+    Returns:
+        (比例, 95% 置信区间半宽)，全量运行时半宽为 0
+    """
+    if n is None:
+        return mean_with_ci(successes)
+    if n == 0:
+        return float("nan"), 0.0
+    p = successes / n
+    if not is_sample():
+        return p, 0.0
+    return p, Z_95 * math.sqrt(p * (1 - p) / n) * _finite_population_correction()
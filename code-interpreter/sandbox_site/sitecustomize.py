@@ -0,0 +1,112 @@
+"""
+沙箱子进程启动钩子
+
+sandbox.py 会把本目录加入子进程的 PYTHONPATH，Python 启动时自动导入本模块。
+这里不直接导入 matplotlib（避免拖慢不画图的脚本），而是在生成代码首次导入
+matplotlib.figure 时给 Figure.savefig 打补丁，按 PLOT_* 环境变量执行渲染策略：
+- 限制 DPI 与画布尺寸
+- 可选输出低清预览图（例如 WebP）
+- lazy 模式下只输出预览，并序列化 Figure 供宿主按需渲染原图
+
+另外按沙箱调度器分配的 SANDBOX_CPUS 绑核（见 sandbox_scheduler.py）。
+"""
+
+import importlib.abc
+import os
+import sys
+
+_RASTER_EXTS = {".png", ".jpg", ".jpeg", ".webp", ".tif", ".tiff"}
+
+
+def _policy():
+    return {
+        "max_dpi": int(os.getenv("PLOT_MAX_DPI", "120")),
+        "max_width": float(os.getenv("PLOT_MAX_WIDTH", "12")),
+        "max_height": float(os.getenv("PLOT_MAX_HEIGHT", "8")),
+        "render_mode": os.getenv("PLOT_RENDER_MODE", "eager"),
+        "preview_format": os.getenv("PLOT_PREVIEW_FORMAT", ""),
+        "preview_dpi": int(os.getenv("PLOT_PREVIEW_DPI", "60")),
+    }
+
+
+def _patch_figure(figure_cls):
+    original_savefig = figure_cls.savefig
+    policy = _policy()
+
+    def savefig(self, fname, *args, **kwargs):
+        # 只处理写入路径的栅格图，文件对象和矢量图保持原样
+        path = os.fspath(fname) if isinstance(fname, (str, os.PathLike)) else None
+        ext = os.path.splitext(path)[1].lower() if path else ""
+        if not path or ext not in _RASTER_EXTS:
+            return original_savefig(self, fname, *args, **kwargs)
+
+        # 限制画布尺寸（等比缩放）
+        width, height = self.get_size_inches()
+        scale = min(1.0, policy["max_width"] / width, policy["max_height"] / height)
+        if scale < 1.0:
+            self.set_size_inches(width * scale, height * scale)
+
+        # 限制 DPI
+        dpi = kwargs.get("dpi")
+        if not isinstance(dpi, (int, float)):
+            dpi = policy["max_dpi"]
+        kwargs["dpi"] = min(dpi, policy["max_dpi"])
+
+        if policy["preview_format"]:
+            preview_path = f"{os.path.splitext(path)[0]}.preview.{policy['preview_format']}"
+            preview_kwargs = {**kwargs, "dpi": policy["preview_dpi"], "format": None}
+            original_savefig(self, preview_path, *args, **preview_kwargs)
+
+        if policy["render_mode"] == "lazy" and policy["preview_format"]:
+            import pickle
+
+            try:
+                with open(path + ".fig.pickle", "wb") as f:
+                    pickle.dump({"figure": self, "kwargs": kwargs}, f)
+                return None
+            except Exception:
+                # 无法序列化时退回立即渲染
+                pass
+
+        return original_savefig(self, fname, *args, **kwargs)
+
+    figure_cls.savefig = savefig
+
+
+class _MatplotlibFigureHook(importlib.abc.MetaPathFinder):
+    """在 matplotlib.figure 加载完成后给 Figure.savefig 打补丁"""
+
+    def find_spec(self, fullname, path, target=None):
+        if fullname != "matplotlib.figure":
+            return None
+
+        sys.meta_path.remove(self)
+        import importlib.util
+
+        spec = importlib.util.find_spec(fullname)
+        if spec is None or spec.loader is None:
+            return spec
+
+        original_exec = spec.loader.exec_module
+
+        def exec_module(module):
+            original_exec(module)
+            _patch_figure(module.Figure)
+
+        spec.loader.exec_module = exec_module
+        return spec
+
+
+def _pin_cpus():
+    cpus = os.getenv("SANDBOX_CPUS")
+    if not cpus or not hasattr(os, "sched_setaffinity"):
+        return
+    try:
+        os.sched_setaffinity(0, {int(cpu) for cpu in cpus.split(",")})
+    except (OSError, ValueError):
+        pass
+
+
+_pin_cpus()
+os.environ.setdefault("MPLBACKEND", "Agg")
+sys.meta_path.insert(0, _MatplotlibFigureHook())
@@ -0,0 +1,242 @@
+"""
+可合并的数据摘要（sketch）
+
+千万行、百万个不同取值的列上，精确的 nunique / value_counts / quantile 需要把全部取值放进内存。
+这里的摘要大小固定（与行数、取值个数无关），按块向量化更新，块与块、文件的旧部分与新追加部分
+的摘要可以直接合并，也可以序列化后随画像一起持久化：
+- HyperLogLog: 不同取值个数，相对误差约 1.04 / sqrt(2^precision)
+- SpaceSaving: 高频取值（heavy hitters）及其计数上界与误差
+- TDigest: 分位数，两端（P1 / P99 等）精度更高
+
+    from sketches import HyperLogLog
+
+    hll = HyperLogLog()
+    hll.update(df['商品名称'].to_numpy())
+    print(hll.estimate())
+"""
+
+import base64
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+
+def hash_values(values: np.ndarray) -> np.ndarray:
+    """把任意 dtype 的数组哈希成 uint64（跨进程稳定）"""
+    return pd.util.hash_array(np.asarray(values), categorize=True)
+
+
+class HyperLogLog:
+    """基数估计"""
+
+    def __init__(self, precision: int = 14):
+        self.precision = precision
+        self.registers = np.zeros(1 << precision, dtype=np.uint8)
+
+    def update(self, values: np.ndarray):
+        """加入一块取值（不含空值）"""
+        if len(values):
+            self.update_hashes(hash_values(values))
+
+    def update_hashes(self, hashes: np.ndarray):
+        p = self.precision
+        index = (hashes >> np.uint64(64 - p)).astype(np.intp)
+        # 低 64 - p 位前导零的个数 + 1；低位不超过 53 位，转 float 后 frexp 取得的位数是精确的
+        rest = (hashes & np.uint64((1 << (64 - p)) - 1)).astype(np.float64)
+        rank = (64 - p) - np.frexp(rest)[1] + 1
+        np.maximum.at(self.registers, index, rank.astype(np.uint8))
+
+    def merge(self, other: "HyperLogLog"):
+        np.maximum(self.registers, other.registers, out=self.registers)
+
+    def estimate(self) -> int:
+        m = self.registers.size
+        alpha = 0.7213 / (1 + 1.079 / m)
+        raw = alpha * m * m / np.sum(np.ldexp(1.0, -self.registers.astype(np.int64)))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if raw <= 2.5 * m and zeros:
+            # 小基数时改用线性计数
+            return int(round(m * np.log(m / zeros)))
+        return int(round(raw))
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "precision": self.precision,
+            "registers": base64.b64encode(self.registers.tobytes()).decode("ascii"),
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "HyperLogLog":
+        sketch = cls(data["precision"])
+        sketch.registers = np.frombuffer(
+            base64.b64decode(data["registers"]), dtype=np.uint8
+        ).copy()
+        return sketch
+
+
+class SpaceSaving:
+    """
+    高频取值（可合并的 SpaceSaving）
+
+    最多保留 capacity 个取值。每个取值的计数是真实计数的上界，error 是可能多算的部分；
+    真实计数超过 总数 / capacity 的取值一定在其中。
+    """
+
+    def __init__(self, capacity: int = 1024):
+        self.capacity = capacity
+        self.keys = np.empty(0, dtype=object)
+        self.counts = np.empty(0, dtype=np.int64)
+        self.errors = np.empty(0, dtype=np.int64)
+
+    @property
+    def floor(self) -> int:
+        """未被保留的取值计数的上界"""
+        return int(self.counts.min()) if self.counts.size >= self.capacity else 0
+
+    def update(self, values: np.ndarray):
+        """加入一块取值（不含空值）：先在块内精确计数，再与已有摘要合并"""
+        if not len(values):
+            return
+        codes, uniques = pd.factorize(values)
+        self.update_counts(uniques, np.bincount(codes, minlength=len(uniques)))
+
+    def update_counts(self, keys: np.ndarray, counts: np.ndarray):
+        """加入一块已经精确计数的取值（keys 互不相同）"""
+        chunk = SpaceSaving(self.capacity)
+        counts = np.asarray(counts, dtype=np.int64)
+        chunk._set(np.asarray(keys).astype(str).astype(object), counts, np.zeros_like(counts))
+        self.merge(chunk)
+
+    def merge(self, other: "SpaceSaving"):
+        """
+        合并两个摘要：一方缺少的取值按该方的 floor 计入，计数与误差分别相加后保留最大的 capacity 个
+        """
+        keys = np.concatenate([self.keys, other.keys])
+        if not keys.size:
+            return
+        codes, uniques = pd.factorize(keys)
+        n = len(uniques)
+        size_a = self.keys.size
+
+        def side(counts, errors, floor, part):
+            side_counts = np.full(n, floor, dtype=np.int64)
+            side_errors = np.full(n, floor, dtype=np.int64)
+            side_counts[part] = counts
+            side_errors[part] = errors
+            return side_counts, side_errors
+
+        counts_a, errors_a = side(self.counts, self.errors, self.floor, codes[:size_a])
+        counts_b, errors_b = side(other.counts, other.errors, other.floor, codes[size_a:])
+        self._set(np.asarray(uniques, dtype=object), counts_a + counts_b, errors_a + errors_b)
+
+    def _set(self, keys: np.ndarray, counts: np.ndarray, errors: np.ndarray):
+        if keys.size > self.capacity:
+            keep = np.argpartition(-counts, self.capacity)[: self.capacity]
+            keys, counts, errors = keys[keep], counts[keep], errors[keep]
+        self.keys, self.counts, self.errors = keys, counts, errors
+
+    def top(self, k: int) -> List[Tuple[str, int, int]]:
+        """计数最高的 k 个取值: [(取值, 计数上界, 误差)]"""
+        order = np.argsort(-self.counts, kind="stable")[:k]
+        return [
+            (self.keys[i], int(self.counts[i]), int(self.errors[i])) for i in order
+        ]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "capacity": self.capacity,
+            "keys": self.keys.tolist(),
+            "counts": self.counts.tolist(),
+            "errors": self.errors.tolist(),
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "SpaceSaving":
+        sketch = cls(data["capacity"])
+        sketch.keys = np.array(data["keys"], dtype=object)
+        sketch.counts = np.array(data["counts"], dtype=np.int64)
+        sketch.errors = np.array(data["errors"], dtype=np.int64)
+        return sketch
+
+
+class TDigest:
+    """
+    分位数估计（合并式 t-digest）
+
+    质心按 k1 尺度函数分组：每个质心覆盖的分位区间在 k 尺度上不超过 1，
+    两端的质心更小，所以极端分位数更准。分组在排序后的数组上一次算出。
+    """
+
+    def __init__(self, compression: float = 200):
+        self.compression = compression
+        self.means = np.empty(0)
+        self.weights = np.empty(0)
+        self.min = np.inf
+        self.max = -np.inf
+
+    def update(self, values: np.ndarray):
+        """加入一块取值（float64，不含 NaN）：先把这一块压缩成质心，再与已有质心合并"""
+        if not values.size:
+            return
+        chunk = TDigest(self.compression)
+        chunk.min, chunk.max = float(values.min()), float(values.max())
+        chunk._compress(np.sort(values), np.ones(values.size), presorted=True)
+        self.merge(chunk)
+
+    def merge(self, other: "TDigest"):
+        if not other.weights.size:
+            return
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self._compress(
+            np.concatenate([self.means, other.means]),
+            np.concatenate([self.weights, other.weights]),
+        )
+
+    def _compress(self, means: np.ndarray, weights: np.ndarray, presorted: bool = False):
+        if not presorted:
+            order = np.argsort(means, kind="stable")
+            means, weights = means[order], weights[order]
+        total = weights.sum()
+        # 每个点左侧的累计分位，映射到 k 尺度后取整作为所在质心
+        q = (np.cumsum(weights) - weights) / total
+        k = self.compression / (2 * np.pi) * np.arcsin(2 * q - 1)
+        group = np.floor(k - k[0]).astype(np.intp)
+        group_weights = np.bincount(group, weights=weights)
+        nonempty = group_weights > 0
+        group_sums = np.bincount(group, weights=means * weights)
+        self.means = group_sums[nonempty] / group_weights[nonempty]
+        self.weights = group_weights[nonempty]
+
+    @property
+    def count(self) -> float:
+        return float(self.weights.sum())
+
+    def quantile(self, q) -> np.ndarray:
+        """估计分位数，q 可以是标量或数组"""
+        if not self.weights.size:
+            return np.full(np.shape(q), np.nan)
+        total = self.weights.sum()
+        centers = np.cumsum(self.weights) - self.weights / 2
+        xp = np.concatenate([[0.0], centers, [total]])
+        fp = np.concatenate([[self.min], self.means, [self.max]])
+        return np.interp(np.asarray(q) * total, xp, fp)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "compression": self.compression,
+            "means": self.means.tolist(),
+            "weights": self.weights.tolist(),
+            "min": self.min if self.weights.size else None,
+            "max": self.max if self.weights.size else None,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "TDigest":
+        sketch = cls(data["compression"])
+        sketch.means = np.array(data["means"], dtype=np.float64)
+        sketch.weights = np.array(data["weights"], dtype=np.float64)
+        if sketch.weights.size:
+            sketch.min, sketch.max = data["min"], data["max"]
+        return sketch
@@ -0,0 +1,220 @@
+"""
+推测式并行代码生成
+
+串行的 generate_code → execute_code 重试循环里，每次失败都要多付出一轮 LLM 调用加一次执行。
+推测模式并发请求 N 份不同的候选代码（不同温度 / 不同的提示词补充要求），
+每份生成后立即预检并在独立子进程中执行，取第一个执行成功的结果，其余候选随即取消，
+从而降低容易出错的任务的尾延迟。
+
+每个候选在工作目录下各自的临时子目录中执行，输出的图表 / CSV 互不覆盖；
+只有胜出候选写出的文件会移回工作目录，被取消的候选留下的半成品随临时目录一起删除。
+"""
+
+import contextvars
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from langchain.messages import HumanMessage
+
+from offload import preflight_check
+from sandbox import spawn_python_code
+from utils import extract_python_code
+from workspace import is_staged_dataset
+
+# 默认候选数量
+SPECULATIVE_CANDIDATES = int(os.getenv("SPECULATIVE_CANDIDATES", "3"))
+
+# 候选之间的差异：温度与提示词补充要求轮流组合
+TEMPERATURES = [0.2, 0.7, 1.0]
+# 候选临时目录的前缀（以 . 开头，artifact_store 收集图表时不会进入）
+SCRATCH_PREFIX = ".speculative-"
+
+PROMPT_VARIANTS = [
+    "",
+    "\n**补充要求:** 使用最简单、最稳妥的写法，避免不常用的库和复杂操作。",
+    "\n**补充要求:** 先打印 df.columns，并在使用每一列之前检查该列是否存在。",
+]
+
+
+@dataclass
+class Candidate:
+    """一份候选代码及其执行结果"""
+
+    index: int
+    temperature: float
+    variant: str
+    code: str = ""
+    workdir: str = ""
+    preflight_errors: List[str] = field(default_factory=list)
+    returncode: Optional[int] = None
+    stdout: str = ""
+    stderr: str = ""
+
+    @property
+    def error(self) -> str:
+        if self.preflight_errors:
+            return "代码预检失败（未执行）:\n" + "\n".join(self.preflight_errors)
+        return self.stderr
+
+
+def _stage(workdir: Path, target: Path) -> Dict[Path, int]:
+    """
+    为候选准备独立目录，镜像工作目录中已有的文件
+
+    数据集（workspace 放进工作目录的只读副本或链接）用符号链接引用，不复制；
+    前几步写出的中间文件复制一份，候选写同名文件时不会改动工作目录里的原件。
+
+    Returns:
+        复制进来的文件（相对路径）→ mtime_ns，用于识别候选新写出或修改过的文件
+    """
+    copied = {}
+    for dirpath, dirnames, filenames in os.walk(workdir):
+        current = Path(dirpath)
+        if current == workdir:
+            dirnames[:] = [d for d in dirnames if not d.startswith(SCRATCH_PREFIX)]
+        relative = current.relative_to(workdir)
+        (target / relative).mkdir(parents=True, exist_ok=True)
+        for name in filenames:
+            source = current / name
+            dest = target / relative / name
+            try:
+                if is_staged_dataset(source):
+                    dest.symlink_to(source.resolve())
+                else:
+                    shutil.copy2(source, dest)
+                    copied[relative / name] = dest.stat().st_mtime_ns
+            except OSError:
+                continue
+    return copied
+
+
+def _promote(source: Path, workdir: Path, copied: Dict[Path, int]):
+    """把胜出候选新写出或修改过的文件移回工作目录"""
+    for dirpath, _, filenames in os.walk(source):
+        for name in filenames:
+            path = Path(dirpath) / name
+            relative = path.relative_to(source)
+            if path.is_symlink() or copied.get(relative) == path.stat().st_mtime_ns:
+                continue
+            dest = workdir / relative
+            dest.parent.mkdir(parents=True, exist_ok=True)
+            os.replace(path, dest)
+
+
+def speculative_execute(
+    messages: list,
+    model,
+    data_context: Any = None,
+    n: int = SPECULATIVE_CANDIDATES,
+    timeout: int = 10,
+    cwd: Optional[str] = None,
+) -> Tuple[Optional[Candidate], List[Candidate]]:
+    """
+    并发生成 N 份候选代码，返回第一个执行成功的候选
+
+    Args:
+        messages: 代码生成的消息列表（最后一条是用户消息）
+        model: 聊天模型，会按候选复制出不同温度的实例
+        data_context: 数据上下文，用于预检
+        n: 候选数量
+        timeout: 单个候选的执行超时时间（秒）
+        cwd: 会话工作目录；候选在其下各自的临时子目录中执行，胜出候选的输出移回这里
+
+    Returns:
+        (成功的候选或 None, 全部候选)
+    """
+    candidates = [
+        Candidate(
+            index=i,
+            temperature=TEMPERATURES[i % len(TEMPERATURES)],
+            variant=PROMPT_VARIANTS[i % len(PROMPT_VARIANTS)],
+        )
+        for i in range(n)
+    ]
+    workdir = Path(cwd or os.getcwd())
+    scratch = Path(tempfile.mkdtemp(prefix=SCRATCH_PREFIX, dir=workdir))
+    copied: Dict[int, Dict[Path, int]] = {}
+    for candidate in candidates:
+        candidate.workdir = str(scratch / str(candidate.index))
+        copied[candidate.index] = _stage(workdir, Path(candidate.workdir))
+
+    done = threading.Event()
+    lock = threading.Lock()
+    running: Dict[int, subprocess.Popen] = {}
+    winners: List[Candidate] = []
+
+    def attempt(candidate: Candidate):
+        try:
+            variant_messages = [
+                *messages[:-1],
+                HumanMessage(content=messages[-1].content + candidate.variant),
+            ]
+            llm = model.model_copy(update={"temperature": candidate.temperature})
+            raw_content = llm.invoke(variant_messages).content
+            candidate.code = extract_python_code(raw_content) or raw_content.strip()
+
+            candidate.preflight_errors = preflight_check(
+                candidate.code, data_context, cwd=candidate.workdir
+            )
+            if candidate.preflight_errors:
+                return
+
+            if done.is_set():
+                return
+            # 启动时可能要在沙箱调度器排队，不能持有锁
+            process = spawn_python_code(candidate.code, cwd=candidate.workdir)
+            with lock:
+                if done.is_set():
+                    process.kill()
+                    process.communicate()
+                    return
+                running[candidate.index] = process
+
+            try:
+                stdout, stderr = process.communicate(timeout=timeout)
+            except subprocess.TimeoutExpired:
+                process.kill()
+                stdout, stderr = process.communicate()
+                stderr += f"\nTimeoutExpired: 执行超过 {timeout} 秒"
+
+            candidate.returncode = process.returncode
+            candidate.stdout, candidate.stderr = stdout, stderr
+
+            with lock:
+                running.pop(candidate.index, None)
+                if process.returncode == 0 and not done.is_set():
+                    done.set()
+                    winners.append(candidate)
+                    # 取消其他仍在执行的候选
+                    for other in running.values():
+                        other.kill()
+        except Exception as e:
+            candidate.stderr = f"{type(e).__name__}: {e}"
+
+    executor = ThreadPoolExecutor(max_workers=n, thread_name_prefix="speculative")
+    # 复制上下文，候选的子进程与调用方记在同一个沙箱租户名下
+    pending = {
+        executor.submit(contextvars.copy_context().run, attempt, candidate)
+        for candidate in candidates
+    }
+    while pending and not done.is_set():
+        _, pending = wait(pending, return_when=FIRST_COMPLETED)
+
+    # 不等待仍在进行的 LLM 调用，它们返回后会发现已有结果而直接退出
+    executor.shutdown(wait=False, cancel_futures=True)
+    with lock:
+        winner = winners[0] if winners else None
+    try:
+        if winner is not None:
+            _promote(Path(winner.workdir), workdir, copied[winner.index])
+    finally:
+        # 落选候选的子进程已被终止；之后才返回的候选在已删除的目录里启动会直接失败
+        shutil.rmtree(scratch, ignore_errors=True)
+    return winner, candidates
@@ -0,0 +1,151 @@
+"""
+进程内 SQL 引擎
+
+大部分问题都是聚合查询（按商品类型汇总销售金额、Top-N、平均零售价等）。
+这类问题不必生成完整的 pandas 脚本再启动子进程：把数据集注册到进程内的
+DuckDB（基于列式缓存的 Parquet 视图），由 LLM 生成 SQL 直接查询即可，
+只读取用到的列，也不会把整个 DataFrame 物化到内存。
+
+查询在编排进程内执行，连接创建时即锁定：只能访问列式缓存目录下的文件，
+配置不可再修改。SQL 关键字检查只是第一道过滤，不是唯一的防线。
+"""
+
+import os
+import re
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from dataset_cache import DATASET_CACHE_DIR, ensure_columnar, get_profile
+
+# 只允许只读的单条查询
+_ALLOWED_START = re.compile(r"^\s*(select|with)\b", re.IGNORECASE)
+_FORBIDDEN = re.compile(
+    r"\b(attach|detach|copy|export|import|install|load|pragma|set|reset|call|"
+    r"create|insert|update|delete|drop|alter)\b|\b(read_\w+|\w+_scan|sniff_\w+|glob)\s*\("
+    r"|\b(from|join)\s+'",
+    re.IGNORECASE,
+)
+
+
+def _quote(identifier: str) -> str:
+    return '"' + identifier.replace('"', '""') + '"'
+
+
+def validate_sql(sql: str) -> Optional[str]:
+    """
+    检查 SQL 是否为只读的单条查询
+
+    Returns:
+        错误信息，合法时返回 None
+    """
+    if ";" in sql.strip().rstrip(";"):
+        return "只允许执行一条 SQL 语句"
+    if not _ALLOWED_START.match(sql):
+        return "只允许执行 SELECT / WITH 查询"
+    match = _FORBIDDEN.search(sql)
+    if match:
+        return f"SQL 中不允许使用 '{match.group(0)}'"
+    return None
+
+
+class SqlEngine:
+    """进程内 DuckDB 引擎，数据集以视图形式注册在列式缓存之上"""
+
+    def __init__(self):
+        import duckdb
+
+        self._con = duckdb.connect(":memory:")
+        # 关闭外部文件访问，只放行列式缓存目录（视图经 read_parquet 读取缓存），
+        # 再锁定配置，查询中的 SET 无法重新打开；
+        # 否则 FROM '/path/file.csv' 这类替换扫描可以读取任意文件
+        cache_dir = str(DATASET_CACHE_DIR.resolve()).replace("'", "''")
+        self._con.execute(f"SET allowed_directories=['{cache_dir}/']")
+        self._con.execute("SET enable_external_access=false")
+        self._con.execute("SET lock_configuration=true")
+        self._lock = threading.Lock()
+        # 文件绝对路径 -> (列式缓存路径, 表名)
+        self._tables: Dict[str, Tuple[str, str]] = {}
+
+    def register_dataset(self, file_path: str) -> str:
+        """
+        注册数据文件，返回可在 SQL 中使用的表名
+
+        文件发生变化时视图自动切换到新的列式缓存。
+        """
+        profile = get_profile(file_path)
+        if profile is None:
+            raise FileNotFoundError(f"文件 {file_path} 不存在")
+
+        columnar = str(ensure_columnar(profile))
+        with self._lock:
+            registered = self._tables.get(profile.path)
+            if registered and registered[0] == columnar:
+                return registered[1]
+
+            if registered:
+                table = registered[1]
+            else:
+                stem = os.path.splitext(os.path.basename(profile.path))[0]
+                taken = {name for _, name in self._tables.values()}
+                table, suffix = stem, 1
+                while table in taken:
+                    suffix += 1
+                    table = f"{stem}_{suffix}"
+
+            source = columnar.replace("'", "''")
+            self._con.execute(
+                f"CREATE OR REPLACE VIEW {_quote(table)} AS "
+                f"SELECT * FROM read_parquet('{source}')"
+            )
+            self._tables[profile.path] = (columnar, table)
+            return table
+
+    def schema(self, table: str) -> List[Tuple[str, str]]:
+        """返回表的 (列名, 类型) 列表"""
+        rows = self._con.cursor().execute(f"DESCRIBE {_quote(table)}").fetchall()
+        return [(row[0], row[1]) for row in rows]
+
+    def query(self, sql: str, max_rows: int = 50) -> str:
+        """
+        执行只读查询，返回 Markdown 表格形式的结果
+
+        Args:
+            sql: SELECT / WITH 查询
+            max_rows: 最多返回的行数
+
+        Returns:
+            查询结果文本
+        """
+        error = validate_sql(sql)
+        if error:
+            raise ValueError(error)
+
+        # 每次查询使用独立游标，支持多个会话并发查询
+        cursor = self._con.cursor()
+        cursor.execute(sql)
+        columns = [column[0] for column in cursor.description]
+        rows = cursor.fetchmany(max_rows + 1)
+        truncated = len(rows) > max_rows
+        rows = rows[:max_rows]
+
+        lines = [
+            "| " + " | ".join(columns) + " |",
+            "| " + " | ".join("---" for _ in columns) + " |",
+        ]
+        lines.extend("| " + " | ".join(str(v) for v in row) + " |" for row in rows)
+        if truncated:
+            lines.append(f"\n（结果超过 {max_rows} 行，仅显示前 {max_rows} 行）")
+        return "\n".join(lines)
+
+
+_engine: Optional[SqlEngine] = None
+_engine_lock = threading.Lock()
+
+
+def get_engine() -> SqlEngine:
+    """进程内共享的 SQL 引擎"""
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = SqlEngine()
+        return _engine
@@ -0,0 +1,192 @@
+"""
+结构化输出的流式解析
+
+`model.with_structured_output(Schema)` 要等完整的 JSON 生成完才返回结果。
+这里改为流式读取模型以工具调用形式输出的 JSON 参数，边接收边增量解析：
+- 顶层字符串字段（例如 Replan.final_response）每解码出一段文本就立即回调，
+  客户端无需等整个结构化结果生成完就能看到最终回复
+- 顶层字符串数组（例如 Plan.steps）每个元素的字符串一闭合就立即回调，
+  调用方可以在后续步骤仍在生成时就开始执行第一步
+"""
+
+import json
+from typing import TYPE_CHECKING, Any, Callable, List, Optional, Type, TypeVar, Union
+
+if TYPE_CHECKING:
+    from pydantic import BaseModel
+
+T = TypeVar("T", bound="BaseModel")
+
+_ESCAPES = {'"': '"', "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+
+
+class IncrementalJsonParser:
+    """
+    逐字符解析 JSON 流的下推自动机
+
+    只跟踪解析位置（对象键 / 数组下标组成的路径），不构建完整结果；
+    完整结果在流结束后用 json.loads 一次性解析。
+
+    Args:
+        on_string_delta: 回调 (路径, 新解码的文本)，字符串值每收到一段内容调用一次
+        on_string_value: 回调 (路径, 完整的字符串)，字符串值闭合时调用
+    """
+
+    def __init__(
+        self,
+        on_string_delta: Optional[Callable[[list, str], None]] = None,
+        on_string_value: Optional[Callable[[list, str], None]] = None,
+    ):
+        self.on_string_delta = on_string_delta
+        self.on_string_value = on_string_value
+        # 栈中每一层: {"kind": "object" | "array", "key": 当前键, "index": 当前下标, "expect_value": bool}
+        self._stack: List[dict] = []
+        self._in_string = False
+        self._is_key = False
+        self._escape = False
+        self._unicode = ""  # \uXXXX 中已读到的十六进制数字
+        self._high_surrogate: Optional[int] = None
+        self._buffer: List[str] = []  # 当前字符串已解码的内容
+        self._delta: List[str] = []  # 本次 feed 中新解码、尚未回调的内容
+
+    @property
+    def path(self) -> List[Union[str, int]]:
+        """当前值所在的路径"""
+        return [
+            frame["key"] if frame["kind"] == "object" else frame["index"]
+            for frame in self._stack
+        ]
+
+    def feed(self, text: str):
+        """输入一段 JSON 文本"""
+        for char in text:
+            if self._in_string:
+                self._feed_string_char(char)
+            else:
+                self._feed_structural_char(char)
+        self._flush_delta()
+
+    def _flush_delta(self):
+        if self._delta and not self._is_key and self.on_string_delta:
+            self.on_string_delta(self.path, "".join(self._delta))
+        self._delta = []
+
+    def _emit(self, text: str):
+        self._buffer.append(text)
+        self._delta.append(text)
+
+    def _feed_string_char(self, char: str):
+        if self._unicode or (self._escape and char == "u"):
+            if self._escape:
+                self._escape = False
+                self._unicode = "u"
+                return
+            self._unicode += char
+            if len(self._unicode) == 5:
+                code = int(self._unicode[1:], 16)
+                self._unicode = ""
+                if 0xD800 <= code < 0xDC00:
+                    self._high_surrogate = code
+                    return
+                if 0xDC00 <= code < 0xE000 and self._high_surrogate is not None:
+                    code = 0x10000 + ((self._high_surrogate - 0xD800) << 10) + (code - 0xDC00)
+                self._high_surrogate = None
+                self._emit(chr(code))
+            return
+        if self._escape:
+            self._escape = False
+            self._emit(_ESCAPES.get(char, char))
+        elif char == "\\":
+            self._escape = True
+        elif char == '"':
+            self._close_string()
+        else:
+            self._emit(char)
+
+    def _close_string(self):
+        self._flush_delta()
+        self._in_string = False
+        value = "".join(self._buffer)
+        self._buffer = []
+        if self._is_key:
+            self._stack[-1]["key"] = value
+            self._is_key = False
+        elif self.on_string_value:
+            self.on_string_value(self.path, value)
+
+    def _feed_structural_char(self, char: str):
+        top = self._stack[-1] if self._stack else None
+        if char == '"':
+            self._in_string = True
+            self._is_key = top is not None and top["kind"] == "object" and not top["expect_value"]
+        elif char in "{[":
+            self._stack.append(
+                {
+                    "kind": "object" if char == "{" else "array",
+                    "key": None,
+                    "index": 0,
+                    "expect_value": False,
+                }
+            )
+        elif char in "}]":
+            if self._stack:
+                self._stack.pop()
+        elif char == ":" and top is not None and top["kind"] == "object":
+            top["expect_value"] = True
+        elif char == "," and top is not None:
+            if top["kind"] == "object":
+                top["expect_value"] = False
+                top["key"] = None
+            else:
+                top["index"] += 1
+
+
+def _tool_args(chunk) -> str:
+    """从 AIMessageChunk 中取出工具调用参数的增量文本"""
+    return "".join(tc.get("args") or "" for tc in getattr(chunk, "tool_call_chunks", []))
+
+
+def stream_structured(
+    model,
+    schema: Type[T],
+    messages: list,
+    on_field_delta: Optional[Callable[[str, str], None]] = None,
+    on_item: Optional[Callable[[str, int, str], None]] = None,
+    config: Optional[dict] = None,
+) -> T:
+    """
+    流式调用模型生成结构化输出
+
+    Args:
+        model: 聊天模型
+        schema: Pydantic 模型
+        messages: 消息列表
+        on_field_delta: 回调 (顶层字段名, 新解码的文本)，顶层字符串字段边生成边回调
+        on_item: 回调 (顶层字段名, 下标, 元素)，顶层字符串数组的元素一生成完就回调
+        config: 传给模型的 RunnableConfig（例如 tags），token 同样会进入图的 messages 流
+
+    Returns:
+        解析后的 schema 实例
+    """
+
+    def on_string_delta(path: List[Any], text: str):
+        if on_field_delta and len(path) == 1 and isinstance(path[0], str):
+            on_field_delta(path[0], text)
+
+    def on_string_value(path: List[Any], value: str):
+        if on_item and len(path) == 2 and isinstance(path[1], int):
+            on_item(path[0], path[1], value)
+
+    parser = IncrementalJsonParser(
+        on_string_delta=on_string_delta, on_string_value=on_string_value
+    )
+    llm = model.bind_tools([schema], tool_choice=schema.__name__)
+
+    raw = []
+    for chunk in llm.stream(messages, config=config):
+        args = _tool_args(chunk)
+        if args:
+            raw.append(args)
+            parser.feed(args)
+
+    return schema.model_validate(json.loads("".join(raw)))
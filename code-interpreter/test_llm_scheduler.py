@@ -0,0 +1,188 @@
+"""
+llm_scheduler 对本地模拟服务（mock_llm_server）的测试：429 重试、相同请求合并、按优先级放行
+
+    python -m pytest code-interpreter/test_llm_scheduler.py
+"""
+
+import json
+import threading
+import time
+import urllib.error
+import urllib.request
+from types import SimpleNamespace
+
+import pytest
+
+import llm_scheduler
+from llm_scheduler import BACKGROUND, INTERACTIVE, NORMAL, LLMScheduler
+from mock_llm_server import MockConfig, serve
+
+
+class HTTPStatusError(Exception):
+    """与 openai.APIStatusError 一样带 status_code 和 response.headers，供调度器判断是否重试"""
+
+    def __init__(self, status_code: int, headers: dict):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+        self.response = SimpleNamespace(headers={k.lower(): v for k, v in headers.items()})
+
+
+def chat(base_url: str, content: str) -> dict:
+    """直接用 urllib 请求模拟服务，失败时抛出 HTTPStatusError"""
+    request = urllib.request.Request(
+        f"{base_url}/chat/completions",
+        data=json.dumps(
+            {"model": "mock", "messages": [{"role": "user", "content": content}]}
+        ).encode("utf-8"),
+        headers={"Content-Type": "application/json"},
+    )
+    try:
+        with urllib.request.urlopen(request, timeout=10) as response:
+            return json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        raise HTTPStatusError(e.code, dict(e.headers)) from None
+
+
+@pytest.fixture
+def mock_server():
+    servers = []
+
+    def start(**config) -> SimpleNamespace:
+        config.setdefault("ttft", 0.0)
+        config.setdefault("ttft_jitter", 0.0)
+        config.setdefault("tokens_per_second", 0)
+        server = serve(port=0, config=MockConfig(**config))
+        servers.append(server)
+        host, port = server.server_address[:2]
+        return SimpleNamespace(server=server, base_url=f"http://{host}:{port}/v1")
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def make_scheduler(**kwargs) -> LLMScheduler:
+    kwargs.setdefault("requests_per_minute", 100000)
+    kwargs.setdefault("tokens_per_minute", 100000000)
+    kwargs.setdefault("base_delay", 0.01)
+    return LLMScheduler(**kwargs)
+
+
+def test_retries_injected_429(mock_server):
+    mock = mock_server(fail_first=2, retry_after=0.05)
+    scheduler = make_scheduler(max_retries=3)
+
+    start = time.monotonic()
+    result = scheduler.call(lambda: chat(mock.base_url, "你好"))
+
+    assert result["choices"][0]["message"]["content"]
+    assert mock.server.stats["requests"] == 3
+    assert mock.server.stats["errors"] == 2
+    stats = scheduler.stats()
+    assert stats["retries"] == 2
+    assert stats["rate_limited"] == 2
+    # 按 Retry-After 退避，而不是立即重试
+    assert time.monotonic() - start >= 0.1
+
+
+def test_gives_up_after_max_retries(mock_server):
+    mock = mock_server(fail_first=10, retry_after=0.01)
+    scheduler = make_scheduler(max_retries=2)
+
+    with pytest.raises(HTTPStatusError) as info:
+        scheduler.call(lambda: chat(mock.base_url, "你好"))
+
+    assert info.value.status_code == 429
+    assert mock.server.stats["requests"] == 3
+
+
+def test_non_retryable_errors_are_not_retried(mock_server):
+    mock = mock_server(fail_first=1, error_status=400)
+    scheduler = make_scheduler()
+
+    with pytest.raises(HTTPStatusError):
+        scheduler.call(lambda: chat(mock.base_url, "你好"))
+
+    assert mock.server.stats["requests"] == 1
+    assert scheduler.stats()["retries"] == 0
+
+
+def test_coalesces_identical_inflight_requests(mock_server):
+    mock = mock_server(ttft=0.3)
+    scheduler = make_scheduler()
+    results = []
+    barrier = threading.Barrier(5)
+
+    def worker():
+        barrier.wait()
+        results.append(scheduler.call(lambda: chat(mock.base_url, "同一个问题"), key="same"))
+
+    threads = [threading.Thread(target=worker) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(results) == 5
+    assert all(result is results[0] for result in results)
+    assert mock.server.stats["requests"] == 1
+    assert scheduler.stats()["coalesced"] == 4
+    assert scheduler.stats()["inflight_keys"] == 0
+
+
+def test_dispatches_by_priority(mock_server):
+    mock = mock_server(ttft=0.2)
+    scheduler = make_scheduler(max_concurrency=1)
+    order = []
+
+    def submit(label: str, priority: int) -> threading.Thread:
+        def run():
+            order.append(label)
+            return chat(mock.base_url, label)
+
+        thread = threading.Thread(target=scheduler.call, args=(run,), kwargs={"priority": priority})
+        thread.start()
+        return thread
+
+    def wait_queued(count: int):
+        deadline = time.monotonic() + 5
+        while scheduler.stats()["queued"] < count:
+            assert time.monotonic() < deadline
+            time.sleep(0.005)
+
+    # 占住唯一的并发名额，之后的请求全部排队
+    threads = [submit("blocker", NORMAL)]
+    deadline = time.monotonic() + 5
+    while scheduler.stats()["running"] < 1:
+        assert time.monotonic() < deadline
+        time.sleep(0.005)
+    threads.append(submit("replan", BACKGROUND))
+    wait_queued(1)
+    threads.append(submit("codegen", NORMAL))
+    wait_queued(2)
+    threads.append(submit("final_answer", INTERACTIVE))
+    wait_queued(3)
+
+    for thread in threads:
+        thread.join()
+
+    # 后到的最终回复越过先排队的后台重规划
+    assert order == ["blocker", "final_answer", "codegen", "replan"]
+
+
+def test_scheduled_chat_openai_retries_429(mock_server, monkeypatch):
+    """端到端：ScheduledChatOpenAI 的 429 由调度器重试，LangChain 自身不重试"""
+    pytest.importorskip("langchain_openai")
+    mock = mock_server(fail_first=1, retry_after=0.05)
+    scheduler = make_scheduler(max_retries=3)
+    monkeypatch.setattr(llm_scheduler, "_scheduler", scheduler)
+
+    model = llm_scheduler.ScheduledChatOpenAI(
+        base_url=mock.base_url, api_key="mock", model="mock", priority=INTERACTIVE
+    )
+    message = model.invoke("你好")
+
+    assert message.content
+    assert mock.server.stats["requests"] == 2
+    assert scheduler.stats()["retries"] == 1
@@ -0,0 +1,288 @@
+"""
+LLM / 工具调用的录制与回放
+
+模型输出每次都不一样，对比 prompt.py 与 prompts_optimized.py、或者对比节点实现的不同版本时，
+性能差异会被模型输出的差异淹没。这里：
+- 录制模式: 把每次 LLM 请求 / 响应、Tavily 搜索、代码执行连同耗时写入 trace 文件（gzip 压缩的 JSON Lines）；
+  每条记录单独写成一个完整的 gzip member，录制进程被杀掉时已写入的记录仍然可读
+- 回放模式: 按请求内容（找不到时按同类调用的顺序）返回录制的结果，不再访问模型服务、也不执行代码，
+  于是在 LLM 输出固定的前提下测量框架本身的开销和回归
+
+配置（环境变量）:
+    TRACE_MODE: record / replay，不设置时不录制也不回放
+    TRACE_FILE: trace 文件路径，默认 ./traces/trace.jsonl.gz；录制时文件已存在则报错，不覆盖旧的 trace
+    TRACE_REPLAY_TIMING: 回放时是否按录制的耗时等待，none（默认，只测框架开销）/ recorded
+"""
+
+import atexit
+import gzip
+import hashlib
+import json
+import os
+import subprocess
+import threading
+import time
+from collections import defaultdict, deque
+from pathlib import Path
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+TRACE_MODE = os.getenv("TRACE_MODE", "")
+TRACE_FILE = Path(os.getenv("TRACE_FILE", "./traces/trace.jsonl.gz"))
+TRACE_REPLAY_TIMING = os.getenv("TRACE_REPLAY_TIMING", "none")
+
+
+class TraceMissError(LookupError):
+    """回放时 trace 中没有对应的记录"""
+
+
+def request_key(payload: Any) -> str:
+    """请求内容的哈希"""
+    text = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:32]
+
+
+class TraceRecorder:
+    """录制调用到 trace 文件"""
+
+    def __init__(self, path: Path = TRACE_FILE):
+        self.path = path
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        try:
+            self._file = open(path, "xb")
+        except FileExistsError:
+            raise FileExistsError(
+                f"trace 文件 {path} 已存在，为避免覆盖旧的录制，请删除它或通过 TRACE_FILE 指定新路径"
+            ) from None
+
+    def write(
+        self,
+        kind: str,
+        scope: str,
+        key: str,
+        seconds: float,
+        response: Any = None,
+        error: Any = None,
+    ):
+        entry = {"kind": kind, "scope": scope, "key": key, "seconds": round(seconds, 4)}
+        if response is not None:
+            entry["response"] = response
+        if error is not None:
+            entry["error"] = error
+        line = json.dumps(entry, ensure_ascii=False, separators=(",", ":"))
+        # 每条记录是一个独立的 gzip member（gzip 读取时自动拼接），不依赖 close() 写入结尾
+        member = gzip.compress((line + "\n").encode("utf-8"), mtime=0)
+        with self._lock:
+            if self._file.closed:
+                return
+            self._file.write(member)
+            self._file.flush()
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+def read_trace(path: Path) -> List[dict]:
+    """
+    读取 trace 文件中的全部记录
+
+    录制进程被中途杀掉时，最后一条记录可能不完整：保留之前读到的记录，丢弃残缺的部分。
+    """
+    entries = []
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        try:
+            for line in f:
+                if not line.endswith("\n"):
+                    break
+                entries.append(json.loads(line))
+        except (EOFError, gzip.BadGzipFile, json.JSONDecodeError):
+            pass
+    return entries
+
+
+class TracePlayer:
+    """从 trace 文件回放调用"""
+
+    def __init__(self, path: Path = TRACE_FILE, timing: str = TRACE_REPLAY_TIMING):
+        self.timing = timing
+        self._lock = threading.Lock()
+        self._by_key: Dict[Tuple[str, str], Deque[dict]] = defaultdict(deque)
+        self._by_scope: Dict[Tuple[str, str], Deque[dict]] = defaultdict(deque)
+        for entry in read_trace(path):
+            entry["used"] = False
+            self._by_key[(entry["kind"], entry["key"])].append(entry)
+            self._by_scope[(entry["kind"], entry["scope"])].append(entry)
+        self.hits = {"content": 0, "sequence": 0}
+
+    @staticmethod
+    def _next_unused(queue: Deque[dict]) -> Optional[dict]:
+        while queue and queue[0]["used"]:
+            queue.popleft()
+        return queue.popleft() if queue else None
+
+    def take(self, kind: str, scope: str, key: str) -> dict:
+        """
+        取出一条录制结果
+
+        先按请求内容匹配；提示词或代码变化导致内容对不上时，按同类调用（kind + scope）的录制顺序匹配。
+        """
+        with self._lock:
+            entry = self._next_unused(self._by_key[(kind, key)])
+            match = "content"
+            if entry is None:
+                entry = self._next_unused(self._by_scope[(kind, scope)])
+                match = "sequence"
+            if entry is None:
+                raise TraceMissError(f"trace 中没有可回放的 {kind} 调用（scope={scope}）")
+            entry["used"] = True
+            self.hits[match] += 1
+        if self.timing == "recorded":
+            time.sleep(entry["seconds"])
+        return entry
+
+
+_recorder: Optional[TraceRecorder] = None
+_player: Optional[TracePlayer] = None
+_init_lock = threading.Lock()
+
+
+def get_recorder() -> Optional[TraceRecorder]:
+    """录制模式下返回进程内共享的录制器"""
+    global _recorder
+    if TRACE_MODE != "record":
+        return None
+    with _init_lock:
+        if _recorder is None:
+            _recorder = TraceRecorder()
+            atexit.register(_recorder.close)
+        return _recorder
+
+
+def get_player() -> Optional[TracePlayer]:
+    """回放模式下返回进程内共享的回放器"""
+    global _player
+    if TRACE_MODE != "replay":
+        return None
+    with _init_lock:
+        if _player is None:
+            _player = TracePlayer()
+        return _player
+
+
+def _encode_error(error: BaseException) -> dict:
+    encoded = {"type": type(error).__name__, "message": str(error)}
+    if isinstance(error, subprocess.TimeoutExpired):
+        encoded["timeout"] = error.timeout
+    return encoded
+
+
+def _raise_error(error: dict):
+    if error["type"] == "TimeoutExpired":
+        raise subprocess.TimeoutExpired("python", error.get("timeout", 0))
+    raise RuntimeError(f"{error['type']}: {error['message']}")
+
+
+def traced_call(
+    kind: str,
+    scope: str,
+    payload: Any,
+    fn: Callable[[], Any],
+    encode: Callable[[Any], Any] = lambda result: result,
+    decode: Callable[[Any], Any] = lambda data: data,
+) -> Any:
+    """
+    执行一次可录制 / 回放的调用
+
+    Args:
+        kind: 调用类型，llm / tavily / exec
+        scope: 同类调用的细分（例如 LLM 的角色），回放按顺序匹配时使用
+        payload: 请求内容，用于计算匹配的 key
+        fn: 实际执行调用的函数
+        encode: 把结果转成可 JSON 序列化的数据
+        decode: 把录制的数据还原成结果
+
+    Returns:
+        fn 的返回值（回放模式下为录制的结果）
+    """
+    player = get_player()
+    if player is not None:
+        entry = player.take(kind, scope, request_key(payload))
+        if "error" in entry:
+            _raise_error(entry["error"])
+        return decode(entry.get("response"))
+
+    recorder = get_recorder()
+    if recorder is None:
+        return fn()
+
+    start = time.perf_counter()
+    try:
+        result = fn()
+    except Exception as e:
+        recorder.write(
+            kind, scope, request_key(payload), time.perf_counter() - start, error=_encode_error(e)
+        )
+        raise
+    recorder.write(
+        kind, scope, request_key(payload), time.perf_counter() - start, response=encode(result)
+    )
+    return result
+
+
+def traced_stream(
+    kind: str,
+    scope: str,
+    payload: Any,
+    fn: Callable[[], Any],
+    encode: Callable[[Any], Any] = lambda chunk: chunk,
+    decode: Callable[[Any], Any] = lambda data: data,
+):
+    """traced_call 的流式版本：录制全部 chunk，回放时依次返回"""
+    player = get_player()
+    if player is not None:
+        entry = player.take(kind, scope, request_key(payload))
+        for data in entry.get("response") or []:
+            yield decode(data)
+        if "error" in entry:
+            _raise_error(entry["error"])
+        return
+
+    recorder = get_recorder()
+    if recorder is None:
+        yield from fn()
+        return
+
+    start = time.perf_counter()
+    chunks = []
+    try:
+        for chunk in fn():
+            chunks.append(encode(chunk))
+            yield chunk
+    except Exception as e:
+        recorder.write(
+            kind, scope, request_key(payload), time.perf_counter() - start,
+            response=chunks, error=_encode_error(e),
+        )
+        raise
+    recorder.write(kind, scope, request_key(payload), time.perf_counter() - start, response=chunks)
+
+
+def wrap_tool(tool, kind: str = "tavily"):
+    """
+    包装 LangChain 工具（例如 TavilySearch），使其调用可录制 / 回放
+
+    Returns:
+        同名、同参数结构的 StructuredTool
+    """
+    from langchain_core.tools import StructuredTool
+
+    def run(**kwargs):
+        return traced_call(kind, tool.name, kwargs, lambda: tool.invoke(kwargs))
+
+    return StructuredTool.from_function(
+        func=run,
+        name=tool.name,
+        description=tool.description,
+        args_schema=tool.args_schema,
+    )
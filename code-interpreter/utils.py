@@ -21,3 +21,21 @@ def extract_python_code(text: str) -> str:
         return code.strip()
 
     return ""
+
+
+def extract_sql_code(text: str) -> str:
+    """
+    从LLM响应中提取SQL代码块
+
+    Args:
+        text: LLM的原始响应
+
+    Returns:
+        提取的SQL语句（去掉末尾分号），如果没有代码块则返回空字符串
+    """
+    match = re.search(r"```sql\s*\n(.*?)```", text, re.DOTALL | re.IGNORECASE)
+
+    if match:
+        return match.group(1).strip().rstrip(";").strip()
+
+    return ""
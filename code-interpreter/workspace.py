@@ -0,0 +1,241 @@
+"""
+会话隔离的执行工作目录
+
+生成代码原先都在编排进程的当前目录里运行，提示词又要求把结果保存到 ./：
+并发会话共用同一个目录、互相覆盖中间文件，中间输出也都落在磁盘上。这里为每个会话分配独立的工作目录：
+- 默认建在 tmpfs（/dev/shm）上，中间文件的读写不落盘；/dev/shm 不可用时退回系统临时目录
+- 输入数据集按生成代码里的相对路径放进工作目录：复制一份到工作目录并设为只读（0444），
+  读取走 tmpfs，生成代码误写 ./data.csv 也只会碰到副本，不会改动用户的源文件；
+  源文件变化（大小或修改时间不同）时重新复制。超过 WORKSPACE_COPY_MAX_BYTES 的大文件不复制，
+  退回硬链接 / 符号链接（与源文件共享内容，此时仍不应写回输入文件）。只读 bind mount 需要挂载权限，这里不使用
+- 会话数超过上限或闲置超时时淘汰最久未用的工作目录并删除；正在执行的工作目录不会被淘汰
+  （生成的图表在每次执行后已经收进 artifact_store，删除工作目录不会丢失图表）
+
+    from workspace import get_workspaces
+
+    with get_workspaces().use("session-1", ["./data.csv"]) as cwd:
+        run_python_code(code, cwd=str(cwd))
+"""
+
+import atexit
+import contextlib
+import hashlib
+import os
+import re
+import shutil
+import stat
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, Optional
+
+
+def _default_root() -> Path:
+    shm = Path("/dev/shm")
+    if shm.is_dir() and os.access(shm, os.W_OK):
+        return shm / "ai-practices-workspaces"
+    return Path(tempfile.gettempdir()) / "ai-practices-workspaces"
+
+
+WORKSPACE_ROOT = Path(os.getenv("WORKSPACE_ROOT", "") or _default_root())
+
+# 同时保留的会话工作目录上限
+WORKSPACE_MAX_SESSIONS = int(os.getenv("WORKSPACE_MAX_SESSIONS", "64"))
+
+# 闲置多久（秒）后删除
+WORKSPACE_IDLE_SECONDS = float(os.getenv("WORKSPACE_IDLE_SECONDS", "1800"))
+
+# 复制进工作目录的数据集大小上限（字节），更大的文件退回链接，默认 512MB
+WORKSPACE_COPY_MAX_BYTES = int(os.getenv("WORKSPACE_COPY_MAX_BYTES", str(512 * 1024 * 1024)))
+
+
+def _dir_name(session_id: str) -> str:
+    """会话 ID → 目录名（保留可读前缀，加哈希避免冲突和路径注入）"""
+    prefix = re.sub(r"[^\w.-]", "_", session_id)[:32]
+    return f"{prefix}-{hashlib.blake2b(session_id.encode(), digest_size=6).hexdigest()}"
+
+
+def is_staged_dataset(path: Path) -> bool:
+    """path 是否为 stage_dataset 放进工作目录的数据集（只读副本或链接）"""
+    try:
+        st = path.lstat()
+    except OSError:
+        return False
+    if stat.S_ISLNK(st.st_mode):
+        return True
+    return stat.S_ISREG(st.st_mode) and (st.st_nlink > 1 or not st.st_mode & 0o222)
+
+
+def stage_dataset(
+    source: str, workspace: Path, max_copy_bytes: int = WORKSPACE_COPY_MAX_BYTES
+) -> Optional[Path]:
+    """
+    把数据集放到工作目录中与 source 相同的相对位置
+
+    不超过 max_copy_bytes 的文件复制一份并设为只读；更大的文件用硬链接（跨文件系统时用符号链接）。
+    绝对路径在工作目录里照样能访问，不需要处理；跳出当前目录的相对路径（../）无法映射，返回 None。
+
+    Returns:
+        工作目录中的数据集路径
+    """
+    relative = Path(os.path.normpath(source))
+    if relative.is_absolute() or relative.parts[:1] == ("..",):
+        return None
+    origin = Path(source).resolve()
+    if not origin.is_file():
+        return None
+    origin_stat = origin.stat()
+    target = workspace / relative
+    copy = origin_stat.st_size <= max_copy_bytes
+
+    if os.path.lexists(target):
+        with contextlib.suppress(OSError):
+            if copy:
+                # 副本保留了源文件的修改时间，大小和修改时间都没变就不必重新复制
+                current = target.lstat()
+                if (
+                    stat.S_ISREG(current.st_mode)
+                    and current.st_nlink == 1
+                    and current.st_size == origin_stat.st_size
+                    and current.st_mtime_ns == origin_stat.st_mtime_ns
+                ):
+                    return target
+            elif target.samefile(origin):
+                return target
+    target.parent.mkdir(parents=True, exist_ok=True)
+
+    # 先写到临时文件再替换，读取方不会看到写了一半的副本
+    staging = target.with_name(f".{target.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    with contextlib.suppress(FileNotFoundError):
+        staging.unlink()
+    if copy:
+        shutil.copy2(origin, staging)
+        os.chmod(staging, 0o444)
+    else:
+        try:
+            os.link(origin, staging)
+        except OSError:
+            # tmpfs 与数据所在磁盘通常不是同一文件系统，硬链接会失败（EXDEV）
+            staging.symlink_to(origin)
+    os.replace(staging, target)
+    return target
+
+
+class WorkspaceManager:
+    """按会话分配、按 LRU / 闲置时间回收的工作目录"""
+
+    def __init__(
+        self,
+        root: Path = WORKSPACE_ROOT,
+        max_sessions: int = WORKSPACE_MAX_SESSIONS,
+        idle_seconds: float = WORKSPACE_IDLE_SECONDS,
+    ):
+        self.root = Path(root)
+        self.max_sessions = max_sessions
+        self.idle_seconds = idle_seconds
+        self._lock = threading.Lock()
+        # 会话 → {"path", "last_used", "active"}
+        self._sessions: Dict[str, Dict] = {}
+        self._stats = {"created": 0, "reused": 0, "evicted": 0}
+
+    def acquire(self, session_id: str, datasets: Iterable[str] = ()) -> Path:
+        """取得会话的工作目录（不存在则创建），并放入数据集；用完需调用 release"""
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is None or not entry["path"].is_dir():
+                path = self.root / _dir_name(session_id)
+                path.mkdir(parents=True, exist_ok=True)
+                entry = self._sessions[session_id] = {
+                    "path": path,
+                    "active": 0,
+                    # 同一会话的并发 acquire 串行放置数据集
+                    "lock": threading.Lock(),
+                }
+                self._stats["created"] += 1
+            else:
+                self._stats["reused"] += 1
+            entry["active"] += 1
+            entry["last_used"] = time.time()
+            self._evict()
+        try:
+            with entry["lock"]:
+                for dataset in datasets:
+                    if dataset:
+                        stage_dataset(dataset, entry["path"])
+        except BaseException:
+            self.release(session_id)
+            raise
+        return entry["path"]
+
+    def release(self, session_id: str):
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is not None:
+                entry["active"] = max(entry["active"] - 1, 0)
+                entry["last_used"] = time.time()
+
+    @contextlib.contextmanager
+    def use(self, session_id: str, datasets: Iterable[str] = ()) -> Iterator[Path]:
+        """在会话工作目录中执行：with manager.use(session_id, [file_path]) as cwd: ..."""
+        path = self.acquire(session_id, datasets)
+        try:
+            yield path
+        finally:
+            self.release(session_id)
+
+    def _evict(self):
+        """删除闲置超时的工作目录，并把会话数压回上限以内（调用方持有锁）"""
+        now = time.time()
+        idle = [
+            (entry["last_used"], session_id)
+            for session_id, entry in self._sessions.items()
+            if not entry["active"]
+        ]
+        idle.sort()
+        overflow = len(self._sessions) - self.max_sessions
+        for last_used, session_id in idle:
+            if overflow <= 0 and now - last_used < self.idle_seconds:
+                break
+            self._remove(session_id)
+            overflow -= 1
+
+    def _remove(self, session_id: str):
+        entry = self._sessions.pop(session_id)
+        shutil.rmtree(entry["path"], ignore_errors=True)
+        self._stats["evicted"] += 1
+
+    def drop(self, session_id: str):
+        """会话结束时立即删除其工作目录"""
+        with self._lock:
+            if session_id in self._sessions:
+                self._remove(session_id)
+
+    def cleanup(self):
+        """删除本进程创建的全部工作目录（进程退出时调用）"""
+        with self._lock:
+            for session_id in list(self._sessions):
+                self._remove(session_id)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                **self._stats,
+                "sessions": len(self._sessions),
+                "active": sum(1 for entry in self._sessions.values() if entry["active"]),
+                "root": str(self.root),
+            }
+
+
+_workspaces: Optional[WorkspaceManager] = None
+_workspaces_lock = threading.Lock()
+
+
+def get_workspaces() -> WorkspaceManager:
+    """获取进程内共享的工作目录管理器"""
+    global _workspaces
+    with _workspaces_lock:
+        if _workspaces is None:
+            _workspaces = WorkspaceManager()
+            atexit.register(_workspaces.cleanup)
+        return _workspaces
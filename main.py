@@ -1,5 +1,131 @@
+"""
+ai-practices 命令行入口
+
+    python main.py bi "分析销售趋势" --file ./data.csv
+    python main.py plan "帮我分析一下 ./data.csv 中的数据，并给出一个详细的数据报告"
+    python main.py artifact <id> --thumbnail
+
+bi 直接调用 BI 数据分析 Agent，plan 运行 Plan-and-Execute 主 Agent。
+分析报告和最终回复逐 token 输出到终端，其余节点更新加 --verbose 时打印。
+生成的图表只输出 artifact ID，需要时再用 artifact 子命令取原图或缩略图。
+"""
+
+import argparse
+import sys
+import uuid
+from pathlib import Path
+
+# Agent 模块是 code-interpreter 目录下的扁平模块
+sys.path.insert(0, str(Path(__file__).resolve().parent / "code-interpreter"))
+
+
+def print_stream(stream, verbose: bool = False):
+    """打印图的 messages / updates / custom 流"""
+    for mode, event in stream:
+        if mode == "messages":
+            # 分析报告逐 token 输出
+            token, metadata = event
+            if "analysis_report" in metadata.get("tags", []) and token.content:
+                print(token.content, end="", flush=True)
+        elif mode == "custom" and event.get("type") == "final_response":
+            # 最终回复逐段输出
+            print(event["delta"], end="", flush=True)
+        elif mode == "custom" and event.get("type") == "plan_step":
+            print(f"\n[计划] {event['index'] + 1}. {event['step']}", flush=True)
+        elif mode == "custom" and event.get("type") == "artifact":
+            print(f"\n[图表] {event['name']}: {event['id']}", flush=True)
+        elif verbose:
+            print(f"\n[{mode}] {event}", flush=True)
+    print()
+
+
+def run_bi(args):
+    from bi_agent import build_bi_agent
+
+    agent = build_bi_agent()
+    stream = agent.stream(
+        {
+            "messages": [{"role": "user", "content": args.query}],
+            "data_context": {"file_path": args.file},
+        },
+        config={"configurable": {"thread_id": args.session}},
+        stream_mode=["messages", "updates", "custom"],
+    )
+    print_stream(stream, args.verbose)
+
+
+def run_plan(args):
+    from plan_execute import build_plan_execute_app
+
+    app = build_plan_execute_app()
+    stream = app.stream(
+        {"user_query": args.query, "file_path": args.file},
+        config={"configurable": {"thread_id": args.session}},
+        stream_mode=["messages", "updates", "custom"],
+    )
+    print_stream(stream, args.verbose)
+
+
+def run_artifact(args):
+    from artifact_store import get_artifact_store
+
+    store = get_artifact_store()
+    path = store.thumbnail(args.id) if args.thumbnail else store.path(args.id)
+    if args.out:
+        Path(args.out).write_bytes(path.read_bytes())
+        path = args.out
+    print(path)
+
+
 def main():
-    print("Hello from ai-practices!")
+    parser = argparse.ArgumentParser(description="ai-practices 数据分析 Agent")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    bi = subparsers.add_parser("bi", help="BI 数据分析 Agent")
+    bi.add_argument("query", help="分析需求")
+    bi.add_argument("--file", default="./data.csv", help="要分析的数据文件")
+    bi.set_defaults(run=run_bi)
+
+    plan = subparsers.add_parser("plan", help="Plan-and-Execute 主 Agent")
+    plan.add_argument("query", help="用户问题")
+    plan.add_argument("--file", default="./data.csv", help="要分析的数据文件")
+    plan.set_defaults(run=run_plan)
+
+    artifact = subparsers.add_parser("artifact", help="按 ID 取生成的图表")
+    artifact.add_argument("id", help="artifact ID")
+    artifact.add_argument("--thumbnail", action="store_true", help="取缩略图")
+    artifact.add_argument("--out", help="复制到指定路径（默认只打印存储中的路径）")
+    artifact.set_defaults(run=run_artifact, stats=False)
+
+    for subparser in (bi, plan):
+        subparser.add_argument(
+            "--session",
+            default=uuid.uuid4().hex,
+            help="会话 ID（生成的图表按会话隔离，默认每次运行新建）",
+        )
+        subparser.add_argument(
+            "--verbose", action="store_true", help="打印每个节点的更新"
+        )
+        subparser.add_argument(
+            "--stats", action="store_true", help="结束后打印各角色的延迟 / token / 费用统计"
+        )
+
+    args = parser.parse_args()
+
+    from dotenv import load_dotenv
+
+    load_dotenv(override=True)
+
+    args.run(args)
+
+    if args.stats:
+        from model_router import get_router
+        import offload
+        from sandbox_scheduler import get_sandbox_scheduler
+
+        print(get_router().stats())
+        print(get_sandbox_scheduler().stats())
+        print(offload.stats())
 
 
 if __name__ == "__main__":